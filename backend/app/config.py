@@ -15,8 +15,114 @@ class Settings(BaseSettings):
     default_aws_region: str = "us-east-1"
     
     # Redis Configuration
-    redis_url: str = "redis://localhost:6379"
+    redis_url: str = "redis://localhost:6379"  # Empty to use only the in-process cache
     cache_ttl: int = 3600  # 1 hour
+    cache_enabled: bool = True
+    cache_key_prefix: str = "aws-billing:"
+    cache_max_local_entries: int = 256  # In-process LRU used when Redis is down
+    cache_redis_timeout: float = 0.25  # Seconds
+    cache_redis_retry_interval: int = 30  # Seconds before retrying Redis after a failure
+    cache_stale_ttl: int = 3600  # Seconds past the TTL an entry is still served while it refreshes
+    
+    # Cache warming - refresh hot queries before they expire and pre-warm standard views
+    cache_warm_enabled: bool = True
+    cache_warm_interval: int = 60  # Seconds between scheduling passes
+    cache_warm_refresh_ahead: int = 300  # Refresh this many seconds before the TTL runs out
+    cache_warm_min_hits: int = 3  # Decayed hit score that makes a query hot
+    cache_warm_max_tracked: int = 512
+    cache_warm_idle_ttl: int = 7200  # Stop tracking queries (and their accounts' views) unused this long
+    cache_warm_budget_per_hour: int = 120  # Scheduled refreshes per hour per worker
+    cache_warm_concurrency: int = 2
+    cache_warm_views: str = "last_30_days_by_service,month_to_date"  # Also last_30_days, month_to_date_by_service
+    cache_warm_views_interval: int = 3600
+    
+    # Per-period cache of Cost Explorer results - finalized days rarely change,
+    # so they are kept far longer than estimated (recent) buckets
+    bucket_cache_enabled: bool = True
+    bucket_cache_max_series: int = 128
+    bucket_cache_max_buckets_per_series: int = 1200  # Over three years of DAILY buckets
+    bucket_cache_estimated_ttl: int = 900  # 15 minutes
+    bucket_cache_finalized_ttl: int = 604800  # 7 days
+    
+    # Indexed dimension value catalogs - refreshed in the background once stale
+    dimension_catalog_max_entries: int = 256
+    dimension_catalog_refresh_after: int = 21600  # 6 hours
+    dimension_catalog_max_age: int = 86400  # 24 hours
+    
+    # AWS call execution - boto3 is blocking, so calls run on a bounded thread pool
+    aws_executor_max_workers: int = 32
+    ce_max_concurrency: int = 8  # Concurrent Cost Explorer calls per worker
+    sts_max_concurrency: int = 16  # Concurrent STS calls per worker
+    ce_window_concurrency: int = 4  # Month windows fetched in parallel per request
+    
+    # Adaptive per-account rate limiting for Cost Explorer (requests per second)
+    ce_rate_limit_initial: float = 5.0
+    ce_rate_limit_min: float = 0.2
+    ce_rate_limit_max: float = 10.0
+    ce_rate_limit_burst: int = 5
+    ce_rate_limit_increase: float = 0.5  # Added to the rate after each success
+    ce_rate_limit_decrease: float = 0.5  # Rate multiplier after a throttle response
+    ce_rate_limit_max_accounts: int = 1024
+    ce_rate_limit_idle_ttl: int = 900  # Forget an account's adapted rate after 15 idle minutes
+    ce_queue_max_wait: float = 20.0  # Seconds a call may spend queued and retrying
+    ce_max_retries: int = 5
+    ce_retry_base_delay: float = 0.25  # Seconds, doubled per attempt with full jitter
+    ce_retry_max_delay: float = 8.0
+    ce_retry_after: int = 5  # Retry-After seconds sent with 429 responses
+    
+    # Cost Explorer spend governor - every Cost Explorer request is billed. Budgets count
+    # requests per UTC day and month in this worker process; 0 disables a budget
+    ce_budget_daily: int = 0
+    ce_budget_monthly: int = 0
+    ce_budget_account_daily: int = 0  # Per AWS account
+    ce_budget_account_monthly: int = 0
+    ce_budget_cache_only_at: float = 0.8  # Budget fraction after which cached data is served instead of refreshed
+    ce_request_cost: float = 0.01  # USD per request, for usage reports
+    ce_budget_max_callers: int = 1000  # Accounts tracked per month; the rest share one "other" caller
+    
+    multi_account_max_concurrency: int = 8  # Accounts queried at once across all multi-account requests
+    multi_account_per_account_concurrency: int = 2  # Parallel queries for the same account
+    multi_account_max_accounts: int = 1024  # Per-account limits kept; idle ones are dropped first
+    multi_account_idle_ttl: int = 900
+    
+    # Caller identities (STS GetCallerIdentity) shared by credential validation and account info
+    identity_cache_ttl: int = 3600  # 1 hour
+    identity_cache_max_size: int = 4096
+    
+    # Anomaly detection - finalized days are scored once and kept per account and query
+    anomaly_max_states: int = 64
+    anomaly_max_days: int = 400  # Longest reported range, and scored days kept per state
+    
+    # Pooled boto3 clients, keyed by hashed credentials
+    client_pool_max_size: int = 64
+    client_pool_idle_ttl: int = 900  # 15 minutes
+    
+    # Local cost warehouse - daily costs per record type by each cube's dimensions,
+    # synced in the background (one Cost Explorer query per cube and record type)
+    warehouse_enabled: bool = False
+    warehouse_path: str = "data/warehouse.sqlite3"
+    warehouse_cubes: str = "SERVICE+REGION,SERVICE+USAGE_TYPE,SERVICE+LINKED_ACCOUNT"
+    warehouse_metrics: str = "BlendedCost,UnblendedCost,AmortizedCost,UsageQuantity"
+    warehouse_history_days: int = 365
+    warehouse_sync_interval: int = 21600  # 6 hours
+    warehouse_account_idle_ttl: int = 604800  # Stop syncing accounts unused for a week
+    
+    # Cost and Usage Report files read from a local directory, reduced to daily
+    # aggregates per file (reprocessed only when a file's checksum changes)
+    cur_enabled: bool = False
+    cur_directory: str = "data/cur"
+    cur_cache_dir: str = "data/cur-cache"
+    cur_chunk_rows: int = 250000  # Line items held in memory at once while reading a file
+    cur_scan_interval: int = 900  # 15 minutes
+    
+    # Cost data response encoding
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # Bytes; smaller bodies are sent uncompressed
+    compression_gzip_level: int = 5
+    compression_brotli_quality: int = 4  # Low qualities compress far faster with a similar ratio on JSON
+    
+    # Prometheus metrics at /api/metrics
+    metrics_enabled: bool = True
     
     # CORS - Allow external access in development
     allowed_origins: Union[str, list] = ["http://localhost:3000", "http://0.0.0.0:3000", "*"]
@@ -1,13 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.routers import health, cost_data
+from app.services.anomalies import anomaly_detector
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.bucket_cache import bucket_cache
+from app.services.cache import response_cache
+from app.services.cache_warming import cache_warmer
+from app.services.client_pool import client_pool
+from app.services.cur import cur_data_source
+from app.services.dimension_catalog import dimension_catalog
+from app.services.forecast import forecast_service
+from app.services.identity import identity_cache
+from app.services.metrics import MetricsMiddleware, register_component
+from app.services.query_planner import query_planner
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
+from app.services.spend_governor import SpendContextMiddleware, spend_governor
+from app.services.warehouse import cost_warehouse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Local cost warehouse (no-op unless WAREHOUSE_ENABLED)
+    await cost_warehouse.start(cost_explorer_service)
+    # Cost and Usage Report files (no-op unless CUR_ENABLED)
+    await cur_data_source.start(cost_explorer_service)
+    # Keeps hot cached queries and the standard dashboard views fresh
+    await cache_warmer.start()
+    yield
+    await cache_warmer.stop()
+    await cur_data_source.stop()
+    await cost_warehouse.stop()
+    # Release the thread pool used for blocking AWS calls
+    cost_explorer_service.shutdown()
+    await response_cache.close()
+
 
 app = FastAPI(
     title=settings.app_name,
     description="AWS Billing Dashboard API",
     version="1.0.0",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -17,8 +53,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "X-Cache-Backend", "X-Budget-Mode", "Warning", "ETag"],
 )
 
+# Attributes Cost Explorer requests to the route that made them
+app.add_middleware(SpendContextMiddleware)
+
+# Request metrics - added last so it wraps CORS and times the whole request
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Component counters exported on /api/metrics
+register_component("client_pool", client_pool.stats)
+register_component("identity_cache", identity_cache.stats)
+register_component("response_cache", response_cache.stats)
+register_component("cache_warmer", cache_warmer.stats)
+register_component("query_planner", query_planner.stats)
+register_component("bucket_cache", bucket_cache.stats)
+register_component("single_flight", single_flight.stats)
+register_component("rate_limiter", rate_limiter.stats)
+register_component("spend_governor", spend_governor.stats)
+register_component("dimension_catalog", dimension_catalog.stats)
+register_component("warehouse", cost_warehouse.stats)
+register_component("forecast", forecast_service.stats)
+register_component("anomalies", anomaly_detector.stats)
+register_component("cur", cur_data_source.stats)
+
 # Include routers - support both root and sub-path API endpoints
 api_prefix = "/api"
 sub_path_api_prefix = f"{settings.api_base_path}/api" if settings.api_base_path else None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from .credentials import AWSCredentials
@@ -39,6 +39,68 @@ class CostDataRequest(BaseModel):
     group_by: List[Dict[str, str]] = []
     metrics: List[str] = ["BlendedCost"]
     filter: Optional[Dict[str, Any]] = None
+    # Answer MONTHLY from cached DAILY data when available (WEEKLY/QUARTERLY are always derived)
+    resample: bool = False
+
+
+class AccountCostQuery(BaseModel):
+    alias: Optional[str] = None  # Label used to identify the account in the response
+    credentials: AWSCredentials
+
+
+class MultiAccountCostDataRequest(BaseModel):
+    accounts: List[AccountCostQuery]
+    time_period: TimePeriod
+    granularity: str = "DAILY"
+    group_by: List[Dict[str, str]] = []
+    metrics: List[str] = ["BlendedCost"]
+    filter: Optional[Dict[str, Any]] = None
+    resample: bool = False
+
+
+class AnomalyRequest(BaseModel):
+    accounts: List[AccountCostQuery]
+    time_period: Optional[TimePeriod] = None  # Days to report (YYYY-MM-DD), defaults to the last 30 days
+    group_by: List[Dict[str, str]] = [{"Type": "DIMENSION", "Key": "SERVICE"}]  # [] for the total only
+    metric: str = "BlendedCost"
+    filter: Optional[Dict[str, Any]] = None
+    window_days: int = Field(default=56, ge=7, le=180)  # Days each one is compared against
+    seasonality: str = "weekly"  # "weekly" compares with the same weekday only, "none" with every day
+    threshold: float = Field(default=3.5, gt=0)  # Robust z-score that counts as an anomaly
+    min_amount: float = Field(default=1.0, ge=0)  # Ignore deviations smaller than this
+    include_drops: bool = False  # Also report drops, not just spikes
+    limit: int = Field(default=100, ge=1, le=1000)
+
+
+class BatchQuery(BaseModel):
+    id: Optional[str] = None  # Echoed back so callers can match results to queries
+    time_period: TimePeriod
+    granularity: str = "DAILY"
+    group_by: List[Dict[str, str]] = []
+    metrics: List[str] = ["BlendedCost"]
+    filter: Optional[Dict[str, Any]] = None
+    resample: bool = False
+
+
+class BatchCostDataRequest(BaseModel):
+    credentials: AWSCredentials
+    queries: List[BatchQuery]
+
+
+class CostExportRequest(CostDataRequest):
+    format: str = "csv"  # csv, ndjson or parquet
+
+
+class ForecastRequest(BaseModel):
+    credentials: AWSCredentials
+    group_by: List[Dict[str, str]] = [{"Type": "DIMENSION", "Key": "SERVICE"}]  # [] for the total only
+    metric: str = "BlendedCost"
+    filter: Optional[Dict[str, Any]] = None
+    history_days: int = Field(default=90, ge=14, le=365)  # Daily history the model is fitted on
+    horizon_days: int = Field(default=30, ge=1, le=366)  # Length of the N-day projection
+    confidence: float = Field(default=0.9, gt=0, lt=1)  # Prediction interval coverage
+    as_of: Optional[str] = None  # First forecast day (YYYY-MM-DD), defaults to today
+    include_daily: bool = False  # Also return the per-day forecasts
 
 
 class CostDataResponse(BaseModel):
@@ -48,12 +110,18 @@ class CostDataResponse(BaseModel):
     results: List[ResultByTime]
     dimension_key: Optional[str] = None
     next_page_token: Optional[str] = None
+    # Set when the results were aggregated locally from a finer granularity
+    derived: bool = False
+    source_granularity: Optional[str] = None
 
 
 class DimensionRequest(BaseModel):
     credentials: AWSCredentials
     dimension: str
     time_period: TimePeriod
+    prefix: Optional[str] = None  # Case-insensitive prefix match
+    limit: Optional[int] = Field(default=None, ge=1)
+    offset: int = Field(default=0, ge=0)
 
 
 class AccountInfoRequest(BaseModel):
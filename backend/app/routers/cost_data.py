@@ -1,23 +1,256 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.config import settings
 from app.models.billing import (
-    CostDataRequest, CostDataResponse, DimensionRequest, 
-    AccountInfoRequest, TimePeriod
+    BatchCostDataRequest, CostDataRequest, CostDataResponse, CostExportRequest, DimensionRequest, 
+    AccountInfoRequest, AnomalyRequest, ForecastRequest, MultiAccountCostDataRequest
 )
-from app.models.credentials import CredentialValidationRequest, CredentialValidationResponse
+from app.models.credentials import AWSCredentials, CredentialValidationRequest, CredentialValidationResponse
+from app.services.anomalies import anomaly_detector
 from app.services.aws_cost_explorer import cost_explorer_service
-from datetime import datetime, timedelta
-from typing import Optional
+from app.services.batch import batch_query_service
+from app.services.cache import response_cache
+from app.services.cache_warming import cache_warmer
+from app.services.cur import cur_data_source
+from app.services.dimension_catalog import dimension_catalog
+from app.services.encoding import body_etag, compress, dumps, etag_matches, negotiate_encoding
+from app.services.export import EXPORT_FORMATS, CostExporter
+from app.services.forecast import forecast_service
+from app.services.multi_account import multi_account_service
+from app.services.query_planner import query_planner
+from app.services.rate_limiter import ThrottledError
+from app.services.simple_query import build_simple_request
+from app.services.spend_governor import spend_governor
+from app.services.streaming import STREAM_FORMATS, CostStreamer
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
 router = APIRouter()
 
+# Media type of the column-wise compact cost data format (CostFrame.to_compact)
+COMPACT_MEDIA_TYPE = "application/vnd.aws-billing.compact+json"
+
+
+async def _cached(response: Response, namespace: str, credentials: AWSCredentials,
+                  cache_request: Any, producer: Callable[[], Awaitable[Any]]) -> Any:
+    """Serve a result from the response cache, calling AWS through ``producer`` on a miss.
+    
+    Identical requests that miss at the same time share a single upstream call.
+    Stale entries are served immediately and refreshed in the background - or,
+    once the account nears its Cost Explorer budget, served as they are.
+    """
+    def cache_key() -> str:
+        return response_cache.make_key(namespace, credentials, cache_request)
+    
+    budget_mode = spend_governor.mode(await cost_explorer_service.resolve_account_key(credentials))
+    key = cache_key()
+    if budget_mode != "normal":
+        response.headers["X-Budget-Mode"] = budget_mode
+    
+    if settings.cache_enabled:
+        entry = await response_cache.lookup(key)
+        response.headers["X-Cache-Backend"] = response_cache.backend
+        cache_warmer.track(key, credentials, producer, age=entry[1] if entry is not None else None)
+        if entry is not None:
+            value, age = entry
+            if age < response_cache.ttl:
+                response.headers["X-Cache"] = "HIT"
+            else:
+                response.headers["X-Cache"] = "STALE"
+                if budget_mode == "normal":
+                    cache_warmer.revalidate(key, producer)
+                else:
+                    response.headers["Warning"] = '110 - "Response is Stale"'
+            return value
+    
+    # The first fetch for new credentials re-keys them by account, so store under the key after it
+    value, shared = await cache_warmer.refresh(key, producer, store_key=cache_key)
+    if shared:
+        response.headers["X-Cache"] = "COALESCED"
+    else:
+        response.headers["X-Cache"] = "MISS" if settings.cache_enabled else "BYPASS"
+    return value
+
+
+async def _cached_cost_data(request: CostDataRequest, response: Response, compact: bool = False) -> dict:
+    """Cost and usage data for a request, shared by /cost-data and /cost-data-simple.
+    
+    Logically identical requests share one cache entry, and a miss is answered
+    from a broader cached result when the planner can do so exactly.
+    """
+    request = query_planner.canonicalize(request)
+    
+    async def fetch():
+        return await query_planner.get_cost_and_usage(request, compact=compact)
+    
+    return await _cached(
+        response, "cost-data-compact" if compact else "cost-data", request.credentials,
+        request.model_dump(exclude={"credentials"}), fetch
+    )
+
+
+def _wants_compact(http_request: Request, format: Optional[str]) -> bool:
+    """Whether the caller asked for the compact format, via ``format=`` or the Accept header"""
+    if format is not None:
+        if format not in ("json", "compact"):
+            raise ValueError(f"Unsupported format '{format}', expected 'json' or 'compact'")
+        return format == "compact"
+    return COMPACT_MEDIA_TYPE in http_request.headers.get("accept", "")
+
+
+async def _encoded_response(content: Any, http_request: Request, response: Response, compact: bool) -> Response:
+    """Send already-rendered cost data as is (skipping response model validation) with a strong ETag.
+    
+    Answers 304 when the caller already has this body and compresses it when accepted.
+    """
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    headers["Vary"] = "Accept, Accept-Encoding"
+    body = dumps(content)
+    
+    encoding = None
+    if settings.compression_enabled and len(body) >= settings.compression_min_size:
+        encoding = negotiate_encoding(http_request.headers.get("accept-encoding"))
+    headers["ETag"] = body_etag(body, encoding)
+    
+    if etag_matches(http_request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    if encoding:
+        # Large bodies take a while to compress - keep the event loop free
+        body = await asyncio.to_thread(compress, body, encoding)
+        headers["Content-Encoding"] = encoding
+    
+    return Response(content=body, headers=headers, media_type=COMPACT_MEDIA_TYPE if compact else "application/json")
+
 
 @router.post("/cost-data", response_model=CostDataResponse)
-async def get_cost_data(request: CostDataRequest):
+async def get_cost_data(
+    request: CostDataRequest,
+    http_request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="'json' (default) or 'compact'")
+):
     """Get cost and usage data with user-provided AWS credentials"""
     try:
-        result = await cost_explorer_service.get_cost_and_usage(request)
-        return result
+        compact = _wants_compact(http_request, format)
+        result = await _cached_cost_data(request, response, compact=compact)
+        return await _encoded_response(result, http_request, response, compact)
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/cost-data/batch")
+async def get_batch_cost_data(request: BatchCostDataRequest):
+    """Answer several cost queries for one credential in one round trip, merging compatible ones upstream"""
+    try:
+        result = await batch_query_service.get_cost_and_usage(request)
+        return JSONResponse(content=result)
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/cost-data/multi-account")
+async def get_multi_account_cost_data(request: MultiAccountCostDataRequest):
+    """Run one cost query across several accounts, returning per-account results and a merged rollup"""
+    try:
+        result = await multi_account_service.get_cost_and_usage(request)
+        return JSONResponse(content=result)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/cost-data/cur", response_model=CostDataResponse)
+async def get_cur_cost_data(
+    request: CostDataRequest,
+    http_request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="'json' (default) or 'compact'")
+):
+    """Answer a cost data request from local Cost and Usage Report files instead of Cost Explorer"""
+    try:
+        compact = _wants_compact(http_request, format)
+        result = await cur_data_source.get_cost_and_usage(request, compact=compact)
+        return await _encoded_response(result, http_request, response, compact)
         
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+async def _prepend(first: Any, rest: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    yield first
+    async for item in rest:
+        yield item
+
+
+@router.post("/cost-data/export")
+async def export_cost_data(request: CostExportRequest):
+    """Stream cost and usage data as CSV, NDJSON or Parquet, following every page"""
+    try:
+        if request.format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {request.format}. Use one of: {', '.join(EXPORT_FORMATS)}")
+        media_type, extension = EXPORT_FORMATS[request.format]
+        
+        # Fetch the first page before streaming so credential and AWS errors still return a 400
+        pages = cost_explorer_service.iter_cost_pages(request)
+        first_page = await pages.__anext__()
+        chunks = CostExporter(request).stream(_prepend(first_page, pages), request.format)
+        
+        filename = f"cost-data-{request.time_period.start}-{request.time_period.end}.{extension}"
+        return StreamingResponse(
+            chunks,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/forecast")
+async def get_forecast(request: ForecastRequest):
+    """Project month-end and next-N-day costs per group from daily history, with prediction intervals"""
+    try:
+        result = await forecast_service.forecast(request)
+        return JSONResponse(content=result)
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/anomalies")
+async def get_anomalies(request: AnomalyRequest):
+    """Flag daily cost spikes per group across one or more accounts using rolling median/MAD baselines"""
+    try:
+        result = await anomaly_detector.detect(request)
+        return JSONResponse(content=result)
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -25,17 +258,23 @@ async def get_cost_data(request: CostDataRequest):
 
 
 @router.post("/dimensions")
-async def get_dimension_values(request: DimensionRequest):
-    """Get dimension values with user-provided AWS credentials"""
+async def get_dimension_values(request: DimensionRequest, response: Response):
+    """Get dimension values with user-provided AWS credentials, optionally filtered by prefix and paged"""
     try:
-        values = await cost_explorer_service.get_dimension_values(
-            request.credentials, 
-            request.dimension, 
-            request.time_period
+        page, status = await dimension_catalog.query(
+            request.credentials,
+            request.dimension,
+            request.time_period,
+            prefix=request.prefix,
+            limit=request.limit,
+            offset=request.offset
         )
+        response.headers["X-Cache"] = status
         
-        return {"dimension": request.dimension, "values": values}
+        return {"dimension": request.dimension, **page}
         
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -73,7 +312,10 @@ async def validate_credentials(request: CredentialValidationRequest):
 # Convenience endpoint to build cost data request with simplified parameters
 @router.post("/cost-data-simple", response_model=CostDataResponse)
 async def get_cost_data_simple(
-    request_data: dict
+    request_data: dict,
+    http_request: Request,
+    response: Response,
+    format: Optional[str] = Query(None, description="'json' (default) or 'compact'")
 ):
     """
     Simplified cost data endpoint that accepts a dictionary and builds the proper request
@@ -82,7 +324,8 @@ async def get_cost_data_simple(
         "credentials": {"access_key_id": "...", "secret_access_key": "...", "region": "..."},
         "start_date": "2025-08-01",  # Optional, defaults to 30 days ago
         "end_date": "2025-08-24",    # Optional, defaults to today
-        "granularity": "DAILY",      # Optional, defaults to DAILY
+        "granularity": "DAILY",      # Optional, defaults to DAILY (also WEEKLY, MONTHLY, QUARTERLY)
+        "resample": false,           # Optional, derive MONTHLY from cached DAILY data when possible
         "group_by_dimension": "SERVICE", # Optional
         "metrics": "BlendedCost",    # Optional, defaults to BlendedCost
         "service_filter": "Amazon EC2", # Optional
@@ -91,129 +334,59 @@ async def get_cost_data_simple(
         "include_support": true,        # Optional, defaults to true
         "include_other_subscription": true, # etc...
     }
+    Pass format=compact (or Accept: application/vnd.aws-billing.compact+json) for the compact format.
     """
     try:
-        # Extract credentials
-        if "credentials" not in request_data:
-            raise ValueError("AWS credentials are required")
-        
-        from app.models.credentials import AWSCredentials
-        credentials = AWSCredentials(**request_data["credentials"])
-        
-        # Default dates
-        start_date = request_data.get("start_date")
-        end_date = request_data.get("end_date")
-        
-        if not start_date or not end_date:
-            end_dt = datetime.now().date()
-            start_dt = end_dt - timedelta(days=30)
-            start_date = start_dt.strftime("%Y-%m-%d")
-            end_date = end_dt.strftime("%Y-%m-%d")
-        
-        # Parse metrics
-        metrics_str = request_data.get("metrics", "BlendedCost")
-        metrics_list = [m.strip() for m in metrics_str.split(",")]
-        
-        # Build group_by list
-        group_by = []
-        group_by_dimension = request_data.get("group_by_dimension")
-        if group_by_dimension:
-            group_by.append({
-                "Type": "DIMENSION",
-                "Key": group_by_dimension
-            })
-        
-        # Build filter conditions
-        filter_conditions = []
-        
-        # Service filter
-        service_filter = request_data.get("service_filter")
-        if service_filter:
-            filter_conditions.append({
-                "Dimensions": {
-                    "Key": "SERVICE",
-                    "Values": [service_filter]
-                }
-            })
-        
-        # Region filter
-        region_filter = request_data.get("region_filter")
-        if region_filter:
-            filter_conditions.append({
-                "Dimensions": {
-                    "Key": "REGION",
-                    "Values": [region_filter]
-                }
-            })
-        
-        # Charge type filter
-        charge_type = request_data.get("charge_type")
-        if charge_type:
-            filter_conditions.append({
-                "Dimensions": {
-                    "Key": "RECORD_TYPE",
-                    "Values": [charge_type]
-                }
-            })
-        
-        # Build charge type exclusions
-        charge_type_exclusions = []
-        
-        include_support = request_data.get("include_support", True)
-        include_other_subscription = request_data.get("include_other_subscription", True)
-        include_upfront = request_data.get("include_upfront", True)
-        include_refund = request_data.get("include_refund", True)
-        include_credit = request_data.get("include_credit", True)
-        include_ri_fee = request_data.get("include_ri_fee", True)
-        
-        if not include_support:
-            charge_type_exclusions.append("Support")
-        if not include_other_subscription:
-            charge_type_exclusions.append("Other_Subscription")
-        if not include_upfront:
-            charge_type_exclusions.append("Fee")
-        if not include_refund:
-            charge_type_exclusions.append("Refund")
-        if not include_credit:
-            charge_type_exclusions.append("Credit")
-        if not include_ri_fee:
-            charge_type_exclusions.append("RIFee")
-        
-        if charge_type_exclusions:
-            filter_conditions.append({
-                "Not": {
-                    "Dimensions": {
-                        "Key": "RECORD_TYPE",
-                        "Values": charge_type_exclusions
-                    }
-                }
-            })
-        
-        # Combine filters with AND logic
-        cost_filter = None
-        if filter_conditions:
-            if len(filter_conditions) == 1:
-                cost_filter = filter_conditions[0]
-            else:
-                cost_filter = {
-                    "And": filter_conditions
-                }
-        
-        # Create request
-        request = CostDataRequest(
-            credentials=credentials,
-            time_period=TimePeriod(start=start_date, end=end_date),
-            granularity=request_data.get("granularity", "DAILY"),
-            group_by=group_by,
-            metrics=metrics_list,
-            filter=cost_filter
-        )
+        request = build_simple_request(request_data)
         
-        # Get data from AWS
-        result = await cost_explorer_service.get_cost_and_usage(request)
-        return result
+        # Get data from the cache or AWS
+        compact = _wants_compact(http_request, format)
+        result = await _cached_cost_data(request, response, compact=compact)
+        return await _encoded_response(result, http_request, response, compact)
         
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/cost-data-simple/stream")
+async def stream_cost_data_simple(
+    request_data: dict,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="'ndjson' (default) or 'sse'")
+):
+    """
+    Stream /cost-data-simple results page by page as NDJSON or Server-Sent Events.
+    
+    Takes the same body as /cost-data-simple (HOURLY, DAILY or MONTHLY). Emits a
+    "meta" frame, a "results" frame per Cost Explorer page as soon as it arrives,
+    then a "summary" frame with per-metric totals (or an "error" frame). Results
+    bypass the caches.
+    """
+    try:
+        request = build_simple_request(request_data)
+        if format is None:
+            format = "sse" if "text/event-stream" in http_request.headers.get("accept", "") else "ndjson"
+        if format not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported stream format: {format}. Use one of: {', '.join(STREAM_FORMATS)}")
+        
+        # Fetch the first page before streaming so credential and AWS errors still return a 400
+        pages = cost_explorer_service.iter_cost_pages(request)
+        first_page = await pages.__anext__()
+        chunks = CostStreamer(request).stream(_prepend(first_page, pages), format)
+        
+        return StreamingResponse(
+            chunks,
+            media_type=STREAM_FORMATS[format],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        
+    except ThrottledError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
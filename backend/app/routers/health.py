@@ -1,5 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from app.models.billing import HealthResponse
+from app.services.anomalies import anomaly_detector
+from app.services.bucket_cache import bucket_cache
+from app.services.cache import response_cache
+from app.services.cache_warming import cache_warmer
+from app.services.client_pool import client_pool
+from app.services.cur import cur_data_source
+from app.services.dimension_catalog import dimension_catalog
+from app.services.forecast import forecast_service
+from app.services.identity import identity_cache
+from app.services.metrics import render_metrics
+from app.services.query_planner import query_planner
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
+from app.services.spend_governor import spend_governor
+from app.services.warehouse import cost_warehouse
 from datetime import datetime
 
 router = APIRouter()
@@ -17,4 +32,38 @@ async def health_check():
             timestamp=datetime.now()
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
+
+
+@router.get("/health/stats")
+async def health_stats():
+    """Runtime counters for sizing the backend's pools and caches"""
+    return {
+        "client_pool": client_pool.stats(),
+        "identity_cache": identity_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "cache_warmer": cache_warmer.stats(),
+        "query_planner": query_planner.stats(),
+        "bucket_cache": bucket_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "spend_governor": spend_governor.stats(),
+        "dimension_catalog": dimension_catalog.stats(),
+        "warehouse": cost_warehouse.stats(),
+        "cur": cur_data_source.stats(),
+        "forecast": forecast_service.stats(),
+        "anomalies": anomaly_detector.stats()
+    }
+
+
+@router.get("/usage")
+async def usage():
+    """Billed Cost Explorer requests and estimated cost by route and caller, with budget state"""
+    return spend_governor.usage()
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and AWS call latency, cache and pool counters"""
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
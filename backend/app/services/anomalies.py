@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.config import settings
+from app.models.billing import AccountCostQuery, AnomalyRequest, CostDataRequest, TimePeriod
+from app.services.columnar import CostFrame
+from app.services.hashing import request_digest
+from app.services.identity import identity_cache
+from app.services.multi_account import multi_account_service
+from app.services.query_planner import query_planner
+from app.services.rate_limiter import ThrottledError
+
+logger = logging.getLogger(__name__)
+
+SEASONALITIES = ("weekly", "none")
+
+# MAD -> standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+# Floor on the spread, so flat series do not turn cent-sized changes into huge scores
+MIN_RELATIVE_SPREAD = 0.05
+MIN_SPREAD = 0.01
+# Baseline samples materialized at once when scoring; bounds memory for wide windows
+MAX_SAMPLES = 4_000_000
+
+
+def _middle(ordered: np.ndarray) -> np.ndarray:
+    """Median along the last axis of already sorted values"""
+    size = ordered.shape[-1]
+    if size % 2:
+        return ordered[..., size // 2]
+    return (ordered[..., size // 2 - 1] + ordered[..., size // 2]) / 2
+
+
+def rolling_baseline(matrix: np.ndarray, first: int, window: int, seasonality: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Robust (median, spread) baselines for columns ``first`` onwards of a groups x days matrix.
+    
+    Each day is compared with the ``window`` days before it - or, with weekly
+    seasonality, with the same weekday in the ``window // 7`` weeks before it.
+    The spread is the scaled median absolute deviation, floored.
+    """
+    groups, days = matrix.shape
+    if seasonality == "weekly":
+        lags = 7 * np.arange(1, window // 7 + 1)
+    else:
+        lags = np.arange(1, window + 1)
+    if first < lags[-1]:
+        raise ValueError(f"{first} days of history are not enough for a {window} day window")
+    
+    median = np.empty((groups, days - first))
+    spread = np.empty((groups, days - first))
+    rows_per_block = max(1, MAX_SAMPLES // max(1, (days - first) * len(lags)))
+    for row in range(0, groups, rows_per_block):
+        block = matrix[row:row + rows_per_block]
+        if seasonality == "weekly":
+            samples = np.stack([block[:, first - lag:days - lag] for lag in lags], axis=-1)
+        else:
+            # Window j covers days j .. j + window - 1, i.e. the days before day j + window
+            samples = sliding_window_view(block[:, :-1], window, axis=1)[:, first - window:]
+        # Sorting the short windows is faster than np.median's partitioning here
+        block_median = _middle(np.sort(samples, axis=-1))
+        mad = _middle(np.sort(np.abs(samples - block_median[..., None]), axis=-1))
+        median[row:row + len(block)] = block_median
+        spread[row:row + len(block)] = np.maximum(
+            MAD_SCALE * mad, np.maximum(MIN_RELATIVE_SPREAD * np.abs(block_median), MIN_SPREAD)
+        )
+    return median, spread
+
+
+class _AnomalyState:
+    """Scored, finalized days of one account's query: amounts and baselines per group x day"""
+    __slots__ = ("keys", "key_index", "start", "end", "amount", "expected", "spread", "lock")
+    
+    def __init__(self, start: date):
+        self.keys: List[Tuple[str, ...]] = []
+        self.key_index: Dict[Tuple[str, ...], int] = {}
+        self.start = start
+        self.end = start  # Days [start, end) are stored
+        self.amount = np.zeros((0, 0))
+        self.expected = np.zeros((0, 0))
+        self.spread = np.zeros((0, 0))
+        # Held while days are fetched and scored, so concurrent passes never score a day twice
+        self.lock = asyncio.Lock()
+    
+    def add_keys(self, keys: List[Tuple[str, ...]]):
+        new = [key for key in keys if key not in self.key_index]
+        for key in new:
+            self.key_index[key] = len(self.keys)
+            self.keys.append(key)
+        if new:
+            # Groups first seen now had nothing on the stored days
+            padding = np.zeros((len(new), self.amount.shape[1]))
+            self.amount = np.vstack([self.amount, padding])
+            self.expected = np.vstack([self.expected, padding])
+            self.spread = np.vstack([self.spread, padding + MIN_SPREAD])
+    
+    def append(self, amount: np.ndarray, expected: np.ndarray, spread: np.ndarray, max_days: int):
+        self.amount = np.hstack([self.amount, amount])[:, -max_days:]
+        self.expected = np.hstack([self.expected, expected])[:, -max_days:]
+        self.spread = np.hstack([self.spread, spread])[:, -max_days:]
+        self.end += timedelta(days=amount.shape[1])
+        self.start = self.end - timedelta(days=self.amount.shape[1])
+
+
+class AnomalyDetector:
+    """Cost spike detection over every group x day of one or more accounts.
+    
+    Each day's amount is scored against a rolling median and MAD of the days
+    before it (optionally the same weekday only), for all groups at once. Days
+    Cost Explorer reports as final are scored once and kept per account and
+    query shape, so later passes fetch and score only the days that arrived
+    (or are still estimated) since.
+    
+    A failure while fetching or scoring one account is reported in that
+    account's entry; accounts refused by the rate limiter or spend governor are
+    marked retryable, and when every account was refused ``ThrottledError`` is
+    raised instead.
+    """
+    
+    def __init__(self, max_states: Optional[int] = None, max_days: Optional[int] = None):
+        self.max_states = max_states or settings.anomaly_max_states
+        self.max_days = max_days or settings.anomaly_max_days
+        self._states: "OrderedDict[str, _AnomalyState]" = OrderedDict()
+        self.scans = 0
+        self.days_scored = 0
+        self.state_hits = 0
+        self.last_scan_ms = 0.0
+    
+    async def detect(self, request: AnomalyRequest) -> Dict[str, Any]:
+        if not request.accounts:
+            raise ValueError("At least one account is required")
+        if request.seasonality not in SEASONALITIES:
+            raise ValueError(f"Unsupported seasonality '{request.seasonality}', expected one of: {', '.join(SEASONALITIES)}")
+        if request.time_period is not None:
+            try:
+                start = date.fromisoformat(request.time_period.start)
+                end = date.fromisoformat(request.time_period.end)
+            except ValueError:
+                raise ValueError("time_period needs YYYY-MM-DD dates")
+        else:
+            end = date.today()
+            start = end - timedelta(days=30)
+        if not start < end or (end - start).days > self.max_days:
+            raise ValueError(f"time_period must cover 1 to {self.max_days} days")
+        
+        outcomes = await asyncio.gather(*[
+            self._detect_account(request, account, start, end) for account in request.accounts
+        ])
+        
+        anomalies = []
+        accounts = []
+        for index, (account, outcome) in enumerate(zip(request.accounts, outcomes)):
+            entry = {"index": index, "alias": account.alias, "status": "ok", "error": None}
+            if isinstance(outcome, ThrottledError):
+                entry.update(status="error", error=str(outcome), retryable=True, retry_after=outcome.retry_after)
+            elif isinstance(outcome, Exception):
+                entry.update(status="error", error=str(outcome))
+            else:
+                found, entry["groups"], entry["days_scored"] = outcome
+                entry["anomalies"] = len(found)
+                anomalies.extend({"account": index, "alias": account.alias, **anomaly} for anomaly in found)
+            accounts.append(entry)
+        
+        if all(isinstance(outcome, ThrottledError) for outcome in outcomes):
+            raise ThrottledError(str(outcomes[0]), max(outcome.retry_after for outcome in outcomes))
+        
+        anomalies.sort(key=lambda anomaly: -abs(anomaly["score"]))
+        return {
+            "time_period": {"start": start.isoformat(), "end": end.isoformat()},
+            "metric": request.metric,
+            "group_by": request.group_by,
+            "window_days": request.window_days,
+            "seasonality": request.seasonality,
+            "threshold": request.threshold,
+            "accounts": accounts,
+            "total_anomalies": len(anomalies),
+            "anomalies": anomalies[:request.limit],
+        }
+    
+    async def _detect_account(self, request: AnomalyRequest, account: AccountCostQuery, start: date, end: date):
+        """(anomalies, groups, newly scored days) for one account, or the ValueError it failed with"""
+        try:
+            return await self._scan_account(request, account, start, end)
+        except ValueError as e:
+            return e
+        except Exception as e:
+            logger.error(f"Unexpected error detecting anomalies for account {account.alias or ''}: {e}")
+            return ValueError(f"Failed to detect anomalies: {str(e)}")
+    
+    async def _scan_account(self, request: AnomalyRequest, account: AccountCostQuery, start: date, end: date):
+        shape_request = query_planner.canonicalize(CostDataRequest(
+            credentials=account.credentials,
+            time_period=TimePeriod(start=start.isoformat(), end=end.isoformat()),
+            granularity="DAILY",
+            group_by=request.group_by,
+            metrics=[request.metric],
+            filter=request.filter
+        ))
+        shape = shape_request.model_dump(include={"group_by", "metrics", "filter"})
+        shape_digest = request_digest({**shape, 'window': request.window_days, 'seasonality': request.seasonality})
+        key = f"{identity_cache.tenant_key(account.credentials)}:{shape_digest}"
+        
+        state = self._states.get(key)
+        if state is not None and state.start <= start <= state.end:
+            self.state_hits += 1
+        else:
+            state = self._states[key] = _AnomalyState(start)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        
+        async with state.lock:
+            score_from = state.end
+            days_scored = 0
+            transient = None
+            if score_from < end:
+                fetch_start = score_from - timedelta(days=request.window_days)
+                frame = await multi_account_service.fetch_account_frame(
+                    shape_request.model_copy(update={"time_period": TimePeriod(start=fetch_start.isoformat(), end=end.isoformat())})
+                )
+                transient, days_scored = self._score(state, frame, request, fetch_start, score_from, end)
+                # A first fetch authorizes the credentials for their account, which re-keys the state
+                stored_key = f"{identity_cache.tenant_key(account.credentials)}:{shape_digest}"
+                if stored_key != key and self._states.get(key) is state:
+                    self._states[stored_key] = self._states.pop(key)
+            
+            found = self._flag(state, start, min(end, state.end), request, estimated=False)
+            if transient is not None:
+                found += self._flag(transient, transient.start, end, request, estimated=True)
+        return found, len(state.keys), days_scored
+    
+    def _score(self, state: _AnomalyState, frame: CostFrame, request: AnomalyRequest,
+               fetch_start: date, score_from: date, end: date):
+        """Score days [score_from, end); store the finalized ones in ``state`` and return the rest"""
+        started = time.perf_counter()
+        state.add_keys(frame.keys if request.group_by else [()])
+        num_days = (end - fetch_start).days
+        matrix = np.zeros((len(state.keys), num_days))
+        day_index = (np.array(frame.period_starts, dtype="datetime64[D]") - np.datetime64(fetch_start)).astype(np.int64)
+        if request.group_by:
+            rows = np.array([state.key_index[key] for key in frame.keys], dtype=np.int64)
+            np.add.at(matrix, (rows[frame.row_key], day_index[frame.row_period]),
+                      np.nan_to_num(frame.amounts[request.metric]))
+        else:
+            matrix[0, day_index] = np.nan_to_num(frame.total_amounts[request.metric])
+        
+        first = (score_from - fetch_start).days
+        expected, spread = rolling_baseline(matrix, first, request.window_days, request.seasonality)
+        amount = matrix[:, first:]
+        
+        # Days up to the first estimated one are final and can be kept
+        estimated = np.zeros(num_days, dtype=bool)
+        estimated[day_index] = frame.estimated
+        pending = np.flatnonzero(estimated[first:])
+        final = int(pending[0]) if len(pending) else amount.shape[1]
+        state.append(amount[:, :final], expected[:, :final], spread[:, :final], self.max_days)
+        
+        transient = None
+        if final < amount.shape[1]:
+            transient = _AnomalyState(state.end)
+            transient.add_keys(state.keys)
+            transient.append(amount[:, final:], expected[:, final:], spread[:, final:], self.max_days)
+        
+        self.scans += 1
+        self.days_scored += amount.shape[1]
+        self.last_scan_ms = (time.perf_counter() - started) * 1000
+        return transient, amount.shape[1]
+    
+    @staticmethod
+    def _flag(state: _AnomalyState, start: date, end: date, request: AnomalyRequest, estimated: bool) -> List[Dict[str, Any]]:
+        if start >= end or not state.keys:
+            return []
+        lo = (start - state.start).days
+        hi = (end - state.start).days
+        amount = state.amount[:, lo:hi]
+        expected = state.expected[:, lo:hi]
+        deviation = amount - expected
+        score = deviation / state.spread[:, lo:hi]
+        flagged = score if request.include_drops else np.maximum(score, 0)
+        rows, columns = np.nonzero((np.abs(flagged) >= request.threshold) & (np.abs(deviation) >= request.min_amount))
+        return [
+            {
+                "keys": list(state.keys[row]),
+                "date": (start + timedelta(days=int(column))).isoformat(),
+                "amount": round(float(amount[row, column]), 6),
+                "expected": round(float(expected[row, column]), 6),
+                "deviation": round(float(deviation[row, column]), 6),
+                "score": round(float(score[row, column]), 3),
+                "estimated": estimated,
+            }
+            for row, column in zip(rows.tolist(), columns.tolist())
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "states": len(self._states),
+            "scans": self.scans,
+            "days_scored": self.days_scored,
+            "state_hits": self.state_hits,
+            "last_scan_ms": round(self.last_scan_ms, 3),
+        }
+
+
+# Global instance shared by all requests in this worker
+anomaly_detector = AnomalyDetector()
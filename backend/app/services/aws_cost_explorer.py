@@ -1,16 +1,213 @@
+import asyncio
+import time
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
-from app.models.billing import CostDataRequest, CostDataResponse, ResultByTime, Group, GroupMetrics, Metrics, TimePeriod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from app.config import settings
+from app.models.billing import CostDataRequest, TimePeriod
 from app.models.credentials import AWSCredentials, CredentialValidationResponse
-from typing import Dict, Any, List, Optional
+from app.services.bucket_cache import bucket_cache, contiguous_ranges, period_buckets
+from app.services.client_pool import client_pool
+from app.services.columnar import CostFrame
+from app.services.identity import identity_cache
+from app.services.metrics import api_operation_name, aws_call_duration, aws_calls, aws_calls_in_flight, transform_duration
+from app.services.rate_limiter import ThrottledError, rate_limiter
+from app.services.spend_governor import spend_governor
+from app.services.warehouse import cost_warehouse
+from typing import Dict, Any, AsyncIterator, Awaitable, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Cost Explorer error codes that mean "slow down" rather than "this request is wrong"
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException', 'Throttling', 'LimitExceededException',
+    'TooManyRequestsException', 'RequestLimitExceeded'
+}
+
+# Requests AWS rejects before authenticating the caller, which are not billed
+AUTHENTICATION_ERROR_CODES = {
+    'UnrecognizedClientException', 'InvalidClientTokenId', 'ExpiredTokenException',
+    'SignatureDoesNotMatch', 'IncompleteSignature', 'MissingAuthenticationToken'
+}
+
+
+def split_time_period(start: str, end: str, granularity: str) -> List[Tuple[str, str]]:
+    """Split a DAILY/HOURLY time period into calendar-month windows that can be fetched in parallel.
+    
+    MONTHLY queries and periods given as timestamps are returned as a single window.
+    """
+    if granularity == 'MONTHLY' or len(start) != 10 or len(end) != 10:
+        return [(start, end)]
+    
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    
+    windows = []
+    window_start = start_date
+    while window_start < end_date:
+        next_month = (window_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        window_end = min(next_month, end_date)
+        windows.append((window_start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")))
+        window_start = window_end
+    
+    return windows or [(start, end)]
+
+
+def merge_results_by_time(pages: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Merge raw ResultsByTime from several pages/windows into one list ordered by period.
+    
+    Grouped queries can return the same period on more than one page, so the
+    groups for a repeated period are concatenated.
+    """
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for page in pages:
+        for result in page:
+            key = (result['TimePeriod']['Start'], result['TimePeriod']['End'])
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = {**result, 'Groups': list(result.get('Groups', []))}
+            else:
+                existing['Groups'].extend(result.get('Groups', []))
+                existing['Estimated'] = existing.get('Estimated', False) or result.get('Estimated', False)
+    
+    return [merged[key] for key in sorted(merged)]
+
+
+async def gather_or_cancel(coroutines: List[Awaitable[Any]]) -> List[Any]:
+    """Like asyncio.gather, but cancels the remaining calls as soon as one fails"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
 
 class AWSCostExplorerService:
-    """Stateless AWS Cost Explorer service that creates clients per request"""
+    """Stateless AWS Cost Explorer service using per-credential pooled clients.
+    
+    boto3 is synchronous, so every client call is run on a bounded thread pool
+    under a per-service concurrency limit instead of blocking the event loop.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, concurrency_limits: Optional[Dict[str, int]] = None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.aws_executor_max_workers,
+            thread_name_prefix="aws-call"
+        )
+        self._concurrency_limits = concurrency_limits or {
+            'ce': settings.ce_max_concurrency,
+            'sts': settings.sts_max_concurrency,
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+    
+    def _semaphore(self, service_name: str) -> asyncio.Semaphore:
+        """Get the concurrency limiter for an AWS service, creating it on first use"""
+        semaphore = self._semaphores.get(service_name)
+        if semaphore is None:
+            limit = self._concurrency_limits.get(service_name, settings.aws_executor_max_workers)
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[service_name] = semaphore
+        return semaphore
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking function on the AWS executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
+    async def _invoke(self, client, service_name: str, operation: str, **kwargs) -> Dict[str, Any]:
+        """Run one attempt of a boto3 operation under the service's concurrency limit, recording call metrics"""
+        api_name = api_operation_name(operation)
+        async with self._semaphore(service_name):
+            aws_calls_in_flight.labels(service_name).inc()
+            started = time.perf_counter()
+            outcome = 'ok'
+            try:
+                return await self._run_blocking(getattr(client, operation), **kwargs)
+            except ClientError as e:
+                outcome = e.response.get('Error', {}).get('Code', '') or 'ClientError'
+                raise
+            except Exception as e:
+                outcome = type(e).__name__
+                raise
+            finally:
+                aws_call_duration.labels(service_name, api_name).observe(time.perf_counter() - started)
+                aws_calls_in_flight.labels(service_name).dec()
+                aws_calls.labels(service_name, api_name, outcome).inc()
+    
+    @asynccontextmanager
+    async def _client(self, credentials: AWSCredentials, service_name: str = 'ce'):
+        """Lease a pooled client for the block, creating it off the event loop on a miss (session setup loads service models from disk)"""
+        client = client_pool.acquire(credentials, service_name)
+        if client is None:
+            client = client_pool.add(
+                credentials, service_name,
+                await self._run_blocking(self.create_client, credentials, service_name)
+            )
+        try:
+            yield client
+        finally:
+            client_pool.release(client)
+    
+    async def _call(self, client, service_name: str, operation: str,
+                    rate_limit_key: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Call a boto3 client operation without blocking the event loop.
+        
+        With a ``rate_limit_key`` the call first queues on that account's
+        adaptive rate limiter, and throttling or transient AWS errors are retried
+        with jittered exponential backoff until the queue-wait deadline. Each
+        Cost Explorer attempt is charged to the spend governor, which may refuse it.
+        """
+        if rate_limit_key is None:
+            return await self._invoke(client, service_name, operation, **kwargs)
+        
+        deadline = time.monotonic() + settings.ce_queue_max_wait
+        attempt = 0
+        while True:
+            await rate_limiter.acquire(rate_limit_key, deadline)
+            charged = service_name == 'ce'
+            if charged:
+                # Every attempt is billed, so each one is charged against the budget
+                spend_governor.charge(rate_limit_key, operation)
+            try:
+                response = await self._invoke(client, service_name, operation, **kwargs)
+                rate_limiter.on_success(rate_limit_key)
+                return response
+            except ClientError as e:
+                error_code = e.response.get('Error', {}).get('Code', '')
+                if charged and error_code in AUTHENTICATION_ERROR_CODES:
+                    # Rejected before authentication, so not billed
+                    charged = False
+                    spend_governor.settle(rate_limit_key, operation, billed=False)
+                status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+                throttled = error_code in THROTTLING_ERROR_CODES
+                if not throttled and status_code < 500:
+                    raise
+                if throttled:
+                    rate_limiter.on_throttle(rate_limit_key)
+                
+                delay = rate_limiter.backoff(attempt)
+                attempt += 1
+                if attempt > settings.ce_max_retries or time.monotonic() + delay > deadline:
+                    if throttled:
+                        raise ThrottledError("Cost Explorer is throttling requests for this account, please retry shortly")
+                    raise
+                logger.warning(f"Retrying {operation} after {error_code} (attempt {attempt}) in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            finally:
+                if charged:
+                    spend_governor.settle(rate_limit_key, operation)
+    
+    def shutdown(self):
+        """Release the AWS executor threads and pooled clients"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        client_pool.clear()
     
     def create_client(self, credentials: AWSCredentials, service_name: str = 'ce'):
         """Create a new AWS client with the provided credentials"""
@@ -20,21 +217,47 @@ class AWSCostExplorerService:
                 aws_secret_access_key=credentials.secret_access_key,
                 region_name=credentials.region
             )
-            return session.client(service_name)
+            # Size the HTTP connection pool for the threads that may share this client.
+            # Cost Explorer retries are handled by _call so they can feed the rate limiter.
+            config = Config(max_pool_connections=settings.aws_executor_max_workers)
+            if service_name == 'ce':
+                config = config.merge(Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+            return session.client(service_name, config=config)
         except Exception as e:
             logger.error(f"Failed to create AWS {service_name} client: {e}")
             raise ValueError(f"Failed to create AWS client: {str(e)}")
     
+    async def _caller_identity(self, credentials: AWSCredentials) -> dict:
+        """STS GetCallerIdentity for the credentials"""
+        async with self._client(credentials, 'sts') as sts_client:
+            response = await self._call(sts_client, 'sts', 'get_caller_identity')
+        return {
+            "account_id": response.get('Account'),
+            "user_id": response.get('UserId'),
+            "arn": response.get('Arn')
+        }
+    
+    async def resolve_account_key(self, credentials: AWSCredentials) -> str:
+        """Rate-limit and budget key for credentials, resolving their account first.
+        
+        Resolving up front (STS calls are free and cached) keeps the key the same
+        from the first Cost Explorer call on; if STS fails the credentials key themselves.
+        """
+        try:
+            await identity_cache.resolve(credentials, partial(self._caller_identity, credentials))
+        except Exception as e:
+            logger.warning(f"Could not resolve the account behind credentials: {e}")
+        return identity_cache.account_key(credentials)
+    
     async def validate_credentials(self, credentials: AWSCredentials) -> CredentialValidationResponse:
         """Validate AWS credentials by making a simple API call"""
         try:
-            # Create STS client to get caller identity (lightweight operation)
-            sts_client = self.create_client(credentials, 'sts')
-            response = sts_client.get_caller_identity()
+            # Caller identity (lightweight, and shared with account info through the identity cache)
+            identity = await identity_cache.resolve(credentials, partial(self._caller_identity, credentials))
             
             return CredentialValidationResponse(
                 valid=True,
-                account_id=response.get('Account')
+                account_id=identity["account_id"]
             )
         except ClientError as e:
             error_code = e.response.get('Error', {}).get('Code', 'Unknown')
@@ -59,80 +282,22 @@ class AWSCostExplorerService:
                 error=f"Failed to validate credentials: {str(e)}"
             )
     
-    async def get_cost_and_usage(self, request: CostDataRequest) -> CostDataResponse:
-        """Get cost and usage data using the provided credentials"""
+    async def _fetch_cost_frame(self, request: CostDataRequest, use_bucket_cache: bool = True) -> CostFrame:
+        """Get cost and usage data from Cost Explorer (through the bucket cache) as a CostFrame"""
         try:
-            # Create Cost Explorer client with provided credentials
-            client = self.create_client(request.credentials)
-            
-            # Prepare the request for AWS API
-            aws_request = {
-                'TimePeriod': {
-                    'Start': request.time_period.start,
-                    'End': request.time_period.end
-                },
-                'Granularity': request.granularity,
-                'Metrics': request.metrics
-            }
+            # Lease a Cost Explorer client for the provided credentials
+            async with self._client(request.credentials) as client:
+                aws_request = self._build_aws_request(request)
+                raw_results = await self._fetch_results(client, request.credentials, aws_request,
+                                                        request.time_period.start, request.time_period.end,
+                                                        use_bucket_cache)
             
-            # Add grouping if specified
-            if request.group_by:
-                aws_request['GroupBy'] = request.group_by
-            
-            # Add filter if specified
-            if request.filter:
-                aws_request['Filter'] = request.filter
-            
-            # Call AWS Cost Explorer API
-            response = client.get_cost_and_usage(**aws_request)
-            
-            # Transform AWS response to our model
-            results = []
-            for result in response.get('ResultsByTime', []):
-                groups = []
-                for group in result.get('Groups', []):
-                    # Extract metrics
-                    metrics_data = {}
-                    for metric_name, metric_value in group.get('Metrics', {}).items():
-                        metrics_data[metric_name] = Metrics(
-                            amount=metric_value.get('Amount', '0'),
-                            unit=metric_value.get('Unit', 'USD')
-                        )
-                    
-                    groups.append(Group(
-                        keys=group.get('Keys', []),
-                        metrics=GroupMetrics(**metrics_data)
-                    ))
-                
-                # Extract total metrics if no grouping
-                total_metrics = None
-                if 'Total' in result:
-                    total_data = {}
-                    for metric_name, metric_value in result['Total'].items():
-                        total_data[metric_name] = Metrics(
-                            amount=metric_value.get('Amount', '0'),
-                            unit=metric_value.get('Unit', 'USD')
-                        )
-                    total_metrics = GroupMetrics(**total_data)
-                
-                results.append(ResultByTime(
-                    time_period=TimePeriod(
-                        start=result['TimePeriod']['Start'],
-                        end=result['TimePeriod']['End']
-                    ),
-                    total=total_metrics,
-                    groups=groups,
-                    estimated=result.get('Estimated', False)
-                ))
-            
-            return CostDataResponse(
-                time_period=request.time_period,
-                granularity=request.granularity,
-                group_by=request.group_by,
-                results=results,
-                next_page_token=response.get('NextPageToken')
-            )
+            # Transform AWS response into columns
+            with transform_duration.labels('parse').time():
+                return CostFrame.from_results(raw_results, request.metrics)
             
+        except ThrottledError:
+            raise
         except ClientError as e:
             error_message = e.response['Error']['Message']
             logger.error(f"AWS API error: {e}")
@@ -141,21 +306,204 @@ class AWSCostExplorerService:
             logger.error(f"Unexpected error in get_cost_and_usage: {e}")
             raise ValueError(f"Failed to retrieve cost data: {str(e)}")
     
+    async def get_resampled_frame(self, request: CostDataRequest, fetch_missing: bool,
+                                  use_bucket_cache: bool = True) -> Optional[CostFrame]:
+        """Derive a WEEKLY/MONTHLY/QUARTERLY frame by aggregating DAILY data.
+        
+        Uses the bucket cache's DAILY series for the same query. When some days
+        are not cached they are fetched from Cost Explorer if ``fetch_missing``
+        is set, otherwise None is returned so the caller can query CE directly.
+        """
+        start, end = request.time_period.start, request.time_period.end
+        daily_request = request.model_copy(update={'granularity': 'DAILY'})
+        buckets = period_buckets(start, end, 'DAILY')
+        if buckets is None:
+            raise ValueError(f"{request.granularity} granularity requires YYYY-MM-DD dates")
+        
+        if not fetch_missing:
+            if not use_bucket_cache:
+                return None
+            series_key = bucket_cache.series_key(request.credentials, self._build_aws_request(daily_request))
+            if len(bucket_cache.lookup(series_key, buckets)) < len(buckets):
+                return None
+        
+        daily_frame = await self._fetch_cost_frame(daily_request, use_bucket_cache)
+        return daily_frame.resample(request.granularity, start, end)
+    
+    async def get_cost_frame(self, request: CostDataRequest, use_warehouse: bool = True,
+                             use_bucket_cache: bool = True) -> CostFrame:
+        """Get cost and usage data as a columnar CostFrame using the provided credentials.
+        
+        Requests the local warehouse covers are answered from it. WEEKLY and
+        QUARTERLY (which Cost Explorer does not offer) are always derived from
+        DAILY data; MONTHLY is derived when ``request.resample`` is set and the
+        DAILY data is already cached. Bulk pulls pass ``use_bucket_cache=False``
+        so they neither read nor fill the in-memory bucket cache.
+        """
+        if use_warehouse:
+            frame = await cost_warehouse.query(request)
+            if frame is not None:
+                return frame
+        
+        if request.granularity in ('WEEKLY', 'QUARTERLY') or (request.resample and request.granularity == 'MONTHLY'):
+            frame = await self.get_resampled_frame(request, fetch_missing=request.granularity != 'MONTHLY',
+                                                   use_bucket_cache=use_bucket_cache)
+            if frame is not None:
+                return frame
+        
+        return await self._fetch_cost_frame(request, use_bucket_cache)
+    
+    async def get_cost_and_usage(self, request: CostDataRequest, compact: bool = False) -> dict:
+        """Get cost and usage data rendered in the CostDataResponse JSON shape, or the column-wise compact shape"""
+        frame = await self.get_cost_frame(request)
+        return self.render(frame, request, compact)
+    
+    @staticmethod
+    def render(frame: CostFrame, request: CostDataRequest, compact: bool = False) -> dict:
+        """Render a frame answering ``request`` in the CostDataResponse shape or the compact shape"""
+        render = frame.to_compact if compact else frame.to_response
+        with transform_duration.labels('render').time():
+            return render(
+                time_period=request.time_period.model_dump(),
+                granularity=request.granularity,
+                group_by=request.group_by
+            )
+    
+    @staticmethod
+    def _build_aws_request(request: CostDataRequest) -> Dict[str, Any]:
+        """GetCostAndUsage parameters for a request, without TimePeriod (set per window)"""
+        aws_request = {
+            'Granularity': request.granularity,
+            'Metrics': request.metrics
+        }
+        
+        # Add grouping if specified
+        if request.group_by:
+            aws_request['GroupBy'] = request.group_by
+        
+        # Add filter if specified
+        if request.filter:
+            aws_request['Filter'] = request.filter
+        
+        return aws_request
+    
+    async def _fetch_results(self, client, credentials: AWSCredentials, aws_request: Dict[str, Any],
+                             start: str, end: str, use_bucket_cache: bool = True) -> List[Dict[str, Any]]:
+        """Raw ResultsByTime for a period, fetching only the buckets missing from the bucket cache"""
+        account_key = await self.resolve_account_key(credentials)
+        buckets = period_buckets(start, end, aws_request['Granularity'])
+        if buckets is None or not settings.bucket_cache_enabled or not use_bucket_cache:
+            results = await self._fetch_range(client, account_key, aws_request, [(start, end)])
+            identity_cache.authorize(credentials)
+            return results
+        
+        cached = bucket_cache.lookup(bucket_cache.series_key(credentials, aws_request), buckets)
+        missing = [bucket for bucket in buckets if bucket not in cached]
+        
+        fetched = {}
+        if missing:
+            results = await self._fetch_range(client, account_key, aws_request, contiguous_ranges(missing))
+            identity_cache.authorize(credentials)
+            # Keyed after authorizing, so the results land in the series later requests read
+            bucket_cache.store(bucket_cache.series_key(credentials, aws_request), results)
+            fetched = {(result['TimePeriod']['Start'], result['TimePeriod']['End']): result for result in results}
+        
+        # Stitch cached and fetched buckets back together in period order
+        stitched = []
+        for bucket in buckets:
+            result = cached.get(bucket) or fetched.get(bucket)
+            if result is not None:
+                stitched.append(result)
+        return stitched
+    
+    async def _fetch_range(self, client, account_key: str, aws_request: Dict[str, Any],
+                           ranges: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Fetch every page of every month window in ``ranges``, a bounded number of windows at a time"""
+        windows = [
+            window
+            for start, end in ranges
+            for window in split_time_period(start, end, aws_request['Granularity'])
+        ]
+        window_limit = asyncio.Semaphore(settings.ce_window_concurrency)
+        
+        async def fetch_window(start: str, end: str) -> List[Dict[str, Any]]:
+            async with window_limit:
+                return await self._fetch_all_pages(client, account_key, {**aws_request, 'TimePeriod': {'Start': start, 'End': end}})
+        
+        window_results = await gather_or_cancel([fetch_window(start, end) for start, end in windows])
+        return merge_results_by_time(window_results)
+    
+    async def _fetch_all_pages(self, client, account_key: str, aws_request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Call GetCostAndUsage until NextPageToken is exhausted, returning raw ResultsByTime"""
+        results = []
+        async for page in self._iter_pages(client, account_key, aws_request):
+            results.extend(page)
+        return results
+    
+    async def _iter_pages(self, client, account_key: str, aws_request: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the raw ResultsByTime of each GetCostAndUsage page"""
+        page_request = dict(aws_request)
+        while True:
+            response = await self._call(client, 'ce', 'get_cost_and_usage', rate_limit_key=account_key, **page_request)
+            yield response.get('ResultsByTime', [])
+            
+            next_page_token = response.get('NextPageToken')
+            if not next_page_token:
+                return
+            page_request['NextPageToken'] = next_page_token
+    
+    async def iter_cost_pages(self, request: CostDataRequest) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield raw ResultsByTime one page at a time, window by window.
+        
+        Only one page is held in memory, so callers can stream arbitrarily long
+        ranges. Results bypass the caches.
+        """
+        if request.granularity not in ('HOURLY', 'DAILY', 'MONTHLY'):
+            raise ValueError(f"Granularity {request.granularity} is not supported by Cost Explorer")
+        
+        try:
+            account_key = await self.resolve_account_key(request.credentials)
+            aws_request = self._build_aws_request(request)
+            async with self._client(request.credentials) as client:
+                for start, end in split_time_period(request.time_period.start, request.time_period.end, request.granularity):
+                    async for page in self._iter_pages(client, account_key, {**aws_request, 'TimePeriod': {'Start': start, 'End': end}}):
+                        yield page
+        except ClientError as e:
+            error_message = e.response['Error']['Message']
+            logger.error(f"AWS API error: {e}")
+            raise ValueError(f"AWS API error: {error_message}")
+    
     async def get_dimension_values(self, credentials: AWSCredentials, dimension: str, time_period: TimePeriod) -> List[str]:
         """Get dimension values using the provided credentials"""
         try:
-            client = self.create_client(credentials)
-            
-            response = client.get_dimension_values(
-                TimePeriod={
+            account_key = await self.resolve_account_key(credentials)
+            dimension_request = {
+                'TimePeriod': {
                     'Start': time_period.start,
                     'End': time_period.end
                 },
-                Dimension=dimension
-            )
+                'Dimension': dimension
+            }
             
-            return [item['Value'] for item in response.get('DimensionValues', [])]
+            async with self._client(credentials) as client:
+                # Follow NextPageToken - large dimensions (USAGE_TYPE, RESOURCE_ID) span many pages
+                values = []
+                while True:
+                    response = await self._call(
+                        client, 'ce', 'get_dimension_values',
+                        rate_limit_key=account_key,
+                        **dimension_request
+                    )
+                    values.extend(item['Value'] for item in response.get('DimensionValues', []))
+                    
+                    next_page_token = response.get('NextPageToken')
+                    if not next_page_token:
+                        identity_cache.authorize(credentials)
+                        return values
+                    dimension_request['NextPageToken'] = next_page_token
             
+        except ThrottledError:
+            raise
         except ClientError as e:
             error_message = e.response['Error']['Message']
             logger.error(f"AWS API error getting dimension values: {e}")
@@ -167,15 +515,7 @@ class AWSCostExplorerService:
     async def get_account_info(self, credentials: AWSCredentials) -> dict:
         """Get AWS account information using the provided credentials"""
         try:
-            # Create STS client to get account information
-            sts_client = self.create_client(credentials, 'sts')
-            response = sts_client.get_caller_identity()
-            
-            return {
-                "account_id": response.get('Account'),
-                "user_id": response.get('UserId'), 
-                "arn": response.get('Arn')
-            }
+            return await identity_cache.resolve(credentials, partial(self._caller_identity, credentials))
                 
         except ClientError as e:
             error_message = e.response['Error']['Message']
@@ -0,0 +1,185 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from app.models.billing import BatchCostDataRequest, BatchQuery, CostDataRequest
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.columnar import CostFrame
+from app.services.hashing import request_digest
+from app.services.identity import identity_cache
+from app.services.rate_limiter import ThrottledError
+from app.services.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# Cost Explorer accepts at most two GroupBy entries per query
+MAX_GROUP_BY = 2
+
+GroupKey = Tuple[str, str]
+
+
+class _UpstreamQuery:
+    """One Cost Explorer query serving several batch queries"""
+    
+    def __init__(self, shape: Dict[str, Any]):
+        self.shape = shape
+        self.group_keys: List[GroupKey] = []
+        self.metrics: List[str] = []
+        self.members: List[int] = []
+    
+    def can_take(self, group_keys: List[GroupKey]) -> bool:
+        return len(set(self.group_keys) | set(group_keys)) <= MAX_GROUP_BY
+    
+    def add(self, index: int, query: BatchQuery, group_keys: List[GroupKey]):
+        for group_key in group_keys:
+            if group_key not in self.group_keys:
+                self.group_keys.append(group_key)
+        for metric in query.metrics:
+            if metric not in self.metrics:
+                self.metrics.append(metric)
+        self.members.append(index)
+
+
+class BatchQueryService:
+    """Answers several cost queries for one credential with as few Cost Explorer calls as possible.
+    
+    Identical queries are answered once. Queries with the same time period,
+    granularity and filter are merged into one query grouped by the union of
+    their dimensions (at most two), and each original grouping is recovered
+    locally by summing over the other dimension; ungrouped queries are the sum
+    of all groups. The merged queries then run concurrently. A query whose
+    metrics come back with mixed units in the merged result (summing them would
+    not be exact) is sent to Cost Explorer on its own instead.
+    
+    Queries refused by the rate limiter or spend governor are marked retryable
+    with a ``retry_after``; when every query was refused the whole batch raises
+    ``ThrottledError`` so the caller gets a 429.
+    """
+    
+    async def get_cost_and_usage(self, request: BatchCostDataRequest) -> Dict[str, Any]:
+        if not request.queries:
+            raise ValueError("At least one query is required")
+        
+        # Deduplicate identical queries
+        unique: Dict[str, int] = {}
+        query_slot = []
+        distinct: List[BatchQuery] = []
+        for query in request.queries:
+            digest = request_digest(query.model_dump(exclude={"id"}))
+            if digest not in unique:
+                unique[digest] = len(distinct)
+                distinct.append(query)
+            query_slot.append(unique[digest])
+        
+        upstream = self._plan(distinct)
+        answers: List[Dict[str, Any]] = [None] * len(distinct)
+        unmerged = await self._answer(request, distinct, upstream, answers)
+        if unmerged:
+            separate = [self._single(index, distinct[index]) for index in unmerged]
+            await self._answer(request, distinct, separate, answers)
+            upstream += separate
+        
+        if all(answer["retryable"] for answer in answers):
+            raise ThrottledError(answers[0]["error"], max(answer["retry_after"] for answer in answers))
+        
+        return {
+            "results": [
+                {"id": query.id, **answers[slot]}
+                for query, slot in zip(request.queries, query_slot)
+            ],
+            "distinct_queries": len(distinct),
+            "upstream_queries": len(upstream),
+        }
+    
+    async def _answer(self, request: BatchCostDataRequest, queries: List[BatchQuery],
+                      upstream: List[_UpstreamQuery], answers: List[Dict[str, Any]]) -> List[int]:
+        """Run upstream queries and derive each member's answer; returns members that must run on their own"""
+        outcomes = await asyncio.gather(
+            *[self._run(request, plan) for plan in upstream], return_exceptions=True
+        )
+        
+        unmerged = []
+        for plan, outcome in zip(upstream, outcomes):
+            for index in plan.members:
+                query = queries[index]
+                if isinstance(outcome, CostFrame):
+                    data = self._derive(outcome, plan, query)
+                    if data is None:
+                        unmerged.append(index)
+                    else:
+                        answers[index] = {"status": "ok", "data": data, "error": None, "retryable": False}
+                elif isinstance(outcome, ThrottledError):
+                    answers[index] = {"status": "error", "data": None, "error": str(outcome),
+                                      "retryable": True, "retry_after": outcome.retry_after}
+                else:
+                    error = str(outcome) if isinstance(outcome, ValueError) else f"Failed to retrieve cost data: {outcome}"
+                    answers[index] = {"status": "error", "data": None, "error": error, "retryable": False}
+        return unmerged
+    
+    @staticmethod
+    def _single(index: int, query: BatchQuery) -> _UpstreamQuery:
+        """An upstream query answering exactly one batch query"""
+        plan = _UpstreamQuery(query.model_dump(include={"time_period", "granularity", "filter", "resample"}))
+        plan.add(index, query, [])
+        # Exactly the query's own grouping, so nothing is summed locally
+        plan.group_keys = [(group['Type'], group['Key']) for group in query.group_by]
+        return plan
+    
+    @staticmethod
+    def _plan(queries: List[BatchQuery]) -> List[_UpstreamQuery]:
+        """Pack queries that share period, granularity and filter into merged upstream queries"""
+        plans: Dict[str, List[_UpstreamQuery]] = {}
+        # Place two-dimension groupings first - they fix a merged query's dimensions
+        order = sorted(range(len(queries)), key=lambda index: -len(queries[index].group_by))
+        
+        for index in order:
+            query = queries[index]
+            group_keys = [(group['Type'], group['Key']) for group in query.group_by]
+            shape = query.model_dump(include={"time_period", "granularity", "filter", "resample"})
+            candidates = plans.setdefault(request_digest(shape), [])
+            
+            plan: Optional[_UpstreamQuery] = None
+            if len(group_keys) <= MAX_GROUP_BY and len(set(group_keys)) == len(group_keys):
+                plan = next((candidate for candidate in candidates if candidate.can_take(group_keys)), None)
+            if plan is None:
+                plan = _UpstreamQuery(shape)
+                candidates.append(plan)
+            plan.add(index, query, group_keys)
+        
+        return [plan for candidates in plans.values() for plan in candidates]
+    
+    async def _run(self, request: BatchCostDataRequest, plan: _UpstreamQuery) -> CostFrame:
+        upstream_request = CostDataRequest(
+            credentials=request.credentials,
+            group_by=[{"Type": group_type, "Key": key} for group_type, key in plan.group_keys],
+            metrics=plan.metrics,
+            **plan.shape
+        )
+        
+        async def fetch():
+            return await cost_explorer_service.get_cost_frame(upstream_request)
+        
+        key = f"batch:{identity_cache.tenant_key(request.credentials)}:{request_digest(upstream_request.model_dump(exclude={'credentials'}))}"
+        frame, _ = await single_flight.do(key, fetch)
+        return frame
+    
+    @staticmethod
+    def _derive(frame: CostFrame, plan: _UpstreamQuery, query: BatchQuery) -> Optional[Dict[str, Any]]:
+        """A query's answer from its upstream frame, or None when that would sum rows of different units"""
+        group_keys = [(group['Type'], group['Key']) for group in query.group_by]
+        if group_keys != plan.group_keys and any(frame.has_mixed_units(metric) for metric in query.metrics):
+            return None
+        if not group_keys and plan.group_keys:
+            frame = frame.to_totals()
+        elif group_keys != plan.group_keys:
+            frame = frame.regroup([plan.group_keys.index(group_key) for group_key in group_keys])
+        
+        return frame.select_metrics(query.metrics).to_response(
+            time_period=query.time_period.model_dump(),
+            granularity=query.granularity,
+            group_by=query.group_by
+        )
+
+
+# Global instance shared by all requests in this worker
+batch_query_service = BatchQueryService()
@@ -0,0 +1,141 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.models.credentials import AWSCredentials
+from app.services.hashing import request_digest
+from app.services.identity import identity_cache
+
+Bucket = Tuple[str, str]
+
+
+def period_buckets(start: str, end: str, granularity: str) -> Optional[List[Bucket]]:
+    """The (start, end) periods Cost Explorer returns for a DAILY or MONTHLY query.
+    
+    Returns None for granularities the bucket cache does not handle (HOURLY or
+    timestamp periods).
+    """
+    if granularity not in ('DAILY', 'MONTHLY') or len(start) != 10 or len(end) != 10:
+        return None
+    
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    
+    buckets = []
+    bucket_start = start_date
+    while bucket_start < end_date:
+        if granularity == 'DAILY':
+            bucket_end = bucket_start + timedelta(days=1)
+        else:
+            bucket_end = min((bucket_start.replace(day=1) + timedelta(days=32)).replace(day=1), end_date)
+        buckets.append((bucket_start.strftime("%Y-%m-%d"), bucket_end.strftime("%Y-%m-%d")))
+        bucket_start = bucket_end
+    
+    return buckets
+
+
+def contiguous_ranges(buckets: List[Bucket]) -> List[Bucket]:
+    """Collapse ordered buckets into the fewest (start, end) ranges that cover them"""
+    ranges: List[List[str]] = []
+    for bucket_start, bucket_end in buckets:
+        if ranges and ranges[-1][1] == bucket_start:
+            ranges[-1][1] = bucket_end
+        else:
+            ranges.append([bucket_start, bucket_end])
+    return [(start, end) for start, end in ranges]
+
+
+class _CachedBucket:
+    __slots__ = ("result", "expires_at")
+    
+    def __init__(self, result: Dict[str, Any], expires_at: float):
+        self.result = result
+        self.expires_at = expires_at
+
+
+class BucketCache:
+    """Per-period cache of raw Cost Explorer ResultsByTime entries.
+    
+    A series is one query shape (credentials, granularity, metrics, group_by and
+    filter) without its time period. Buckets Cost Explorer flags as estimated
+    expire after a short TTL so the still-changing tail is refetched; finalized
+    buckets age out after a much longer one, and each series keeps at most
+    ``max_buckets`` of them, dropping the least recently used.
+    """
+    
+    def __init__(self, max_series: Optional[int] = None, estimated_ttl: Optional[int] = None,
+                 finalized_ttl: Optional[int] = None, max_buckets: Optional[int] = None):
+        self.max_series = max_series or settings.bucket_cache_max_series
+        self.estimated_ttl = estimated_ttl or settings.bucket_cache_estimated_ttl
+        self.finalized_ttl = finalized_ttl or settings.bucket_cache_finalized_ttl
+        self.max_buckets = max_buckets or settings.bucket_cache_max_buckets_per_series
+        self._series: "OrderedDict[str, OrderedDict[Bucket, _CachedBucket]]" = OrderedDict()
+        self.bucket_hits = 0
+        self.bucket_misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def series_key(credentials: AWSCredentials, aws_request: Dict[str, Any]) -> str:
+        shape = {key: value for key, value in aws_request.items() if key not in ('TimePeriod', 'NextPageToken')}
+        return f"{identity_cache.tenant_key(credentials)}:{request_digest(shape)}"
+    
+    def lookup(self, series_key: str, buckets: List[Bucket]) -> Dict[Bucket, Dict[str, Any]]:
+        """Return the fresh cached results among ``buckets``"""
+        series = self._series.get(series_key)
+        if series is None:
+            self.bucket_misses += len(buckets)
+            return {}
+        
+        self._series.move_to_end(series_key)
+        now = time.monotonic()
+        found = {}
+        for bucket in buckets:
+            cached = series.get(bucket)
+            if cached is not None and cached.expires_at > now:
+                series.move_to_end(bucket)
+                found[bucket] = cached.result
+        
+        self.bucket_hits += len(found)
+        self.bucket_misses += len(buckets) - len(found)
+        return found
+    
+    def store(self, series_key: str, results: List[Dict[str, Any]]):
+        """Store freshly fetched raw results for a series"""
+        series = self._series.get(series_key)
+        if series is None:
+            series = self._series[series_key] = OrderedDict()
+        self._series.move_to_end(series_key)
+        
+        now = time.monotonic()
+        for result in results:
+            bucket = (result['TimePeriod']['Start'], result['TimePeriod']['End'])
+            ttl = self.estimated_ttl if result.get('Estimated', False) else self.finalized_ttl
+            series[bucket] = _CachedBucket(result, now + ttl)
+            series.move_to_end(bucket)
+        
+        if len(series) > self.max_buckets:
+            # Drop expired buckets first, then the least recently used ones
+            for bucket in [bucket for bucket, cached in series.items() if cached.expires_at <= now]:
+                del series[bucket]
+                self.evictions += 1
+            while len(series) > self.max_buckets:
+                series.popitem(last=False)
+                self.evictions += 1
+        
+        while len(self._series) > self.max_series:
+            self._series.popitem(last=False)
+    
+    def stats(self) -> dict:
+        return {
+            "series": len(self._series),
+            "buckets": sum(len(series) for series in self._series.values()),
+            "bucket_hits": self.bucket_hits,
+            "bucket_misses": self.bucket_misses,
+            "evictions": self.evictions,
+        }
+
+
+# Global instance shared by all requests in this worker
+bucket_cache = BucketCache()
@@ -0,0 +1,172 @@
+import json
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import logging
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.models.credentials import AWSCredentials
+from app.services.hashing import request_digest
+from app.services.identity import identity_cache
+
+logger = logging.getLogger(__name__)
+
+# Entry header: a marker byte (never the first byte of a zlib stream) and the store time
+_STORED_AT_MARKER = b"\x01"
+_STORED_AT = struct.Struct(">d")
+
+
+class ResponseCache:
+    """Response cache for Cost Explorer results.
+    
+    Entries are stored in Redis as zlib-compressed compact JSON prefixed with
+    the time they were stored, and are kept ``stale_ttl`` seconds past their TTL
+    so stale values can be served while they are refreshed. When Redis is
+    unreachable the cache falls back to a bounded in-process LRU and retries
+    Redis after a short back-off.
+    """
+    
+    def __init__(self, redis_url: Optional[str] = None, ttl: Optional[int] = None, max_local_entries: Optional[int] = None,
+                 stale_ttl: Optional[int] = None):
+        self.ttl = ttl or settings.cache_ttl
+        self.stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        self.max_local_entries = max_local_entries or settings.cache_max_local_entries
+        redis_url = settings.redis_url if redis_url is None else redis_url
+        self._redis = redis.from_url(
+            redis_url,
+            socket_connect_timeout=settings.cache_redis_timeout,
+            socket_timeout=settings.cache_redis_timeout
+        ) if redis_url else None
+        self._redis_retry_at = 0.0
+        self._local: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(namespace: str, credentials: AWSCredentials, request: Any) -> str:
+        """Build a cache key from the tenant (account or hashed credentials) and the normalized request - never raw secrets"""
+        return f"{settings.cache_key_prefix}{namespace}:{identity_cache.tenant_key(credentials)}:{request_digest(request)}"
+    
+    @property
+    def backend(self) -> str:
+        return "redis" if self._redis_available() else "memory"
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Return a fresh cached value, or None on a miss"""
+        entry = await self.lookup(key)
+        if entry is None or entry[1] >= self.ttl:
+            return None
+        return entry[0]
+    
+    async def lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, age in seconds) - stale if the age is past the TTL - or None on a miss"""
+        data = await self._read(key)
+        if data is None:
+            self.misses += 1
+            return None
+        
+        value, stored_at = self._decode(data)
+        age = max(time.time() - stored_at, 0.0)
+        if age >= self.ttl:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return value, age
+    
+    async def peek(self, key: str) -> Optional[float]:
+        """Age in seconds of a cached entry, or None - without counting a hit or miss or touching the LRU"""
+        data = await self._read(key, touch=False)
+        if data is None:
+            return None
+        return max(time.time() - self._stored_at(data), 0.0)
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a JSON-serializable value, kept for the stale window after its TTL"""
+        ttl = (ttl or self.ttl) + self.stale_ttl
+        data = self._encode(value)
+        if self._redis_available():
+            try:
+                await self._redis.set(key, data, ex=ttl)
+                return
+            except Exception as e:
+                self._mark_redis_down(e)
+        self._local_set(key, data, ttl)
+    
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+    
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "local_entries": len(self._local),
+        }
+    
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        # Wall-clock store time so every worker sharing Redis agrees on the age
+        header = _STORED_AT_MARKER + _STORED_AT.pack(time.time())
+        return header + zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 1)
+    
+    @staticmethod
+    def _stored_at(data: bytes) -> float:
+        if data[:1] != _STORED_AT_MARKER:
+            return time.time()
+        return _STORED_AT.unpack_from(data, 1)[0]
+    
+    @staticmethod
+    def _decode(data: bytes) -> Tuple[Any, float]:
+        if data[:1] != _STORED_AT_MARKER:
+            # Entry written before store times were recorded - treat as just stored
+            return json.loads(zlib.decompress(data)), time.time()
+        (stored_at,) = _STORED_AT.unpack_from(data, 1)
+        return json.loads(zlib.decompress(data[1 + _STORED_AT.size:])), stored_at
+    
+    def _redis_available(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_retry_at
+    
+    def _mark_redis_down(self, error: Exception):
+        logger.warning(f"Redis cache unavailable, using in-process cache: {error}")
+        self._redis_retry_at = time.monotonic() + settings.cache_redis_retry_interval
+    
+    async def _read(self, key: str, touch: bool = True) -> Optional[bytes]:
+        data = None
+        if self._redis_available():
+            try:
+                data = await self._redis.get(key)
+            except Exception as e:
+                self._mark_redis_down(e)
+        
+        if data is None and not self._redis_available():
+            data = self._local_get(key, touch)
+        return data
+    
+    def _local_get(self, key: str, touch: bool = True) -> Optional[bytes]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        if touch:
+            self._local.move_to_end(key)
+        return data
+    
+    def _local_set(self, key: str, data: bytes, ttl: int):
+        self._local[key] = (time.monotonic() + ttl, data)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+
+# Global instance shared by all requests in this worker
+response_cache = ResponseCache()
@@ -0,0 +1,263 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.models.billing import CostDataRequest
+from app.models.credentials import AWSCredentials
+from app.services.cache import response_cache
+from app.services.identity import identity_cache
+from app.services.query_planner import query_planner
+from app.services.simple_query import build_simple_request
+from app.services.single_flight import single_flight
+from app.services.spend_governor import background_task, spend_governor
+
+logger = logging.getLogger(__name__)
+
+Producer = Callable[[], Awaitable[Any]]
+
+# /cost-data-simple parameters the dashboard sends by default
+DASHBOARD_DEFAULTS = {"granularity": "DAILY", "metrics": "BlendedCost", "include_credit": False}
+
+
+def standard_views(today) -> Dict[str, Dict[str, Any]]:
+    """Named /cost-data-simple requests that can be pre-warmed, for the given date"""
+    last_30_days = {**DASHBOARD_DEFAULTS, "start_date": (today - timedelta(days=30)).isoformat(), "end_date": today.isoformat()}
+    views = {
+        "last_30_days": last_30_days,
+        "last_30_days_by_service": {**last_30_days, "group_by_dimension": "SERVICE"},
+    }
+    # Month-to-date is an empty range on the 1st
+    if today.day > 1:
+        month_to_date = {**DASHBOARD_DEFAULTS, "start_date": today.replace(day=1).isoformat(), "end_date": today.isoformat()}
+        views["month_to_date"] = month_to_date
+        views["month_to_date_by_service"] = {**month_to_date, "group_by_dimension": "SERVICE"}
+    return views
+
+
+def _cost_data_producer(request: CostDataRequest) -> Producer:
+    """Producer rendering a cost data request the way /cost-data caches it"""
+    async def produce():
+        return await query_planner.get_cost_and_usage(request)
+    return produce
+
+
+class _TrackedQuery:
+    __slots__ = ("account", "credentials", "producer", "score", "touched", "stored_at", "view")
+    
+    def __init__(self, account: str, credentials: AWSCredentials, producer: Producer, view: Optional[str] = None):
+        self.account = account
+        self.credentials = credentials
+        self.producer = producer
+        self.score = 0.0
+        self.touched = time.monotonic()
+        self.stored_at: Optional[float] = None  # Wall-clock time the cached value was stored
+        self.view = view  # Standard view name for pre-warmed entries
+
+
+class CacheWarmer:
+    """Keeps hot cached responses fresh and serves stale ones while they refresh.
+    
+    Every cached request is tracked with a hit score that halves every TTL.
+    A background pass refreshes queries scoring at least ``min_hits`` shortly
+    before their TTL runs out, and pre-warms the configured standard views for
+    every recently active account. Scheduled refreshes draw from an hourly
+    budget so warming never floods Cost Explorer; revalidations of stale hits
+    are coalesced per key.
+    """
+    
+    def __init__(self, max_tracked: Optional[int] = None, budget_per_hour: Optional[int] = None):
+        self.max_tracked = max_tracked or settings.cache_warm_max_tracked
+        self.budget_per_hour = budget_per_hour or settings.cache_warm_budget_per_hour
+        self.views = [view.strip() for view in settings.cache_warm_views.split(",") if view.strip()]
+        self._tracked: "OrderedDict[str, _TrackedQuery]" = OrderedDict()
+        self._tokens = float(self.budget_per_hour)
+        self._tokens_updated = time.monotonic()
+        self._views_refreshed_at = 0.0
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.revalidations = 0
+        self.over_budget = 0
+    
+    async def refresh(self, key: str, producer: Producer,
+                      store_key: Optional[Callable[[], str]] = None) -> Tuple[Any, bool]:
+        """Run ``producer`` (coalesced per key) and cache its result; returns (value, shared).
+        
+        ``store_key`` recomputes the key once the producer has run, for keys that
+        fetching can change (credentials key by account after their first fetch).
+        """
+        async def fetch_and_store():
+            value = await producer()
+            if settings.cache_enabled:
+                target = store_key() if store_key is not None else key
+                await response_cache.set(target, value)
+                if target != key and key in self._tracked and target not in self._tracked:
+                    self._tracked[target] = self._tracked.pop(key)
+                tracked = self._tracked.get(target)
+                if tracked is not None:
+                    tracked.stored_at = time.time()
+            return value
+        
+        return await single_flight.do(key, fetch_and_store)
+    
+    def track(self, key: str, credentials: AWSCredentials, producer: Producer, age: Optional[float] = None):
+        """Record a request for a cached query; ``age`` is the cached value's age on a hit"""
+        now = time.monotonic()
+        tracked = self._tracked.get(key)
+        if tracked is None:
+            tracked = self._tracked[key] = _TrackedQuery(identity_cache.account_key(credentials), credentials, producer)
+            while len(self._tracked) > self.max_tracked:
+                self._tracked.popitem(last=False)
+        else:
+            tracked.score *= 0.5 ** ((now - tracked.touched) / response_cache.ttl)
+            tracked.producer = producer
+            self._tracked.move_to_end(key)
+        tracked.score += 1
+        tracked.touched = now
+        if age is not None:
+            tracked.stored_at = time.time() - age
+    
+    def revalidate(self, key: str, producer: Producer):
+        """Refresh a stale entry in the background"""
+        if key in self._revalidating:
+            return
+        self.revalidations += 1
+        task = background_task(self._refresh_logged(key, producer))
+        self._revalidating[key] = task
+        task.add_done_callback(lambda _: self._revalidating.pop(key, None))
+    
+    async def _refresh_logged(self, key: str, producer: Producer) -> bool:
+        try:
+            await self.refresh(key, producer)
+            self.refreshes += 1
+            return True
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning(f"Cache refresh failed: {e}")
+            return False
+    
+    async def start(self):
+        if settings.cache_enabled and settings.cache_warm_enabled:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        for task in [self._task, *self._revalidating.values()]:
+            if task is not None:
+                task.cancel()
+        if self._task is not None:
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.cache_warm_interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Cache warming pass failed: {e}")
+    
+    async def run_once(self):
+        """One scheduling pass: expire idle queries, schedule standard views, refresh what is due"""
+        now = time.monotonic()
+        idle_before = now - settings.cache_warm_idle_ttl
+        active_accounts: Dict[str, AWSCredentials] = {}
+        for key, tracked in list(self._tracked.items()):
+            if tracked.view is None:
+                if tracked.touched < idle_before:
+                    del self._tracked[key]
+                else:
+                    active_accounts[tracked.account] = tracked.credentials
+        
+        if now - self._views_refreshed_at >= settings.cache_warm_views_interval or not self._views_refreshed_at:
+            self._schedule_views(active_accounts)
+            self._views_refreshed_at = now
+        
+        # Accounts near their Cost Explorer budget keep their cached data as it is
+        due = [(key, tracked) for key, tracked in await self._due(active_accounts)
+               if spend_governor.mode(tracked.account) == "normal"]
+        budget = self._take_budget(len(due))
+        self.over_budget += len(due) - budget
+        if not budget:
+            return
+        
+        limit = asyncio.Semaphore(settings.cache_warm_concurrency)
+        
+        async def refresh_one(key: str, tracked: _TrackedQuery):
+            async with limit:
+                await self._refresh_logged(key, tracked.producer)
+        
+        await asyncio.gather(*[refresh_one(key, tracked) for key, tracked in due[:budget]])
+    
+    def _schedule_views(self, active_accounts: Dict[str, AWSCredentials]):
+        """Track today's standard views for each active account, dropping outdated ones"""
+        wanted = {}
+        views = standard_views(datetime.now().date())
+        for account, credentials in active_accounts.items():
+            for name in self.views:
+                if name not in views:
+                    continue
+                request = query_planner.canonicalize(
+                    build_simple_request({"credentials": credentials.model_dump(), **views[name]})
+                )
+                key = response_cache.make_key("cost-data", credentials, request.model_dump(exclude={"credentials"}))
+                wanted[key] = (account, credentials, request, name)
+        
+        for key in [key for key, tracked in self._tracked.items() if tracked.view and key not in wanted]:
+            del self._tracked[key]
+        for key, (account, credentials, request, name) in wanted.items():
+            if key not in self._tracked:
+                self._tracked[key] = _TrackedQuery(account, credentials, _cost_data_producer(request), view=name)
+    
+    async def _due(self, active_accounts: Dict[str, AWSCredentials]) -> List[Tuple[str, _TrackedQuery]]:
+        """Queries to refresh now: standard views first, then hot queries by score"""
+        refresh_after = response_cache.ttl - settings.cache_warm_refresh_ahead
+        wall_now = time.time()
+        views, hot = [], []
+        for key, tracked in list(self._tracked.items()):
+            if tracked.view is not None:
+                if tracked.account not in active_accounts:
+                    continue
+                if tracked.stored_at is None:
+                    # Not refreshed by us yet - it may already be cached by a request
+                    age = await response_cache.peek(key)
+                    tracked.stored_at = wall_now - age if age is not None else 0.0
+                if wall_now - tracked.stored_at >= refresh_after:
+                    views.append((key, tracked))
+            elif tracked.score >= settings.cache_warm_min_hits and tracked.stored_at is not None \
+                    and wall_now - tracked.stored_at >= refresh_after and key not in self._revalidating:
+                hot.append((key, tracked))
+        hot.sort(key=lambda item: -item[1].score)
+        return views + hot
+    
+    def _take_budget(self, wanted: int) -> int:
+        """Take up to ``wanted`` refreshes from the hourly token bucket"""
+        now = time.monotonic()
+        self._tokens = min(float(self.budget_per_hour),
+                           self._tokens + (now - self._tokens_updated) * self.budget_per_hour / 3600)
+        self._tokens_updated = now
+        granted = min(wanted, int(self._tokens))
+        self._tokens -= granted
+        return granted
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self._tracked),
+            "views": sum(1 for tracked in self._tracked.values() if tracked.view),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "revalidations": self.revalidations,
+            "over_budget": self.over_budget,
+            "budget_remaining": int(self._tokens),
+        }
+
+
+# Global instance shared by all requests in this worker
+cache_warmer = CacheWarmer()
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+
+from app.config import settings
+from app.models.credentials import AWSCredentials
+from app.services.hashing import credential_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    __slots__ = ("client", "last_used", "leases", "evicted")
+    
+    def __init__(self, client: Any):
+        self.client = client
+        self.last_used = time.monotonic()
+        # Callers currently using the client; it is only wiped once this drops to zero
+        self.leases = 0
+        self.evicted = False
+
+
+class AWSClientPool:
+    """Thread-safe LRU pool of boto3 clients keyed by a hash of credentials, region and service.
+    
+    boto3 clients are safe to share between threads once created, so a single
+    client (and its HTTP connection pool) is reused by every request made with
+    the same credentials. Clients are leased: ``acquire`` or ``add`` hand one
+    out and ``release`` returns it. Entries are evicted when the pool is full
+    or when they have been idle (unleased) longer than the TTL; an evicted
+    client still leased is only closed and wiped when its last holder releases it.
+    """
+    
+    def __init__(self, max_size: Optional[int] = None, idle_ttl: Optional[int] = None):
+        self.max_size = max_size or settings.client_pool_max_size
+        self.idle_ttl = idle_ttl if idle_ttl is not None else settings.client_pool_idle_ttl
+        self._entries: "OrderedDict[str, _PooledClient]" = OrderedDict()
+        # Every client handed out and not yet wiped, pooled or evicted, by id
+        self._clients: Dict[int, _PooledClient] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def acquire(self, credentials: AWSCredentials, service_name: str) -> Optional[Any]:
+        """Lease the pooled client for these credentials, or None on a miss (build one and ``add`` it)"""
+        key = credential_fingerprint(credentials, service_name)
+        now = time.monotonic()
+        
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.last_used = now
+            entry.leases += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.client
+    
+    def add(self, credentials: AWSCredentials, service_name: str, client: Any) -> Any:
+        """Pool a newly built client and lease it; if another caller pooled one first, lease theirs instead"""
+        key = credential_fingerprint(credentials, service_name)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._wipe(client)
+                entry.last_used = time.monotonic()
+                entry.leases += 1
+                return entry.client
+            
+            entry = self._entries[key] = _PooledClient(client)
+            entry.leases = 1
+            self._clients[id(client)] = entry
+            while len(self._entries) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._discard(evicted)
+        
+        return client
+    
+    def release(self, client: Any):
+        """Return a leased client, wiping it if it was evicted while in use"""
+        with self._lock:
+            entry = self._clients.get(id(client))
+            if entry is None or entry.client is not client:
+                return
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            if entry.evicted and entry.leases <= 0:
+                self._close(entry)
+    
+    def clear(self):
+        """Evict every pooled client (leased ones are wiped when released)"""
+        with self._lock:
+            while self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._discard(evicted)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "leased": sum(1 for entry in self._clients.values() if entry.leases > 0),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+    
+    def _evict_idle(self, now: float):
+        # Leased entries are in use however long ago they were acquired
+        for key, entry in list(self._entries.items()):
+            if entry.leases <= 0 and now - entry.last_used >= self.idle_ttl:
+                del self._entries[key]
+                self._discard(entry)
+    
+    def _discard(self, entry: _PooledClient):
+        self.evictions += 1
+        entry.evicted = True
+        if entry.leases <= 0:
+            self._close(entry)
+    
+    def _close(self, entry: _PooledClient):
+        self._clients.pop(id(entry.client), None)
+        self._wipe(entry.client)
+        entry.client = None
+    
+    @staticmethod
+    def _wipe(client: Any):
+        """Close the client's connections and drop its reference to the credentials.
+        
+        Python strings cannot be zeroed in place, so this removes every reference
+        the pool holds and lets the interpreter reclaim them.
+        """
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled AWS client: {e}")
+        request_signer = getattr(client, "_request_signer", None)
+        if request_signer is not None:
+            request_signer._credentials = None
+
+
+# Global instance shared by all requests in this worker
+client_pool = AWSClientPool()
@@ -0,0 +1,558 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.billing import GroupMetrics
+
+# Metric fields always present in the rendered GroupMetrics shape
+RENDERED_METRICS = tuple(GroupMetrics.model_fields)
+
+# Granularities CostFrame.resample can derive from DAILY periods
+RESAMPLE_GRANULARITIES = ('WEEKLY', 'MONTHLY', 'QUARTERLY')
+
+# Version tag of the CostFrame.to_compact layout
+COMPACT_FORMAT = 'compact-v1'
+
+
+def default_unit(metric: str) -> str:
+    """Unit Cost Explorer reports for a metric's zero total"""
+    return 'N/A' if metric in ('UsageQuantity', 'NormalizedUsageAmount') else 'USD'
+
+
+def _bucket_starts(days: np.ndarray, granularity: str) -> np.ndarray:
+    """Start date of the WEEKLY (Monday), MONTHLY or QUARTERLY bucket containing each day"""
+    if granularity == 'WEEKLY':
+        # 1970-01-01 was a Thursday, so (days + 3) % 7 is the offset from Monday
+        offsets = (days.astype(np.int64) + 3) % 7
+        return days - offsets.astype('timedelta64[D]')
+    
+    months = days.astype('datetime64[M]')
+    if granularity == 'QUARTERLY':
+        month_numbers = months.astype(np.int64)
+        months = (month_numbers - month_numbers % 3).astype('datetime64[M]')
+    return months.astype('datetime64[D]')
+
+
+def _sum_by(codes: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Sum values per code, leaving NaN where every contributing value is missing"""
+    present = ~np.isnan(values)
+    sums = np.bincount(codes, weights=np.where(present, values, 0.0), minlength=size).astype(np.float64)
+    counts = np.bincount(codes, weights=present, minlength=size)
+    sums[counts == 0] = np.nan
+    # Drop float summation noise below Cost Explorer's own precision
+    return np.round(sums, 10)
+
+
+def _amount_list(amounts: np.ndarray, unit_codes: np.ndarray) -> List[Optional[float]]:
+    """Amounts as a list, with None where the metric is missing"""
+    values = amounts.tolist()
+    missing = np.flatnonzero(unit_codes < 0)
+    for index in missing.tolist():
+        values[index] = None
+    return values
+
+
+def format_amount(value: float) -> str:
+    """Decimal string for an amount in Cost Explorer's format: fixed-point, no exponent, "0" for zero"""
+    text = repr(value)
+    if 'e' in text:
+        text = np.format_float_positional(value, trim='-')
+    elif text.endswith('.0'):
+        text = text[:-2]
+    return '0' if text == '-0' else text
+
+
+def _last_by(codes: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Last non-missing (>= 0) dictionary code per output code"""
+    result = np.full(size, -1, dtype=values.dtype)
+    present = values >= 0
+    result[codes[present]] = values[present]
+    return result
+
+
+def _text_array(texts: List[Optional[str]]) -> np.ndarray:
+    array = np.empty(len(texts), dtype=object)
+    array[:] = texts
+    return array
+
+
+def _amount_strings(amounts: np.ndarray, text: Optional[Dict[str, np.ndarray]], metric: str) -> List[str]:
+    """Rendered amount strings: the original text where known, else the float in fixed-point"""
+    if text is not None and metric in text:
+        return text[metric].tolist()
+    return [format_amount(value) for value in amounts.tolist()]
+
+
+class _Dictionary:
+    """Assigns dense integer codes to hashable values in first-seen order"""
+    
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+    
+    def encode(self, value: Any) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class CostFrame:
+    """Columnar representation of Cost Explorer ResultsByTime.
+    
+    Periods are stored once; every group row is a (period index, key code) pair
+    with group keys dictionary-encoded, and each metric is a float64 amount
+    array plus a dictionary-encoded unit array. Missing amounts are NaN.
+    Period totals use the same layout with one row per period. Frames built
+    from Cost Explorer output also keep the original amount strings, so
+    amounts that were not summed locally render exactly as received.
+    """
+    
+    def __init__(self, period_starts: List[str], period_ends: List[str], estimated: np.ndarray,
+                 keys: List[Tuple[str, ...]], row_period: np.ndarray, row_key: np.ndarray,
+                 amounts: Dict[str, np.ndarray], unit_codes: Dict[str, np.ndarray],
+                 has_total: np.ndarray, total_amounts: Dict[str, np.ndarray],
+                 total_unit_codes: Dict[str, np.ndarray], units: List[str],
+                 source_granularity: Optional[str] = None,
+                 amount_text: Optional[Dict[str, np.ndarray]] = None,
+                 total_amount_text: Optional[Dict[str, np.ndarray]] = None):
+        self.period_starts = period_starts
+        self.period_ends = period_ends
+        self.estimated = estimated
+        self.keys = keys
+        self.row_period = row_period
+        self.row_key = row_key
+        self.amounts = amounts
+        self.unit_codes = unit_codes
+        self.has_total = has_total
+        self.total_amounts = total_amounts
+        self.total_unit_codes = total_unit_codes
+        self.units = units
+        # Set when the frame was aggregated locally from finer periods
+        self.source_granularity = source_granularity
+        # Amount strings as Cost Explorer sent them (object arrays parallel to the amounts), if known
+        self.amount_text = amount_text
+        self.total_amount_text = total_amount_text
+    
+    @property
+    def metrics(self) -> List[str]:
+        return list(self.amounts)
+    
+    @property
+    def num_periods(self) -> int:
+        return len(self.period_starts)
+    
+    @property
+    def num_rows(self) -> int:
+        return len(self.row_period)
+    
+    @classmethod
+    def from_results(cls, results: List[Dict[str, Any]], metrics: List[str]) -> "CostFrame":
+        """Build a frame from raw Cost Explorer ResultsByTime entries"""
+        keys = _Dictionary()
+        units = _Dictionary()
+        
+        period_starts, period_ends, estimated, has_total = [], [], [], []
+        row_period, row_key = [], []
+        amounts: Dict[str, List[float]] = {metric: [] for metric in metrics}
+        amount_text: Dict[str, List[Optional[str]]] = {metric: [] for metric in metrics}
+        unit_codes: Dict[str, List[int]] = {metric: [] for metric in metrics}
+        total_amounts: Dict[str, List[float]] = {metric: [] for metric in metrics}
+        total_amount_text: Dict[str, List[Optional[str]]] = {metric: [] for metric in metrics}
+        total_unit_codes: Dict[str, List[int]] = {metric: [] for metric in metrics}
+        nan = float('nan')
+        
+        for period, result in enumerate(results):
+            period_starts.append(result['TimePeriod']['Start'])
+            period_ends.append(result['TimePeriod']['End'])
+            estimated.append(result.get('Estimated', False))
+            
+            total = result.get('Total')
+            has_total.append(total is not None)
+            total = total or {}
+            for metric in metrics:
+                value = total.get(metric)
+                text = value.get('Amount', '0') if value else None
+                total_amount_text[metric].append(text)
+                total_amounts[metric].append(float(text) if value else nan)
+                total_unit_codes[metric].append(units.encode(value.get('Unit', 'USD')) if value else -1)
+            
+            for group in result.get('Groups', []):
+                row_period.append(period)
+                row_key.append(keys.encode(tuple(group.get('Keys', []))))
+                group_metrics = group.get('Metrics', {})
+                for metric in metrics:
+                    value = group_metrics.get(metric)
+                    text = value.get('Amount', '0') if value else None
+                    amount_text[metric].append(text)
+                    amounts[metric].append(float(text) if value else nan)
+                    unit_codes[metric].append(units.encode(value.get('Unit', 'USD')) if value else -1)
+        
+        return cls(
+            period_starts=period_starts,
+            period_ends=period_ends,
+            estimated=np.array(estimated, dtype=bool),
+            keys=keys.values,
+            row_period=np.array(row_period, dtype=np.int32),
+            row_key=np.array(row_key, dtype=np.int32),
+            amounts={metric: np.array(values, dtype=np.float64) for metric, values in amounts.items()},
+            unit_codes={metric: np.array(codes, dtype=np.int16) for metric, codes in unit_codes.items()},
+            has_total=np.array(has_total, dtype=bool),
+            total_amounts={metric: np.array(values, dtype=np.float64) for metric, values in total_amounts.items()},
+            total_unit_codes={metric: np.array(codes, dtype=np.int16) for metric, codes in total_unit_codes.items()},
+            units=units.values,
+            amount_text={metric: _text_array(texts) for metric, texts in amount_text.items()},
+            total_amount_text={metric: _text_array(texts) for metric, texts in total_amount_text.items()}
+        )
+    
+    @classmethod
+    def from_response(cls, response: Dict[str, Any], metrics: List[str]) -> "CostFrame":
+        """Rebuild a frame from output rendered by ``to_response`` (e.g. a cached response)"""
+        def raw_metrics(rendered: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+            return {
+                metric: {'Amount': value['amount'], 'Unit': value['unit']}
+                for metric, value in rendered.items() if value is not None
+            }
+        
+        results = [
+            {
+                'TimePeriod': {'Start': result['time_period']['start'], 'End': result['time_period']['end']},
+                'Estimated': result['estimated'],
+                'Total': raw_metrics(result['total']) if result['total'] is not None else None,
+                'Groups': [
+                    {'Keys': group['keys'], 'Metrics': raw_metrics(group['metrics'])}
+                    for group in result['groups']
+                ],
+            }
+            for result in response['results']
+        ]
+        frame = cls.from_results(results, metrics)
+        frame.source_granularity = response.get('source_granularity')
+        return frame
+    
+    def resample(self, granularity: str, start: str, end: str) -> "CostFrame":
+        """Aggregate DAILY periods into WEEKLY, MONTHLY or QUARTERLY buckets.
+        
+        Buckets are clipped to [start, end) the same way Cost Explorer clips
+        MONTHLY periods, and a bucket is estimated if any of its days is.
+        """
+        if granularity not in RESAMPLE_GRANULARITIES:
+            raise ValueError(f"Cannot resample to {granularity} granularity")
+        
+        range_start = np.datetime64(start, 'D')
+        range_end = np.datetime64(end, 'D')
+        days = np.array(self.period_starts, dtype='datetime64[D]')
+        starts = np.maximum(_bucket_starts(days, granularity), range_start)
+        bucket_starts, period_bucket = np.unique(starts, return_inverse=True)
+        num_buckets = len(bucket_starts)
+        bucket_ends = np.append(bucket_starts[1:], range_end) if num_buckets else bucket_starts
+        
+        resampled = self._aggregate(
+            period_bucket,
+            [str(day) for day in bucket_starts],
+            [str(day) for day in bucket_ends]
+        )
+        resampled.source_granularity = 'DAILY'
+        return resampled
+    
+    @classmethod
+    def merge(cls, frames: List["CostFrame"]) -> "CostFrame":
+        """Combine frames (e.g. one per account), summing rows with the same period and group keys"""
+        keys = _Dictionary()
+        units = _Dictionary()
+        metrics = list(dict.fromkeys(metric for frame in frames for metric in frame.metrics))
+        
+        # Stack every frame's periods and rows, remapping keys and units into shared dictionaries
+        period_starts, period_ends, row_period, row_key = [], [], [], []
+        amounts = {metric: [] for metric in metrics}
+        unit_codes = {metric: [] for metric in metrics}
+        total_amounts = {metric: [] for metric in metrics}
+        total_unit_codes = {metric: [] for metric in metrics}
+        period_offset = 0
+        for frame in frames:
+            key_map = np.array([keys.encode(key) for key in frame.keys], dtype=np.int32)
+            # Index -1 (missing unit) maps to the trailing -1
+            unit_map = np.array([units.encode(unit) for unit in frame.units] + [-1], dtype=np.int16)
+            
+            period_starts += frame.period_starts
+            period_ends += frame.period_ends
+            row_period.append(frame.row_period + period_offset)
+            row_key.append(key_map[frame.row_key] if len(key_map) else frame.row_key)
+            for metric in metrics:
+                missing_rows = np.full(frame.num_rows, np.nan)
+                missing_periods = np.full(frame.num_periods, np.nan)
+                amounts[metric].append(frame.amounts.get(metric, missing_rows))
+                unit_codes[metric].append(unit_map[frame.unit_codes[metric]] if metric in frame.unit_codes
+                                          else np.full(frame.num_rows, -1, dtype=np.int16))
+                total_amounts[metric].append(frame.total_amounts.get(metric, missing_periods))
+                total_unit_codes[metric].append(unit_map[frame.total_unit_codes[metric]] if metric in frame.total_unit_codes
+                                                else np.full(frame.num_periods, -1, dtype=np.int16))
+            period_offset += frame.num_periods
+        
+        stacked = cls(
+            period_starts=period_starts,
+            period_ends=period_ends,
+            estimated=np.concatenate([frame.estimated for frame in frames] or [np.zeros(0, dtype=bool)]),
+            keys=keys.values,
+            row_period=np.concatenate(row_period or [np.zeros(0, dtype=np.int32)]),
+            row_key=np.concatenate(row_key or [np.zeros(0, dtype=np.int32)]),
+            amounts={metric: np.concatenate(values) for metric, values in amounts.items()},
+            unit_codes={metric: np.concatenate(codes) for metric, codes in unit_codes.items()},
+            has_total=np.concatenate([frame.has_total for frame in frames] or [np.zeros(0, dtype=bool)]),
+            total_amounts={metric: np.concatenate(values) for metric, values in total_amounts.items()},
+            total_unit_codes={metric: np.concatenate(codes) for metric, codes in total_unit_codes.items()},
+            units=units.values
+        )
+        
+        periods = sorted(set(zip(period_starts, period_ends)))
+        period_index = {period: index for index, period in enumerate(periods)}
+        period_map = np.array([period_index[period] for period in zip(period_starts, period_ends)], dtype=np.int64)
+        return stacked._aggregate(period_map, [start for start, _ in periods], [end for _, end in periods])
+    
+    def regroup(self, key_positions: List[int]) -> "CostFrame":
+        """Project group keys onto ``key_positions`` and sum the rows that collapse together.
+        
+        Used to answer a single-dimension grouping from a two-dimension query.
+        """
+        keys = _Dictionary()
+        key_map = np.array([keys.encode(tuple(key[position] for position in key_positions)) for key in self.keys],
+                           dtype=np.int32)
+        projected = self._replace(keys=keys.values, row_key=key_map[self.row_key] if len(key_map) else self.row_key)
+        return projected._aggregate(np.arange(self.num_periods), self.period_starts, self.period_ends)
+    
+    def filter_keys(self, position: int, values: List[str], negated: bool = False) -> "CostFrame":
+        """Keep rows whose key at ``position`` is (or with ``negated``, is not) one of ``values``"""
+        wanted = set(values)
+        key_mask = np.array([(key[position] in wanted) != negated for key in self.keys], dtype=bool)
+        row_mask = key_mask[self.row_key] if len(key_mask) else np.zeros(0, dtype=bool)
+        
+        # Re-encode the surviving keys densely
+        kept = np.flatnonzero(key_mask)
+        key_map = np.full(len(self.keys), -1, dtype=np.int32)
+        key_map[kept] = np.arange(len(kept), dtype=np.int32)
+        return self._replace(
+            keys=[self.keys[index] for index in kept.tolist()],
+            row_period=self.row_period[row_mask],
+            row_key=key_map[self.row_key[row_mask]],
+            amounts={metric: column[row_mask] for metric, column in self.amounts.items()},
+            unit_codes={metric: codes[row_mask] for metric, codes in self.unit_codes.items()},
+            amount_text=self.amount_text and {metric: texts[row_mask] for metric, texts in self.amount_text.items()}
+        )
+    
+    def has_mixed_units(self, metric: str) -> bool:
+        """Whether a metric's group rows use more than one unit (summing them is not meaningful)"""
+        codes = self.unit_codes[metric]
+        return len(np.unique(codes[codes >= 0])) > 1
+    
+    def to_totals(self) -> "CostFrame":
+        """Collapse every group into the period totals an ungrouped query would return.
+        
+        Periods without any rows get a zero total, as Cost Explorer reports them.
+        """
+        num_periods = self.num_periods
+        units = list(self.units)
+        total_amounts, total_unit_codes = {}, {}
+        for metric, values in self.amounts.items():
+            amounts = _sum_by(self.row_period, values, num_periods)
+            codes = _last_by(self.row_period, self.unit_codes[metric], num_periods)
+            empty = codes < 0
+            if empty.any():
+                unit = default_unit(metric)
+                if unit not in units:
+                    units.append(unit)
+                amounts[empty] = 0.0
+                codes[empty] = units.index(unit)
+            total_amounts[metric] = amounts
+            total_unit_codes[metric] = codes
+        
+        return self._replace(
+            keys=[],
+            row_period=np.zeros(0, dtype=np.int32),
+            row_key=np.zeros(0, dtype=np.int32),
+            amounts={metric: np.zeros(0) for metric in self.amounts},
+            unit_codes={metric: np.zeros(0, dtype=np.int16) for metric in self.unit_codes},
+            has_total=np.ones(num_periods, dtype=bool),
+            total_amounts=total_amounts,
+            total_unit_codes=total_unit_codes,
+            units=units,
+            amount_text=None,
+            total_amount_text=None
+        )
+    
+    def select_metrics(self, metrics: List[str]) -> "CostFrame":
+        """Keep only ``metrics``, in that order"""
+        return self._replace(
+            amounts={metric: self.amounts[metric] for metric in metrics},
+            unit_codes={metric: self.unit_codes[metric] for metric in metrics},
+            total_amounts={metric: self.total_amounts[metric] for metric in metrics},
+            total_unit_codes={metric: self.total_unit_codes[metric] for metric in metrics},
+            amount_text=self.amount_text and {metric: self.amount_text[metric] for metric in metrics},
+            total_amount_text=self.total_amount_text and {metric: self.total_amount_text[metric] for metric in metrics}
+        )
+    
+    def _replace(self, **changes) -> "CostFrame":
+        fields = {
+            "period_starts": self.period_starts,
+            "period_ends": self.period_ends,
+            "estimated": self.estimated,
+            "keys": self.keys,
+            "row_period": self.row_period,
+            "row_key": self.row_key,
+            "amounts": self.amounts,
+            "unit_codes": self.unit_codes,
+            "has_total": self.has_total,
+            "total_amounts": self.total_amounts,
+            "total_unit_codes": self.total_unit_codes,
+            "units": self.units,
+            "source_granularity": self.source_granularity,
+            "amount_text": self.amount_text,
+            "total_amount_text": self.total_amount_text,
+        }
+        fields.update(changes)
+        return CostFrame(**fields)
+    
+    def _aggregate(self, period_map: np.ndarray, period_starts: List[str], period_ends: List[str]) -> "CostFrame":
+        """Sum rows and totals into new periods, where ``period_map[i]`` is the new index of period i"""
+        num_periods = len(period_starts)
+        period_map = period_map.astype(np.int64)
+        
+        # Regroup rows by (period, key); np.unique sorts them period-major
+        num_keys = max(len(self.keys), 1)
+        combined = period_map[self.row_period] * num_keys + self.row_key
+        combined_codes, row_inverse = np.unique(combined, return_inverse=True)
+        num_rows = len(combined_codes)
+        
+        return CostFrame(
+            period_starts=period_starts,
+            period_ends=period_ends,
+            estimated=np.bincount(period_map, weights=self.estimated, minlength=num_periods) > 0,
+            keys=self.keys,
+            row_period=(combined_codes // num_keys).astype(np.int32),
+            row_key=(combined_codes % num_keys).astype(np.int32),
+            amounts={metric: _sum_by(row_inverse, values, num_rows) for metric, values in self.amounts.items()},
+            unit_codes={metric: _last_by(row_inverse, codes, num_rows) for metric, codes in self.unit_codes.items()},
+            has_total=np.bincount(period_map, weights=self.has_total, minlength=num_periods) > 0,
+            total_amounts={
+                metric: _sum_by(period_map, values, num_periods)
+                for metric, values in self.total_amounts.items()
+            },
+            total_unit_codes={
+                metric: _last_by(period_map, codes, num_periods)
+                for metric, codes in self.total_unit_codes.items()
+            },
+            units=self.units,
+            source_granularity=self.source_granularity
+        )
+    
+    def to_response(self, time_period: Dict[str, str], granularity: str, group_by: List[Dict[str, str]],
+                    dimension_key: Optional[str] = None) -> Dict[str, Any]:
+        """Render the frame in the CostDataResponse JSON shape, straight from the columns"""
+        metrics = self.metrics
+        units = self.units
+        
+        # Convert each column to Python lists once instead of indexing arrays per cell;
+        # amounts keep Cost Explorer's strings where the frame has them
+        amounts = {metric: _amount_strings(self.amounts[metric], self.amount_text, metric) for metric in metrics}
+        unit_codes = {metric: self.unit_codes[metric].tolist() for metric in metrics}
+        total_amounts = {
+            metric: _amount_strings(self.total_amounts[metric], self.total_amount_text, metric) for metric in metrics
+        }
+        total_unit_codes = {metric: self.total_unit_codes[metric].tolist() for metric in metrics}
+        empty_metrics = dict.fromkeys(RENDERED_METRICS)
+        
+        def render_metrics(period_amounts, period_units, index):
+            rendered = dict(empty_metrics)
+            for metric in metrics:
+                unit_code = period_units[metric][index]
+                if unit_code >= 0:
+                    rendered[metric] = {"amount": period_amounts[metric][index], "unit": units[unit_code]}
+            return rendered
+        
+        results = [
+            {
+                "time_period": {"start": start, "end": end},
+                "total": render_metrics(total_amounts, total_unit_codes, period) if has_total else None,
+                "groups": [],
+                "estimated": estimated,
+            }
+            for period, (start, end, estimated, has_total) in enumerate(zip(
+                self.period_starts, self.period_ends, self.estimated.tolist(), self.has_total.tolist()
+            ))
+        ]
+        
+        keys = [list(key) for key in self.keys]
+        for row, (period, key) in enumerate(zip(self.row_period.tolist(), self.row_key.tolist())):
+            results[period]["groups"].append({
+                "keys": keys[key],
+                "metrics": render_metrics(amounts, unit_codes, row),
+            })
+        
+        return {
+            "time_period": time_period,
+            "granularity": granularity,
+            "group_by": group_by,
+            "results": results,
+            "dimension_key": dimension_key,
+            "next_page_token": None,
+            "derived": self.source_granularity is not None,
+            "source_granularity": self.source_granularity,
+        }
+    
+    def to_compact(self, time_period: Dict[str, str], granularity: str, group_by: List[Dict[str, str]],
+                   dimension_key: Optional[str] = None) -> Dict[str, Any]:
+        """Render the frame column-wise: keys and units sent once, amounts as numeric arrays.
+        
+        ``rows`` holds parallel arrays of period index, key index and one amount
+        array per metric (null where the metric is missing); ``totals`` holds one
+        amount per period. A metric whose rows use more than one unit also gets
+        per-row indexes into ``unit_dictionary`` under ``unit_codes``.
+        """
+        metrics = self.metrics
+        units: Dict[str, Optional[str]] = {}
+        mixed_units: Dict[str, Dict[str, List[int]]] = {}
+        for metric in metrics:
+            codes = np.concatenate([self.unit_codes[metric], self.total_unit_codes[metric]])
+            present = np.unique(codes[codes >= 0])
+            units[metric] = self.units[present[0]] if len(present) == 1 else None
+            if len(present) > 1:
+                mixed_units[metric] = {
+                    "rows": self.unit_codes[metric].tolist(),
+                    "totals": self.total_unit_codes[metric].tolist(),
+                }
+        
+        compact = {
+            "format": COMPACT_FORMAT,
+            "time_period": time_period,
+            "granularity": granularity,
+            "group_by": group_by,
+            "dimension_key": dimension_key,
+            "next_page_token": None,
+            "derived": self.source_granularity is not None,
+            "source_granularity": self.source_granularity,
+            "metrics": metrics,
+            "units": units,
+            "periods": {
+                "start": self.period_starts,
+                "end": self.period_ends,
+                "estimated": self.estimated.tolist(),
+                "has_total": self.has_total.tolist(),
+            },
+            "totals": {
+                metric: _amount_list(self.total_amounts[metric], self.total_unit_codes[metric])
+                for metric in metrics
+            },
+            "keys": [list(key) for key in self.keys],
+            "rows": {
+                "period": self.row_period.tolist(),
+                "key": self.row_key.tolist(),
+                "amounts": {
+                    metric: _amount_list(self.amounts[metric], self.unit_codes[metric])
+                    for metric in metrics
+                },
+            },
+        }
+        if mixed_units:
+            compact["unit_dictionary"] = self.units
+            compact["unit_codes"] = mixed_units
+        return compact
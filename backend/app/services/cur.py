@@ -0,0 +1,482 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.models.billing import CostDataRequest
+from app.models.credentials import AWSCredentials
+from app.services.columnar import RESAMPLE_GRANULARITIES, CostFrame, default_unit
+from app.services.warehouse import parse_dimension_filter
+
+logger = logging.getLogger(__name__)
+
+# Aggregate columns and the (normalized) CUR columns they are read from, in order of preference
+KEY_SOURCES = {
+    "day": ["line_item_usage_start_date"],
+    "payer": ["bill_payer_account_id", "line_item_usage_account_id"],
+    "account": ["line_item_usage_account_id"],
+    "record_type": ["line_item_line_item_type"],
+    "service": ["product_product_name", "line_item_product_code"],
+    "region": ["product_region_code", "product_region"],
+    "usage_type": ["line_item_usage_type"],
+    "currency": ["line_item_currency_code"],
+}
+KEY_COLUMNS = list(KEY_SOURCES)
+REQUIRED_KEYS = ("day", "account")
+
+# Cost Explorer metric -> CUR amount column
+METRIC_COLUMNS = {
+    "BlendedCost": "line_item_blended_cost",
+    "UnblendedCost": "line_item_unblended_cost",
+    "NetUnblendedCost": "line_item_net_unblended_cost",
+    "UsageQuantity": "line_item_usage_amount",
+}
+
+# Cost Explorer dimension -> aggregate column
+DIMENSION_COLUMNS = {
+    "SERVICE": "service",
+    "REGION": "region",
+    "USAGE_TYPE": "usage_type",
+    "LINKED_ACCOUNT": "account",
+    "RECORD_TYPE": "record_type",
+}
+
+CUR_SUFFIXES = (".csv", ".csv.gz", ".parquet", ".snappy.parquet")
+
+
+def normalize_column(name: str) -> str:
+    """Map CSV headers (``lineItem/UsageStartDate``) onto Parquet names (``line_item_usage_start_date``)"""
+    parts = [re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", part) for part in name.strip().split("/")]
+    return "_".join(parts).lower()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(partial(handle.read, 1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _current_report_keys(directory: str) -> Dict[str, set]:
+    """Files of the current assembly per billing period, from legacy CUR ``*-Manifest.json`` files.
+    
+    AWS rewrites a month's report several times under new assembly ids; only the
+    assembly named by the period's manifest is current.
+    """
+    current: Dict[str, set] = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith("-Manifest.json"):
+                continue
+            try:
+                with open(os.path.join(root, name)) as handle:
+                    report_keys = json.load(handle).get("reportKeys") or []
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable CUR manifest {name}: {e}")
+                continue
+            current.setdefault(root, set()).update("/".join(key.split("/")[-2:]) for key in report_keys)
+    return current
+
+
+class _IndexedFile:
+    """A processed CUR file: what it looked like and where its aggregate is stored"""
+    __slots__ = ("size", "mtime", "sha256", "rows", "processed_at")
+    
+    def __init__(self, size: int, mtime: float, sha256: str, rows: int, processed_at: float):
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+        self.rows = rows
+        self.processed_at = processed_at
+
+
+class CURDataSource:
+    """Cost data from Cost and Usage Report files in a local directory.
+    
+    Each CSV(.gz) or Parquet file is streamed in chunks of ``cur_chunk_rows`` and
+    reduced to daily sums by account, record type, service, region and usage
+    type, so memory stays bounded by one chunk plus the aggregate whatever the
+    file size. Aggregates are kept per file under ``cur_cache_dir`` alongside an
+    index of file checksums; a scan only reprocesses files that are new or
+    whose contents changed. Queries are answered from the combined aggregates
+    in the CostDataResponse shape, limited to the caller's account (or all
+    linked accounts when the caller is the payer).
+    """
+    
+    def __init__(self, directory: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.directory = directory or settings.cur_directory
+        self.cache_dir = cache_dir or settings.cur_cache_dir
+        self.chunk_rows = settings.cur_chunk_rows
+        # Ingestion is CPU and IO heavy; one file at a time keeps memory bounded
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cur")
+        self._index: Dict[str, _IndexedFile] = {}
+        self._cube: Optional[pd.DataFrame] = None
+        self._service = None
+        self._task: Optional[asyncio.Task] = None
+        self.files_processed = 0
+        self.files_skipped = 0
+        self.rows_read = 0
+        self.scan_failures = 0
+        self.queries = 0
+        self.last_scan_seconds = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return self._cube is not None
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+    
+    async def start(self, service):
+        """Load the stored aggregates and start scanning; ``service`` resolves callers' account ids"""
+        if not settings.cur_enabled:
+            return
+        try:
+            import pyarrow  # noqa: F401 - aggregates are stored as Parquet
+        except ImportError:
+            logger.error("CUR ingestion requires the pyarrow package; CUR data source disabled")
+            return
+        self._service = service
+        await self._run(self._load)
+        self._task = asyncio.create_task(self._scan_loop())
+        logger.info(f"CUR data source reading {self.directory} ({len(self._index)} files indexed)")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, "index.json")
+    
+    def _aggregate_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.parquet")
+    
+    def _load(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            with open(self._index_path) as handle:
+                entries = json.load(handle)
+        except FileNotFoundError:
+            entries = {}
+        self._index = {
+            path: _IndexedFile(**entry) for path, entry in entries.items()
+            if os.path.exists(self._aggregate_path(entry["sha256"]))
+        }
+        self._rebuild_cube()
+    
+    def _save_index(self):
+        temporary = f"{self._index_path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump({path: {slot: getattr(entry, slot) for slot in _IndexedFile.__slots__}
+                       for path, entry in self._index.items()}, handle, indent=1)
+        os.replace(temporary, self._index_path)
+    
+    async def _scan_loop(self):
+        while True:
+            try:
+                await self.scan()
+            except Exception as e:
+                self.scan_failures += 1
+                logger.error(f"CUR scan failed: {e}")
+            await asyncio.sleep(settings.cur_scan_interval)
+    
+    async def scan(self) -> int:
+        """Process new and changed CUR files; returns the number of files (re)processed"""
+        return await self._run(self._scan)
+    
+    def _scan(self) -> int:
+        started = time.monotonic()
+        found = self._discover()
+        changed = False
+        processed = 0
+        
+        for relative in [path for path in self._index if path not in found]:
+            del self._index[relative]
+            changed = True
+        
+        for relative, path in found.items():
+            stat = os.stat(path)
+            entry = self._index.get(relative)
+            if entry is not None and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+                self.files_skipped += 1
+                continue
+            sha256 = _file_sha256(path)
+            if entry is not None and entry.sha256 == sha256:
+                # Touched or copied again, but the same contents
+                entry.size, entry.mtime = stat.st_size, stat.st_mtime
+                self.files_skipped += 1
+                changed = True
+                continue
+            try:
+                aggregate, rows = self._aggregate_file(path)
+            except Exception as e:
+                self.scan_failures += 1
+                logger.error(f"Failed to read CUR file {relative}: {e}")
+                continue
+            aggregate.to_parquet(self._aggregate_path(sha256), index=False)
+            self._index[relative] = _IndexedFile(stat.st_size, stat.st_mtime, sha256, rows, time.time())
+            self.files_processed += 1
+            self.rows_read += rows
+            processed += 1
+            changed = True
+            logger.info(f"Processed CUR file {relative}: {rows} line items, {len(aggregate)} aggregate rows")
+        
+        if changed:
+            self._save_index()
+            self._remove_orphans()
+            self._rebuild_cube()
+        self.last_scan_seconds = time.monotonic() - started
+        return processed
+    
+    def _discover(self) -> Dict[str, str]:
+        """Relative path -> path of every current CUR data file under the directory"""
+        if not os.path.isdir(self.directory):
+            return {}
+        current = _current_report_keys(self.directory)
+        found = {}
+        for root, _, names in os.walk(self.directory):
+            assembly_root, assembly = os.path.split(root)
+            for name in names:
+                if not name.endswith(CUR_SUFFIXES):
+                    continue
+                if assembly_root in current and f"{assembly}/{name}" not in current[assembly_root]:
+                    continue
+                path = os.path.join(root, name)
+                found[os.path.relpath(path, self.directory)] = path
+        return found
+    
+    def _remove_orphans(self):
+        referenced = {f"{entry.sha256}.parquet" for entry in self._index.values()}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".parquet") and name not in referenced:
+                os.remove(os.path.join(self.cache_dir, name))
+    
+    def _rebuild_cube(self):
+        frames = [pd.read_parquet(self._aggregate_path(entry.sha256)) for entry in self._index.values()]
+        if not frames:
+            self._cube = pd.DataFrame({**{column: pd.Series(dtype="category") for column in KEY_COLUMNS},
+                                       **{column: pd.Series(dtype="float64") for column in METRIC_COLUMNS.values()}})
+            self._cube["day"] = self._cube["day"].astype("datetime64[ns]")
+            return
+        cube = pd.concat(frames, ignore_index=True)
+        cube["day"] = pd.to_datetime(cube["day"], format="%Y-%m-%d")
+        for column in KEY_COLUMNS[1:]:
+            cube[column] = cube[column].astype("category")
+        self._cube = cube
+    
+    def _chunks(self, path: str) -> Iterator[pd.DataFrame]:
+        """The file's line items in chunks, limited to the columns the aggregate needs"""
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            parquet = pq.ParquetFile(path, memory_map=True)
+            columns = self._select_columns(parquet.schema_arrow.names)
+            for batch in parquet.iter_batches(batch_size=self.chunk_rows, columns=list(columns)):
+                yield batch.to_pandas().rename(columns=columns)
+        else:
+            header = pd.read_csv(path, nrows=0).columns
+            columns = self._select_columns(header)
+            dtypes = {name: "float64" if normalized in METRIC_COLUMNS.values() else "str"
+                      for name, normalized in columns.items()}
+            with pd.read_csv(path, usecols=list(columns), dtype=dtypes, chunksize=self.chunk_rows,
+                             keep_default_na=False, na_values={name: [""] for name in columns}) as reader:
+                for chunk in reader:
+                    yield chunk.rename(columns=columns)
+    
+    @staticmethod
+    def _select_columns(names) -> Dict[str, str]:
+        """File column -> normalized name, for the columns the aggregate reads"""
+        wanted = {column for sources in KEY_SOURCES.values() for column in sources} | set(METRIC_COLUMNS.values())
+        columns = {name: normalize_column(name) for name in names if normalize_column(name) in wanted}
+        present = set(columns.values())
+        missing = [key for key in REQUIRED_KEYS if not present & set(KEY_SOURCES[key])]
+        if missing:
+            raise ValueError(f"not a Cost and Usage Report (no {', '.join(KEY_SOURCES[key][0] for key in missing)} column)")
+        return columns
+    
+    def _aggregate_file(self, path: str) -> Tuple[pd.DataFrame, int]:
+        """Daily sums of one file by every key column, read chunk by chunk"""
+        metric_columns = list(METRIC_COLUMNS.values())
+        partials: List[pd.DataFrame] = []
+        buffered = 0
+        rows = 0
+        
+        def combine(frames: List[pd.DataFrame]) -> pd.DataFrame:
+            if len(frames) == 1:
+                return frames[0]
+            return pd.concat(frames).groupby(level=KEY_COLUMNS, sort=False).sum(min_count=1)
+        
+        for chunk in self._chunks(path):
+            rows += len(chunk)
+            keys = {}
+            for key, sources in KEY_SOURCES.items():
+                values = None
+                # Later sources fill in rows the preferred column leaves blank (e.g. no product name on tax lines)
+                for source in (column for column in sources if column in chunk):
+                    values = chunk[source] if values is None else values.mask(values.isna() | (values == ""), chunk[source])
+                keys[key] = values if values is not None else pd.Series("", index=chunk.index)
+            day = keys["day"]
+            if pd.api.types.is_datetime64_any_dtype(day):
+                if day.dt.tz is not None:
+                    day = day.dt.tz_convert("UTC").dt.tz_localize(None)
+                day = pd.Series(np.datetime_as_string(day.to_numpy().astype("datetime64[D]")), index=chunk.index)
+            else:
+                day = day.astype(str).str.slice(0, 10)
+            keys["day"] = day
+            keys["region"] = keys["region"].fillna("").replace("", "NoRegion")
+            keys["currency"] = keys["currency"].fillna("").replace("", "USD")
+            
+            frame = pd.DataFrame({key: values.fillna("") for key, values in keys.items()})
+            for column in metric_columns:
+                frame[column] = pd.to_numeric(chunk[column], errors="coerce") if column in chunk else np.nan
+            partials.append(frame.groupby(KEY_COLUMNS, sort=False).sum(min_count=1))
+            buffered += len(partials[-1])
+            # Fold partial sums once they outgrow a chunk, so they never exceed the aggregate's size by much
+            if buffered > self.chunk_rows:
+                partials = [combine(partials)]
+                buffered = len(partials[0])
+        
+        if not partials:
+            raise ValueError("file has no line items")
+        return combine(partials).reset_index(), rows
+    
+    async def _account_id(self, credentials: AWSCredentials) -> str:
+        # Resolved through the identity cache, so repeat queries skip STS
+        return (await self._service.get_account_info(credentials))["account_id"]
+    
+    async def get_cost_frame(self, request: CostDataRequest) -> CostFrame:
+        """The request answered from CUR data visible to the caller's account"""
+        if self._cube is None:
+            raise ValueError("The CUR data source is not enabled")
+        if request.granularity != "DAILY" and request.granularity not in RESAMPLE_GRANULARITIES:
+            raise ValueError(f"CUR data is aggregated daily; {request.granularity} granularity is not available")
+        unsupported = [metric for metric in request.metrics if metric not in METRIC_COLUMNS]
+        if unsupported:
+            raise ValueError(f"Metrics not available from CUR data: {', '.join(unsupported)}. "
+                             f"Use {', '.join(METRIC_COLUMNS)}")
+        for group in request.group_by:
+            if group.get("Type") != "DIMENSION" or group.get("Key") not in DIMENSION_COLUMNS:
+                raise ValueError(f"CUR data can only be grouped by {', '.join(DIMENSION_COLUMNS)}")
+        conditions = parse_dimension_filter(request.filter)
+        if conditions is None or any(dimension not in DIMENSION_COLUMNS for dimension, _, _ in conditions):
+            raise ValueError(f"CUR data can only be filtered on {', '.join(DIMENSION_COLUMNS)} with EQUALS (And/Not)")
+        
+        account = await self._account_id(request.credentials)
+        frame = await asyncio.to_thread(self._query_frame, self._cube, request, account, conditions)
+        self.queries += 1
+        if request.granularity != "DAILY":
+            frame = frame.resample(request.granularity, request.time_period.start, request.time_period.end)
+        return frame
+    
+    async def get_cost_and_usage(self, request: CostDataRequest, compact: bool = False) -> dict:
+        frame = await self.get_cost_frame(request)
+        return self._service.render(frame, request, compact)
+    
+    @staticmethod
+    def _query_frame(cube: pd.DataFrame, request: CostDataRequest, account: str, conditions) -> CostFrame:
+        start, end = request.time_period.start[:10], request.time_period.end[:10]
+        first = date.fromisoformat(start)
+        days = [(first + timedelta(days=offset)).isoformat() for offset in range((date.fromisoformat(end) - first).days)]
+        
+        mask = (cube["day"] >= np.datetime64(start)) & (cube["day"] < np.datetime64(end))
+        mask &= (cube["payer"] == account) | (cube["account"] == account)
+        for dimension, values, negated in conditions:
+            matches = cube[DIMENSION_COLUMNS[dimension]].isin(values)
+            mask &= ~matches if negated else matches
+        selected = cube.loc[mask]
+        
+        metrics = request.metrics
+        group_columns = [DIMENSION_COLUMNS[group["Key"]] for group in request.group_by]
+        sums = selected.groupby(["day", *group_columns], observed=True, sort=True)[
+            [METRIC_COLUMNS[metric] for metric in metrics]
+        ].sum(min_count=1).reset_index()
+        sum_period = ((sums["day"].to_numpy() - np.datetime64(start, "ns")) // np.timedelta64(1, "D")).astype(np.int32)
+        
+        # CUR is billed in a single currency per payer
+        currencies = selected["currency"].unique()
+        currency = str(currencies[0]) if len(currencies) == 1 else "USD" if len(currencies) == 0 else "N/A"
+        units: List[str] = []
+        for metric in metrics:
+            unit = default_unit(metric) if metric == "UsageQuantity" else currency
+            if unit not in units:
+                units.append(unit)
+        unit_code = {metric: units.index(default_unit(metric) if metric == "UsageQuantity" else currency)
+                     for metric in metrics}
+        
+        if group_columns:
+            if len(group_columns) == 1:
+                codes, uniques = pd.factorize(sums[group_columns[0]].astype(str))
+                keys = [(value,) for value in uniques]
+            else:
+                codes, uniques = pd.factorize(pd.MultiIndex.from_frame(sums[group_columns].astype(str)))
+                keys = [tuple(value) for value in uniques]
+            row_period, row_key = sum_period, codes.astype(np.int32)
+            amounts = {metric: sums[METRIC_COLUMNS[metric]].to_numpy(dtype=np.float64) for metric in metrics}
+            unit_codes = {metric: np.where(np.isnan(amounts[metric]), -1, unit_code[metric]).astype(np.int16)
+                          for metric in metrics}
+            # Grouped Cost Explorer results carry an empty Total
+            total_amounts = {metric: np.full(len(days), np.nan) for metric in metrics}
+            total_codes = {metric: np.full(len(days), -1, dtype=np.int16) for metric in metrics}
+        else:
+            keys, row_period, row_key = [], np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+            amounts = {metric: np.zeros(0) for metric in metrics}
+            unit_codes = {metric: np.zeros(0, dtype=np.int16) for metric in metrics}
+            total_amounts = {}
+            for metric in metrics:
+                totals = np.zeros(len(days))
+                totals[sum_period] = np.nan_to_num(sums[METRIC_COLUMNS[metric]].to_numpy(dtype=np.float64))
+                total_amounts[metric] = totals
+            total_codes = {metric: np.full(len(days), unit_code[metric], dtype=np.int16) for metric in metrics}
+        
+        # Line items of the open billing month are estimates until the invoice is issued
+        open_month = datetime.utcnow().date().replace(day=1).isoformat()
+        return CostFrame(
+            period_starts=days,
+            period_ends=days[1:] + [end],
+            estimated=np.array([day >= open_month for day in days], dtype=bool),
+            keys=keys,
+            row_period=row_period,
+            row_key=row_key,
+            amounts=amounts,
+            unit_codes=unit_codes,
+            has_total=np.ones(len(days), dtype=bool),
+            total_amounts=total_amounts,
+            total_unit_codes=total_codes,
+            units=units
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._cube is not None,
+            "files": len(self._index),
+            "aggregate_rows": 0 if self._cube is None else len(self._cube),
+            "files_processed": self.files_processed,
+            "files_skipped": self.files_skipped,
+            "rows_read": self.rows_read,
+            "scan_failures": self.scan_failures,
+            "queries": self.queries,
+            "last_scan_seconds": round(self.last_scan_seconds, 3),
+        }
+
+
+# Global instance shared by all requests in this worker
+cur_data_source = CURDataSource()
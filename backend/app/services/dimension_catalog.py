@@ -0,0 +1,123 @@
+import asyncio
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.models.billing import TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.identity import identity_cache
+from app.services.single_flight import single_flight
+from app.services.spend_governor import background_task
+
+logger = logging.getLogger(__name__)
+
+
+class _CatalogEntry:
+    __slots__ = ("values", "folded", "loaded_at", "refresh")
+    
+    def __init__(self, values: List[str]):
+        # Sorted case-insensitively so a prefix match is one contiguous slice
+        self.values = sorted(set(values), key=str.casefold)
+        self.folded = [value.casefold() for value in self.values]
+        self.loaded_at = time.monotonic()
+        self.refresh: Optional[asyncio.Task] = None
+
+
+class DimensionCatalog:
+    """Per-account, indexed cache of complete dimension value lists.
+    
+    Each (credentials, dimension, time period) catalog is loaded once with every
+    page from GetDimensionValues and kept as a sorted array, so prefix search
+    and pagination are two binary searches and a slice. Catalogs older than the
+    refresh interval are still served while a background task reloads them;
+    only catalogs past the maximum age are reloaded in the request path.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, refresh_after: Optional[int] = None,
+                 max_age: Optional[int] = None):
+        self.max_entries = max_entries or settings.dimension_catalog_max_entries
+        self.refresh_after = refresh_after or settings.dimension_catalog_refresh_after
+        self.max_age = max_age or settings.dimension_catalog_max_age
+        self._entries: "OrderedDict[str, _CatalogEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+    
+    async def query(self, credentials: AWSCredentials, dimension: str, time_period: TimePeriod,
+                    prefix: Optional[str] = None, limit: Optional[int] = None,
+                    offset: int = 0) -> Tuple[Dict, str]:
+        """Return ({values, total, offset, limit}, cache status) for a prefix/page query"""
+        key = self._key(credentials, dimension, time_period)
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry.loaded_at if entry is not None else None
+        
+        if entry is None or age > self.max_age:
+            self.misses += 1
+            entry = await self._load(key, credentials, dimension, time_period)
+            status = "MISS"
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            status = "HIT"
+            if age > self.refresh_after and (entry.refresh is None or entry.refresh.done()):
+                entry.refresh = background_task(self._refresh(key, credentials, dimension, time_period))
+                status = "STALE"
+        
+        start, end = 0, len(entry.values)
+        if prefix:
+            folded_prefix = prefix.casefold()
+            start = bisect_left(entry.folded, folded_prefix)
+            end = bisect_left(entry.folded, folded_prefix + "\U0010ffff", lo=start)
+        
+        page_start = min(start + offset, end)
+        page_end = end if limit is None else min(page_start + limit, end)
+        return {
+            "values": entry.values[page_start:page_end],
+            "total": end - start,
+            "offset": offset,
+            "limit": limit,
+        }, status
+    
+    @staticmethod
+    def _key(credentials: AWSCredentials, dimension: str, time_period: TimePeriod) -> str:
+        return f"{identity_cache.tenant_key(credentials)}:{dimension}:{time_period.start}:{time_period.end}"
+    
+    async def _load(self, key: str, credentials: AWSCredentials, dimension: str,
+                    time_period: TimePeriod) -> _CatalogEntry:
+        async def fetch():
+            values = await cost_explorer_service.get_dimension_values(credentials, dimension, time_period)
+            entry = _CatalogEntry(values)
+            # Keyed after the fetch, which may have authorized the credentials for their account's entries
+            stored_key = self._key(credentials, dimension, time_period)
+            self._entries[stored_key] = entry
+            self._entries.move_to_end(stored_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+        
+        entry, _ = await single_flight.do(f"dimension-catalog:{key}", fetch)
+        return entry
+    
+    async def _refresh(self, key: str, credentials: AWSCredentials, dimension: str, time_period: TimePeriod):
+        self.refreshes += 1
+        try:
+            await self._load(key, credentials, dimension, time_period)
+        except Exception as e:
+            logger.warning(f"Background refresh of {dimension} dimension values failed: {e}")
+    
+    def stats(self) -> dict:
+        return {
+            "catalogs": len(self._entries),
+            "values": sum(len(entry.values) for entry in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+
+# Global instance shared by all requests in this worker
+dimension_catalog = DimensionCatalog()
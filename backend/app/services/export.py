@@ -0,0 +1,158 @@
+import csv
+import io
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from app.models.billing import CostDataRequest
+from app.services.encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class CostExporter:
+    """Turns pages of raw ResultsByTime into CSV, NDJSON or Parquet byte chunks.
+    
+    Each page is converted and emitted as soon as it arrives, so memory use is
+    bounded by one Cost Explorer page regardless of the exported range.
+    
+    If Cost Explorer fails after the first page the export ends with an error
+    instead of looking complete: a ``#error,<detail>`` trailer line in CSV, a
+    ``{"type": "error", "detail": ...}`` record in NDJSON, and a row with only
+    the ``error`` column set in Parquet.
+    """
+    
+    def __init__(self, request: CostDataRequest):
+        self.error: Optional[str] = None
+        self.pages = 0
+        self.metrics = request.metrics
+        self.key_columns = [group['Key'] for group in request.group_by]
+        self.columns = ["period_start", "period_end", "estimated", *self.key_columns]
+        for metric in self.metrics:
+            self.columns += [f"{metric}_amount", f"{metric}_unit"]
+    
+    def rows(self, page: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+        """One row per group (or per period total when ungrouped), with amounts as CE's decimal strings"""
+        for result in page:
+            period = [result['TimePeriod']['Start'], result['TimePeriod']['End'], result.get('Estimated', False)]
+            if self.key_columns:
+                entries = [(group.get('Keys', []), group.get('Metrics', {})) for group in result.get('Groups', [])]
+            else:
+                entries = [([], result.get('Total', {}))]
+            
+            for keys, metrics in entries:
+                row = period + list(keys) + [None] * (len(self.key_columns) - len(keys))
+                for metric in self.metrics:
+                    value = metrics.get(metric) or {}
+                    row += [value.get('Amount'), value.get('Unit')]
+                yield row
+    
+    def stream(self, pages: AsyncIterator[List[Dict[str, Any]]], export_format: str) -> AsyncIterator[bytes]:
+        """Byte chunks of the export; raises ValueError up front for unusable formats"""
+        if export_format == "csv":
+            return self._csv(pages)
+        if export_format == "ndjson":
+            return self._ndjson(pages)
+        if export_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ValueError("Parquet export requires the pyarrow package")
+            return self._parquet(pages, pyarrow, pyarrow.parquet)
+        raise ValueError(f"Unsupported export format: {export_format}. Use one of: {', '.join(EXPORT_FORMATS)}")
+    
+    async def _pages(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """The pages until Cost Explorer fails; the failure is kept in ``self.error``"""
+        try:
+            async for page in pages:
+                self.pages += 1
+                yield page
+        except ValueError as e:
+            self.error = str(e)
+        except Exception as e:
+            logger.error(f"Cost data export failed after {self.pages} pages: {e}")
+            self.error = f"Internal server error: {str(e)}"
+    
+    async def _csv(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        async for page in self._pages(pages):
+            writer.writerows(self.rows(page))
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if self.error is not None:
+            writer.writerow(["#error", self.error])
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    
+    async def _ndjson(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+        async for page in self._pages(pages):
+            lines = [dumps(dict(zip(self.columns, row))) for row in self.rows(page)]
+            if lines:
+                yield b"\n".join(lines) + b"\n"
+        if self.error is not None:
+            yield dumps({"type": "error", "detail": self.error}) + b"\n"
+    
+    async def _parquet(self, pages: AsyncIterator[List[Dict[str, Any]]], pa, pq) -> AsyncIterator[bytes]:
+        fields = [pa.field("period_start", pa.string()), pa.field("period_end", pa.string()),
+                  pa.field("estimated", pa.bool_())]
+        fields += [pa.field(column, pa.string()) for column in self.key_columns]
+        for metric in self.metrics:
+            fields += [pa.field(f"{metric}_amount", pa.float64()), pa.field(f"{metric}_unit", pa.string())]
+        # Null on every row but the one recording a failed export
+        fields.append(pa.field("error", pa.string()))
+        schema = pa.schema(fields)
+        amount_columns = {index for index, field in enumerate(fields) if field.name.endswith("_amount")}
+        
+        sink = _DrainableSink()
+        writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        try:
+            async for page in self._pages(pages):
+                rows = [row + [None] for row in self.rows(page)]
+                if not rows:
+                    continue
+                columns = [list(column) for column in zip(*rows)]
+                for index in amount_columns:
+                    columns[index] = [float(value) if value is not None else None for value in columns[index]]
+                # Each page becomes one row group that is flushed to the client immediately
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            if self.error is not None:
+                writer.write_table(pa.Table.from_pylist([{"error": self.error}], schema=schema))
+        finally:
+            writer.close()
+        yield sink.drain()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes can be taken out as they are produced"""
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def drain(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
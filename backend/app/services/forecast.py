@@ -0,0 +1,183 @@
+import calendar
+import time
+from datetime import date, timedelta
+from statistics import NormalDist
+from typing import Any, Dict
+
+import numpy as np
+
+from app.models.billing import CostDataRequest, ForecastRequest, TimePeriod
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.columnar import default_unit
+from app.services.query_planner import query_planner
+
+
+def design_matrix(days: np.ndarray) -> np.ndarray:
+    """Regressors for day offsets: intercept, linear trend and six weekday indicators.
+    
+    ``days`` are numpy datetime64[D] values; the trend is in days since 1970 so
+    history and horizon rows share one scale.
+    """
+    offsets = days.astype(np.int64)
+    weekdays = (offsets + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    columns = [np.ones(len(days)), (offsets - offsets[0]).astype(np.float64)]
+    columns += [(weekdays == weekday).astype(np.float64) for weekday in range(1, 7)]
+    return np.column_stack(columns)
+
+
+def fit_forecast(series: np.ndarray, history: np.ndarray, horizon: np.ndarray,
+                 confidence: float) -> Dict[str, np.ndarray]:
+    """Fit trend plus weekly seasonality to every row of ``series`` in one least-squares solve.
+    
+    ``series`` is (groups x history days). Returns per-day ``mean``/``lower``/
+    ``upper`` forecasts (groups x horizon days), the residual ``sigma`` per
+    group, and the normal quantile ``z``, horizon regressors and (X'X)^-1 that
+    ``_interval_sums`` needs to size intervals for sums of horizon days.
+    """
+    X = design_matrix(np.concatenate([history, horizon]))
+    X_history, X_horizon = X[:len(history)], X[len(history):]
+    coefficients, _, _, _ = np.linalg.lstsq(X_history, series.T, rcond=None)
+    residuals = series.T - X_history @ coefficients
+    dof = max(len(history) - np.linalg.matrix_rank(X_history), 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+    
+    xtx_inv = np.linalg.pinv(X_history.T @ X_history)
+    leverage = np.einsum("ij,jk,ik->i", X_horizon, xtx_inv, X_horizon)
+    mean = (X_horizon @ coefficients).T
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    spread = z * sigma[:, None] * np.sqrt(1 + leverage)[None, :]
+    return {
+        "mean": mean,
+        "lower": mean - spread,
+        "upper": mean + spread,
+        "sigma": sigma,
+        "z": z,
+        "X_horizon": X_horizon,
+        "xtx_inv": xtx_inv,
+    }
+
+
+def _interval_sums(fit: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, np.ndarray]:
+    """Forecast sums over the masked horizon days, with intervals for the sum.
+    
+    Var(sum) = sigma^2 * (days + s' (X'X)^-1 s), where s is the column sum of the
+    masked horizon regressors.
+    """
+    count = int(mask.sum())
+    mean = fit["mean"][:, mask].sum(axis=1)
+    column_sum = fit["X_horizon"][mask].sum(axis=0)
+    factor = count + column_sum @ fit["xtx_inv"] @ column_sum if count else 0.0
+    spread = fit["z"] * fit["sigma"] * np.sqrt(factor)
+    return {"mean": mean, "lower": mean - spread, "upper": mean + spread}
+
+
+def _amounts(values: Dict[str, np.ndarray], index: int, offset: float = 0.0) -> Dict[str, float]:
+    # Costs do not go negative: clip the projection, not the already-spent offset
+    return {name: round(offset + max(float(array[index]), 0.0), 6) for name, array in values.items()}
+
+
+class ForecastService:
+    """Month-end and N-day cost projections computed locally from daily history.
+    
+    The history is read through the regular cost frame path (warehouse, bucket
+    cache), so projections cost no Cost Explorer calls when it is cached. Every
+    group - plus the overall total - is fitted at once with an ordinary least
+    squares model of trend and weekday effects, with normal prediction
+    intervals that widen with the distance from the fitted data.
+    """
+    
+    def __init__(self):
+        self.forecasts = 0
+        self.series_fitted = 0
+        self.last_fit_ms = 0.0
+    
+    async def forecast(self, request: ForecastRequest) -> Dict[str, Any]:
+        try:
+            as_of = date.fromisoformat(request.as_of) if request.as_of else date.today()
+        except ValueError:
+            raise ValueError(f"as_of must be a YYYY-MM-DD date, got '{request.as_of}'")
+        month_start = as_of.replace(day=1)
+        # The history always covers the month so far, for the month-to-date actuals
+        history_start = min(as_of - timedelta(days=request.history_days), month_start)
+        if any(group.get("Type") not in ("DIMENSION", "TAG", "COST_CATEGORY") for group in request.group_by):
+            raise ValueError("group_by entries need a Type of DIMENSION, TAG or COST_CATEGORY")
+        
+        history_request = query_planner.canonicalize(CostDataRequest(
+            credentials=request.credentials,
+            time_period=TimePeriod(start=history_start.isoformat(), end=as_of.isoformat()),
+            granularity="DAILY",
+            group_by=request.group_by,
+            metrics=[request.metric],
+            filter=request.filter
+        ))
+        frame = await cost_explorer_service.get_cost_frame(history_request)
+        
+        started = time.perf_counter()
+        history = np.arange(np.datetime64(history_start), np.datetime64(as_of))
+        month_end = date(as_of.year, as_of.month, calendar.monthrange(as_of.year, as_of.month)[1])
+        horizon_end = max(month_end + timedelta(days=1), as_of + timedelta(days=request.horizon_days))
+        horizon = np.arange(np.datetime64(as_of), np.datetime64(horizon_end))
+        
+        # Days Cost Explorer omitted had no cost
+        day_index = (np.array(frame.period_starts, dtype="datetime64[D]") - history[0]).astype(np.int64)
+        if frame.keys:
+            series = np.zeros((len(frame.keys) + 1, len(history)))
+            np.add.at(series, (frame.row_key, day_index[frame.row_period]), np.nan_to_num(frame.amounts[request.metric]))
+            series[-1] = series[:-1].sum(axis=0)
+            codes = frame.unit_codes[request.metric]
+        else:
+            series = np.zeros((1, len(history)))
+            series[0, day_index] = np.nan_to_num(frame.total_amounts[request.metric])
+            codes = frame.total_unit_codes[request.metric]
+        present = codes[codes >= 0]
+        unit = frame.units[np.bincount(present).argmax()] if len(present) else default_unit(request.metric)
+        
+        fit = fit_forecast(series, history, horizon, request.confidence)
+        month_mask = horizon <= np.datetime64(month_end)
+        next_mask = horizon < np.datetime64(as_of + timedelta(days=request.horizon_days))
+        month_sums = _interval_sums(fit, month_mask)
+        next_sums = _interval_sums(fit, next_mask)
+        month_to_date = series[:, history >= np.datetime64(month_start)].sum(axis=1)
+        
+        def projection(index: int) -> Dict[str, Any]:
+            result = {
+                "month_to_date": round(float(month_to_date[index]), 6),
+                "month_end": _amounts(month_sums, index, offset=float(month_to_date[index])),
+                "next_days": _amounts(next_sums, index),
+                "daily_sigma": round(float(fit["sigma"][index]), 6),
+            }
+            if request.include_daily:
+                days = [str(day) for day in horizon[next_mask]]
+                daily = {name: fit[name][index, next_mask] for name in ("mean", "lower", "upper")}
+                result["daily"] = [{"date": day, **_amounts(daily, position)} for position, day in enumerate(days)]
+            return result
+        
+        groups = [{"keys": list(key), **projection(index)} for index, key in enumerate(frame.keys)]
+        total = projection(len(series) - 1)
+        
+        self.forecasts += 1
+        self.series_fitted += len(series)
+        self.last_fit_ms = (time.perf_counter() - started) * 1000
+        return {
+            "metric": request.metric,
+            "unit": unit,
+            "as_of": as_of.isoformat(),
+            "history": {"start": history_start.isoformat(), "end": as_of.isoformat()},
+            "month_end_date": month_end.isoformat(),
+            "horizon_days": request.horizon_days,
+            "confidence": request.confidence,
+            "group_by": request.group_by,
+            "groups": groups,
+            "total": total,
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "forecasts": self.forecasts,
+            "series_fitted": self.series_fitted,
+            "last_fit_ms": round(self.last_fit_ms, 3),
+        }
+
+
+# Global instance shared by all requests in this worker
+forecast_service = ForecastService()
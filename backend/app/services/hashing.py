@@ -0,0 +1,23 @@
+import hashlib
+import json
+from typing import Any
+from app.models.credentials import AWSCredentials
+
+
+def credential_fingerprint(credentials: AWSCredentials, *extra: str) -> str:
+    """Stable SHA-256 identity for a set of credentials.
+    
+    Used wherever credentials need to key a cache or pool, so raw secrets are
+    never stored as dictionary or Redis keys.
+    """
+    digest = hashlib.sha256()
+    for part in (credentials.access_key_id, credentials.secret_access_key, credentials.region, *extra):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def request_digest(request: Any) -> str:
+    """SHA-256 of a JSON-serializable request, independent of key order"""
+    normalized = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.models.credentials import AWSCredentials
+from app.services.hashing import credential_fingerprint
+from app.services.single_flight import single_flight
+
+
+class _Identity:
+    __slots__ = ("account_id", "user_id", "arn", "resolved_at", "authorized_at")
+    
+    def __init__(self):
+        self.account_id: Optional[str] = None
+        self.user_id: Optional[str] = None
+        self.arn: Optional[str] = None
+        self.resolved_at = 0.0
+        # When these credentials were last served Cost Explorer data
+        self.authorized_at: Optional[float] = None
+
+
+class IdentityCache:
+    """Caller identities (STS GetCallerIdentity) keyed by hashed credentials.
+    
+    Credential validation and account info share one lookup per TTL, and
+    concurrent lookups for the same credentials share one STS call. Once known,
+    the account ID doubles as a stable tenant key: rate limits key on it as soon
+    as it is resolved, caches once the credentials have themselves been served
+    Cost Explorer data. Cost Explorer access is granted for the whole account,
+    so any such credentials may read the account's cached results. Both keys
+    fall back to the credentials once the identity or the authorization is
+    older than the TTL, so revoked credentials stop reading shared data.
+    """
+    
+    def __init__(self, ttl: Optional[int] = None, max_size: Optional[int] = None):
+        self.ttl = ttl or settings.identity_cache_ttl
+        self.max_size = max_size or settings.identity_cache_max_size
+        self._entries: "OrderedDict[str, _Identity]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def _entry(self, key: str) -> _Identity:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Identity()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return entry
+    
+    async def resolve(self, credentials: AWSCredentials,
+                      loader: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Caller identity ({account_id, user_id, arn}) for credentials, calling ``loader`` when not cached.
+        
+        Errors from ``loader`` propagate and are not cached.
+        """
+        key = credential_fingerprint(credentials)
+        entry = self._entries.get(key)
+        if entry is not None and entry.account_id and time.monotonic() - entry.resolved_at < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            identity, _ = await single_flight.do(f"identity:{key}", loader)
+            entry = self._entry(key)
+            entry.account_id = identity.get("account_id")
+            entry.user_id = identity.get("user_id")
+            entry.arn = identity.get("arn")
+            entry.resolved_at = time.monotonic()
+        return {"account_id": entry.account_id, "user_id": entry.user_id, "arn": entry.arn}
+    
+    def authorize(self, credentials: AWSCredentials):
+        """Record that these credentials were just served Cost Explorer data"""
+        self._entry(credential_fingerprint(credentials)).authorized_at = time.monotonic()
+    
+    def _resolved(self, entry: Optional[_Identity], now: float) -> bool:
+        return entry is not None and bool(entry.account_id) and now - entry.resolved_at < self.ttl
+    
+    def account_key(self, credentials: AWSCredentials) -> str:
+        """The AWS account behind the credentials if known, for rate and concurrency limits"""
+        key = credential_fingerprint(credentials)
+        entry = self._entries.get(key)
+        if self._resolved(entry, time.monotonic()):
+            return f"account-{entry.account_id}"
+        return key
+    
+    def tenant_key(self, credentials: AWSCredentials) -> str:
+        """Cache key for the credentials' data: their account once they may read it, else the credentials"""
+        key = credential_fingerprint(credentials)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if self._resolved(entry, now) and entry.authorized_at is not None and now - entry.authorized_at < self.ttl:
+            return f"account-{entry.account_id}"
+        return key
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "resolved": sum(1 for entry in self._entries.values() if self._resolved(entry, now)),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Global instance shared by all requests in this worker
+identity_cache = IdentityCache()
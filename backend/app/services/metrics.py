@@ -0,0 +1,134 @@
+import time
+from typing import Any, Callable, Dict, Iterator
+import logging
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Own registry so only this service's metrics are exported (no process/platform collectors)
+registry = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests handled",
+    ["method", "route", "status"], registry=registry
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ["method", "route"], buckets=LATENCY_BUCKETS, registry=registry
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "Response body size",
+    ["method", "route"], buckets=SIZE_BUCKETS, registry=registry
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being handled",
+    ["method"], registry=registry
+)
+
+aws_calls = Counter(
+    "aws_api_calls_total", "AWS API calls made, by outcome (ok or the AWS error code)",
+    ["service", "operation", "outcome"], registry=registry
+)
+aws_call_duration = Histogram(
+    "aws_api_call_duration_seconds", "AWS API call latency, excluding rate-limiter queueing",
+    ["service", "operation"], buckets=LATENCY_BUCKETS, registry=registry
+)
+ce_billed_requests = Counter(
+    "aws_ce_billed_requests_total", "Billed Cost Explorer requests, by the API route that caused them",
+    ["route", "operation"], registry=registry
+)
+aws_calls_in_flight = Gauge(
+    "aws_api_calls_in_flight", "AWS API calls currently running",
+    ["service"], registry=registry
+)
+
+transform_duration = Histogram(
+    "response_transform_duration_seconds", "Time spent turning AWS results into response payloads",
+    ["stage"], buckets=LATENCY_BUCKETS, registry=registry
+)
+
+
+def api_operation_name(operation: str) -> str:
+    """AWS API name for a boto3 method name (get_cost_and_usage -> GetCostAndUsage)"""
+    return ''.join(part.capitalize() for part in operation.split('_'))
+
+
+class _ComponentStatsCollector:
+    """Exports the numeric fields of each component's stats() as gauges at scrape time"""
+    
+    def __init__(self):
+        self._components: Dict[str, Callable[[], Dict[str, Any]]] = {}
+    
+    def add(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        self._components[name] = stats
+    
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        for name, stats in self._components.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Failed to collect {name} stats: {e}")
+                continue
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                yield GaugeMetricFamily(f"aws_billing_{name}_{field}", f"{name} {field.replace('_', ' ')}", value=value)
+
+
+component_stats = _ComponentStatsCollector()
+registry.register(component_stats)
+
+
+def register_component(name: str, stats: Callable[[], Dict[str, Any]]):
+    """Expose a component's stats() counters on the metrics endpoint"""
+    component_stats.add(name, stats)
+
+
+def render_metrics() -> tuple:
+    """Prometheus text exposition of all metrics, with its content type"""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status, response size and in-flight requests.
+    
+    Routes are labelled by their path template (unmatched paths share one
+    label) to keep label cardinality bounded. Latency runs until the last body
+    chunk is sent, so streamed exports are measured end to end.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        status = [500]
+        size = [0]
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+        
+        started = time.perf_counter()
+        http_requests_in_flight.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.labels(method).dec()
+            route = getattr(scope.get("route"), "path_format", None) or "unmatched"
+            http_requests.labels(method, route, str(status[0])).inc()
+            http_request_duration.labels(method, route).observe(elapsed)
+            http_response_size.labels(method, route).observe(size[0])
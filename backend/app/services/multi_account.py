@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+import logging
+
+from app.config import settings
+from app.models.billing import AccountCostQuery, CostDataRequest, MultiAccountCostDataRequest
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.columnar import CostFrame
+
+logger = logging.getLogger(__name__)
+
+
+class _AccountLimit:
+    """An account's semaphore and the number of queries holding or waiting for it"""
+    __slots__ = ("semaphore", "users", "last_used")
+    
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class MultiAccountService:
+    """Runs one cost query across many accounts with bounded concurrency.
+    
+    A global semaphore caps how many account queries run at once across all
+    requests in this worker, and a per-account semaphore stops the same
+    credentials being queried too many times in parallel. Unused per-account
+    semaphores are dropped once idle past the TTL or beyond ``max_accounts``.
+    """
+    
+    def __init__(self, max_concurrency: Optional[int] = None, per_account_concurrency: Optional[int] = None,
+                 max_accounts: Optional[int] = None, idle_ttl: Optional[int] = None):
+        self.max_concurrency = max_concurrency or settings.multi_account_max_concurrency
+        self.per_account_concurrency = per_account_concurrency or settings.multi_account_per_account_concurrency
+        self.max_accounts = max_accounts or settings.multi_account_max_accounts
+        self.idle_ttl = idle_ttl if idle_ttl is not None else settings.multi_account_idle_ttl
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        self._account_limits: "OrderedDict[str, _AccountLimit]" = OrderedDict()
+    
+    async def get_cost_and_usage(self, request: MultiAccountCostDataRequest) -> Dict[str, Any]:
+        """Per-account results plus a cross-account rollup; failures are reported per account"""
+        if not request.accounts:
+            raise ValueError("At least one account is required")
+        
+        outcomes = await asyncio.gather(*[self._query_account(request, account) for account in request.accounts])
+        
+        accounts = []
+        frames: List[CostFrame] = []
+        for index, (account, outcome) in enumerate(zip(request.accounts, outcomes)):
+            entry = {"index": index, "alias": account.alias, "status": "ok", "data": None, "error": None}
+            if isinstance(outcome, CostFrame):
+                entry["data"] = self._render(request, outcome)
+                frames.append(outcome)
+            else:
+                entry["status"] = "error"
+                entry["error"] = outcome
+            accounts.append(entry)
+        
+        return {
+            "accounts": accounts,
+            "succeeded": len(frames),
+            "failed": len(accounts) - len(frames),
+            "rollup": self._render(request, CostFrame.merge(frames)) if frames else None,
+        }
+    
+    async def _query_account(self, request: MultiAccountCostDataRequest, account: AccountCostQuery):
+        """Return the account's CostFrame, or an error message"""
+        account_request = CostDataRequest(
+            credentials=account.credentials,
+            time_period=request.time_period,
+            granularity=request.granularity,
+            group_by=request.group_by,
+            metrics=request.metrics,
+            filter=request.filter,
+            resample=request.resample
+        )
+        
+        return await self.get_account_frame(account_request, account.alias)
+    
+    async def get_account_frame(self, request: CostDataRequest, alias: Optional[str] = None) -> Union[CostFrame, str]:
+        """One account's CostFrame within the shared concurrency limits, or an error message"""
+        try:
+            return await self.fetch_account_frame(request)
+        except ValueError as e:
+            return str(e)
+        except Exception as e:
+            logger.error(f"Unexpected error querying account {alias or ''}: {e}")
+            return f"Failed to retrieve cost data: {str(e)}"
+    
+    async def fetch_account_frame(self, request: CostDataRequest) -> CostFrame:
+        """One account's CostFrame within the shared concurrency limits; failures are raised"""
+        async with self._global_semaphore(), self._account_slot(request.credentials):
+            return await cost_explorer_service.get_cost_frame(request)
+    
+    def _global_semaphore(self) -> asyncio.Semaphore:
+        if self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        return self._global_limit
+    
+    @asynccontextmanager
+    async def _account_slot(self, credentials: AWSCredentials):
+        """Hold one of the account's concurrent query slots"""
+        # Resolve first, so every credential for the account shares its slots from the first query on
+        limit = self._account_limit(await cost_explorer_service.resolve_account_key(credentials))
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                yield
+        finally:
+            limit.users -= 1
+            limit.last_used = time.monotonic()
+    
+    def _account_limit(self, key: str) -> _AccountLimit:
+        now = time.monotonic()
+        limit = self._account_limits.get(key)
+        if limit is None:
+            limit = self._account_limits[key] = _AccountLimit(self.per_account_concurrency)
+        limit.last_used = now
+        self._account_limits.move_to_end(key)
+        
+        # Limits are in LRU order, so idle ones are always at the front
+        while self._account_limits:
+            oldest_key, oldest = next(iter(self._account_limits.items()))
+            if oldest.users or (len(self._account_limits) <= self.max_accounts and now - oldest.last_used < self.idle_ttl):
+                break
+            del self._account_limits[oldest_key]
+        return limit
+    
+    @staticmethod
+    def _render(request: MultiAccountCostDataRequest, frame: CostFrame) -> Dict[str, Any]:
+        return frame.to_response(
+            time_period=request.time_period.model_dump(),
+            granularity=request.granularity,
+            group_by=request.group_by
+        )
+
+
+# Global instance shared by all requests in this worker
+multi_account_service = MultiAccountService()
@@ -0,0 +1,226 @@
+import json
+from itertools import combinations, permutations
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.models.billing import CostDataRequest
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.cache import response_cache
+from app.services.columnar import CostFrame
+
+logger = logging.getLogger(__name__)
+
+# Cost Explorer accepts at most two GroupBy entries per query
+MAX_GROUP_BY = 2
+
+
+def _sort_key(expression: Dict[str, Any]) -> str:
+    return json.dumps(expression, sort_keys=True)
+
+
+def _is_equals(selector: Dict[str, Any]) -> bool:
+    return selector.get("MatchOptions", ["EQUALS"]) == ["EQUALS"]
+
+
+def canonicalize_filter(expression: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Rewrite a Cost Explorer filter into one canonical, logically equivalent form.
+    
+    Nested And/Or are flattened and their terms sorted, values are sorted and
+    de-duplicated, the default EQUALS match option is dropped, and ANDed
+    equality matches on the same dimension are merged: includes intersect,
+    exclusions (Not) union, and exclusions are subtracted from includes.
+    """
+    if not expression:
+        return None
+    
+    if "And" in expression:
+        return _canonical_and(expression["And"])
+    
+    if "Or" in expression:
+        terms = []
+        for part in expression["Or"]:
+            part = canonicalize_filter(part)
+            if part is not None:
+                terms.extend(part["Or"] if "Or" in part else [part])
+        terms = _unique_sorted(terms)
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else {"Or": terms}
+    
+    if "Not" in expression:
+        inner = canonicalize_filter(expression["Not"])
+        if inner is None:
+            return None
+        # Double negation
+        return inner["Not"] if set(inner) == {"Not"} else {"Not": inner}
+    
+    canonical = {}
+    for selector_type, selector in expression.items():
+        selector = dict(selector)
+        if "Values" in selector:
+            selector["Values"] = sorted(set(selector["Values"]))
+        if "MatchOptions" in selector:
+            selector["MatchOptions"] = sorted(set(selector["MatchOptions"]))
+            if selector["MatchOptions"] == ["EQUALS"]:
+                del selector["MatchOptions"]
+        canonical[selector_type] = selector
+    return canonical
+
+
+def _canonical_and(parts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    terms = []
+    for part in parts:
+        part = canonicalize_filter(part)
+        if part is not None:
+            terms.extend(part["And"] if set(part) == {"And"} else [part])
+    
+    includes: Dict[str, set] = {}
+    excludes: Dict[str, set] = {}
+    others = []
+    for term in terms:
+        if set(term) == {"Dimensions"} and _is_equals(term["Dimensions"]):
+            key, values = term["Dimensions"]["Key"], set(term["Dimensions"]["Values"])
+            # An empty intersection matches nothing - leave it for Cost Explorer to answer
+            if key in includes and includes[key] & values:
+                includes[key] &= values
+            elif key in includes:
+                others.append(term)
+            else:
+                includes[key] = values
+        elif set(term) == {"Not"} and set(term["Not"]) == {"Dimensions"} and _is_equals(term["Not"]["Dimensions"]):
+            key = term["Not"]["Dimensions"]["Key"]
+            excludes.setdefault(key, set()).update(term["Not"]["Dimensions"]["Values"])
+        else:
+            others.append(term)
+    
+    for key in list(excludes):
+        if key in includes and includes[key] - excludes[key]:
+            includes[key] -= excludes.pop(key)
+    
+    merged = others
+    merged += [{"Dimensions": {"Key": key, "Values": sorted(values)}} for key, values in includes.items()]
+    merged += [{"Not": {"Dimensions": {"Key": key, "Values": sorted(values)}}} for key, values in excludes.items()]
+    merged = _unique_sorted(merged)
+    if not merged:
+        return None
+    return merged[0] if len(merged) == 1 else {"And": merged}
+
+
+def _unique_sorted(terms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [term for _, term in sorted({_sort_key(term): term for term in terms}.items())]
+
+
+def _dimension_term(term: Dict[str, Any]) -> Optional[Tuple[str, List[str], bool]]:
+    """(dimension, values, negated) for an equality match or its negation, else None"""
+    negated = set(term) == {"Not"}
+    selector = term["Not"] if negated else term
+    if set(selector) != {"Dimensions"} or not _is_equals(selector["Dimensions"]):
+        return None
+    return selector["Dimensions"]["Key"], selector["Dimensions"]["Values"], negated
+
+
+class QueryPlanner:
+    """Canonicalizes cost queries and answers them from broader cached results when that is exact.
+    
+    A query filtered on a dimension can be answered from a cached query over
+    the same period, granularity and metrics without that filter term but
+    grouped by the dimension: keep the matching groups, then sum over
+    dimensions the query does not group by. Sums are only taken when every
+    summed row shares a unit. Anything else goes to Cost Explorer.
+    """
+    
+    def __init__(self):
+        self.derived = 0
+        self.fallbacks = 0
+        self.candidates_checked = 0
+    
+    @staticmethod
+    def canonicalize(request: CostDataRequest) -> CostDataRequest:
+        """The request with a canonical filter and sorted, de-duplicated metrics"""
+        return request.model_copy(update={
+            "filter": canonicalize_filter(request.filter),
+            "metrics": sorted(set(request.metrics)),
+        })
+    
+    async def get_cost_and_usage(self, request: CostDataRequest, compact: bool = False) -> dict:
+        """Rendered cost data for a canonical request, derived from the cache when possible"""
+        frame = await self.derive(request)
+        if frame is None:
+            self.fallbacks += 1
+            return await cost_explorer_service.get_cost_and_usage(request, compact=compact)
+        self.derived += 1
+        return cost_explorer_service.render(frame, request, compact)
+    
+    async def derive(self, request: CostDataRequest) -> Optional[CostFrame]:
+        """Answer a request by filtering and summing a cached broader result, or None"""
+        if not settings.cache_enabled:
+            return None
+        for candidate, dropped in self._candidates(request):
+            self.candidates_checked += 1
+            key = response_cache.make_key("cost-data", candidate.credentials, candidate.model_dump(exclude={"credentials"}))
+            cached = await response_cache.get(key)
+            if cached is None:
+                continue
+            frame = self._narrow(CostFrame.from_response(cached, candidate.metrics), candidate, request, dropped)
+            if frame is not None:
+                return frame
+        return None
+    
+    @staticmethod
+    def _candidates(request: CostDataRequest) -> List[Tuple[CostDataRequest, List[Tuple[str, List[str], bool]]]]:
+        """Broader requests that contain the answer: one or two filter terms dropped, their dimensions grouped"""
+        if request.filter is None:
+            return []
+        terms = request.filter["And"] if set(request.filter) == {"And"} else [request.filter]
+        droppable = [(index, parsed) for index, parsed in
+                     ((index, _dimension_term(term)) for index, term in enumerate(terms)) if parsed is not None]
+        grouped = [group["Key"] for group in request.group_by if group.get("Type") == "DIMENSION"]
+        
+        candidates = []
+        for count in (1, 2):
+            for chosen in combinations(droppable, count):
+                dimensions = [parsed[0] for _, parsed in chosen]
+                if len(set(dimensions)) < count:
+                    continue
+                added = [{"Type": "DIMENSION", "Key": dimension} for dimension in dimensions if dimension not in grouped]
+                if len(request.group_by) + len(added) > MAX_GROUP_BY:
+                    continue
+                dropped_indexes = {index for index, _ in chosen}
+                remaining = [term for index, term in enumerate(terms) if index not in dropped_indexes]
+                broader_filter = canonicalize_filter({"And": remaining}) if remaining else None
+                for group_by in permutations(request.group_by + added):
+                    candidates.append((
+                        request.model_copy(update={"filter": broader_filter, "group_by": list(group_by)}),
+                        [parsed for _, parsed in chosen]
+                    ))
+        return candidates
+    
+    @staticmethod
+    def _narrow(frame: CostFrame, broader: CostDataRequest, request: CostDataRequest,
+                dropped: List[Tuple[str, List[str], bool]]) -> Optional[CostFrame]:
+        broader_keys = [(group.get("Type"), group["Key"]) for group in broader.group_by]
+        for dimension, values, negated in dropped:
+            frame = frame.filter_keys(broader_keys.index(("DIMENSION", dimension)), values, negated)
+        
+        wanted_keys = [(group.get("Type"), group["Key"]) for group in request.group_by]
+        if wanted_keys != broader_keys:
+            # Summing across units (e.g. usage hours and GB) would not be exact
+            if any(frame.has_mixed_units(metric) for metric in request.metrics):
+                return None
+            if wanted_keys:
+                frame = frame.regroup([broader_keys.index(key) for key in wanted_keys])
+            else:
+                frame = frame.to_totals()
+        return frame.select_metrics(request.metrics)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "derived": self.derived,
+            "fallbacks": self.fallbacks,
+            "candidates_checked": self.candidates_checked,
+        }
+
+
+# Global instance shared by all requests in this worker
+query_planner = QueryPlanner()
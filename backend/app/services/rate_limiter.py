@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+
+
+class ThrottledError(ValueError):
+    """Raised when a Cost Explorer call could not be made before its queue-wait deadline"""
+    
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        # Seconds sent as Retry-After with the 429 response
+        self.retry_after = retry_after or settings.ce_retry_after
+
+
+class _AccountBucket:
+    __slots__ = ("rate", "tokens", "updated", "last_used", "lock", "waiting")
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = self.last_used = time.monotonic()
+        # asyncio.Lock wakes waiters in FIFO order, which keeps the queue fair
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+
+
+class AdaptiveRateLimiter:
+    """Per-account token bucket whose rate adapts to throttling (AIMD).
+    
+    Every success raises the account's rate additively up to the maximum, and
+    every throttle response cuts it multiplicatively down to the minimum.
+    Callers queue for tokens in FIFO order and give up with ThrottledError if
+    they would wait past their deadline. Buckets are kept in LRU order and
+    dropped once idle past the TTL or beyond ``max_accounts``, unless in use;
+    an account seen again starts over at the initial rate.
+    """
+    
+    def __init__(self, initial_rate: Optional[float] = None, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, burst: Optional[int] = None,
+                 max_accounts: Optional[int] = None, idle_ttl: Optional[int] = None):
+        self.initial_rate = initial_rate or settings.ce_rate_limit_initial
+        self.min_rate = min_rate or settings.ce_rate_limit_min
+        self.max_rate = max_rate or settings.ce_rate_limit_max
+        self.burst = burst or settings.ce_rate_limit_burst
+        self.max_accounts = max_accounts or settings.ce_rate_limit_max_accounts
+        self.idle_ttl = idle_ttl if idle_ttl is not None else settings.ce_rate_limit_idle_ttl
+        self._buckets: "OrderedDict[str, _AccountBucket]" = OrderedDict()
+        self.evictions = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.throttles = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    async def acquire(self, key: str, deadline: float):
+        """Wait for a token for ``key``, raising ThrottledError past ``deadline`` (monotonic time)"""
+        bucket = self._bucket(key)
+        started = time.monotonic()
+        bucket.waiting += 1
+        try:
+            await asyncio.wait_for(bucket.lock.acquire(), timeout=max(deadline - started, 0))
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ThrottledError("Cost Explorer request queue is full for this account, please retry shortly")
+        finally:
+            bucket.waiting -= 1
+        
+        try:
+            while True:
+                now = time.monotonic()
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                bucket.updated = now
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    break
+                
+                delay = (1 - bucket.tokens) / bucket.rate
+                if now + delay > deadline:
+                    self.rejected += 1
+                    raise ThrottledError("Cost Explorer request queue is full for this account, please retry shortly")
+                await asyncio.sleep(delay)
+        finally:
+            bucket.lock.release()
+        
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+    
+    def on_success(self, key: str):
+        bucket = self._bucket(key)
+        bucket.rate = min(self.max_rate, bucket.rate + settings.ce_rate_limit_increase)
+    
+    def on_throttle(self, key: str):
+        self.throttles += 1
+        bucket = self._bucket(key)
+        bucket.rate = max(self.min_rate, bucket.rate * settings.ce_rate_limit_decrease)
+        # Drop any saved burst so the reduced rate takes effect immediately
+        bucket.tokens = min(bucket.tokens, 0.0)
+    
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        self.retries += 1
+        return random.uniform(0, min(settings.ce_retry_max_delay, settings.ce_retry_base_delay * 2 ** attempt))
+    
+    def stats(self) -> dict:
+        return {
+            "accounts": len(self._buckets),
+            "queue_depth": sum(bucket.waiting + bucket.lock.locked() for bucket in self._buckets.values()),
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "avg_wait_seconds": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait_seconds": self.max_wait,
+            "min_rate": min((bucket.rate for bucket in self._buckets.values()), default=self.initial_rate),
+            "evictions": self.evictions,
+        }
+    
+    def _bucket(self, key: str) -> _AccountBucket:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _AccountBucket(self.initial_rate, self.burst)
+        bucket.last_used = now
+        self._buckets.move_to_end(key)
+        self._evict(now)
+        return bucket
+    
+    def _evict(self, now: float):
+        # Buckets are in LRU order, so idle ones are always at the front
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket.waiting or bucket.lock.locked():
+                break
+            if len(self._buckets) <= self.max_accounts and now - bucket.last_used < self.idle_ttl:
+                break
+            del self._buckets[key]
+            self.evictions += 1
+
+
+# Global instance shared by all requests in this worker
+rate_limiter = AdaptiveRateLimiter()
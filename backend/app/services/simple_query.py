@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from app.models.billing import CostDataRequest, TimePeriod
+from app.models.credentials import AWSCredentials
+
+
+def build_simple_request(request_data: Dict[str, Any]) -> CostDataRequest:
+    """Build a CostDataRequest from the flat /cost-data-simple parameters"""
+    # Extract credentials
+    if "credentials" not in request_data:
+        raise ValueError("AWS credentials are required")
+    
+    credentials = AWSCredentials(**request_data["credentials"])
+    
+    # Default dates
+    start_date = request_data.get("start_date")
+    end_date = request_data.get("end_date")
+    
+    if not start_date or not end_date:
+        end_dt = datetime.now().date()
+        start_dt = end_dt - timedelta(days=30)
+        start_date = start_dt.strftime("%Y-%m-%d")
+        end_date = end_dt.strftime("%Y-%m-%d")
+    
+    # Parse metrics
+    metrics_str = request_data.get("metrics", "BlendedCost")
+    metrics_list = [m.strip() for m in metrics_str.split(",")]
+    
+    # Build group_by list
+    group_by = []
+    group_by_dimension = request_data.get("group_by_dimension")
+    if group_by_dimension:
+        group_by.append({
+            "Type": "DIMENSION",
+            "Key": group_by_dimension
+        })
+    
+    # Build filter conditions
+    filter_conditions = []
+    
+    # Service filter
+    service_filter = request_data.get("service_filter")
+    if service_filter:
+        filter_conditions.append({
+            "Dimensions": {
+                "Key": "SERVICE",
+                "Values": [service_filter]
+            }
+        })
+    
+    # Region filter
+    region_filter = request_data.get("region_filter")
+    if region_filter:
+        filter_conditions.append({
+            "Dimensions": {
+                "Key": "REGION",
+                "Values": [region_filter]
+            }
+        })
+    
+    # Charge type filter
+    charge_type = request_data.get("charge_type")
+    if charge_type:
+        filter_conditions.append({
+            "Dimensions": {
+                "Key": "RECORD_TYPE",
+                "Values": [charge_type]
+            }
+        })
+    
+    # Build charge type exclusions
+    charge_type_exclusions = []
+    
+    include_support = request_data.get("include_support", True)
+    include_other_subscription = request_data.get("include_other_subscription", True)
+    include_upfront = request_data.get("include_upfront", True)
+    include_refund = request_data.get("include_refund", True)
+    include_credit = request_data.get("include_credit", True)
+    include_ri_fee = request_data.get("include_ri_fee", True)
+    
+    if not include_support:
+        charge_type_exclusions.append("Support")
+    if not include_other_subscription:
+        charge_type_exclusions.append("Other_Subscription")
+    if not include_upfront:
+        charge_type_exclusions.append("Fee")
+    if not include_refund:
+        charge_type_exclusions.append("Refund")
+    if not include_credit:
+        charge_type_exclusions.append("Credit")
+    if not include_ri_fee:
+        charge_type_exclusions.append("RIFee")
+    
+    if charge_type_exclusions:
+        filter_conditions.append({
+            "Not": {
+                "Dimensions": {
+                    "Key": "RECORD_TYPE",
+                    "Values": charge_type_exclusions
+                }
+            }
+        })
+    
+    # Combine filters with AND logic
+    cost_filter = None
+    if filter_conditions:
+        if len(filter_conditions) == 1:
+            cost_filter = filter_conditions[0]
+        else:
+            cost_filter = {
+                "And": filter_conditions
+            }
+    
+    # Create request
+    return CostDataRequest(
+        credentials=credentials,
+        time_period=TimePeriod(start=start_date, end=end_date),
+        granularity=request_data.get("granularity", "DAILY"),
+        group_by=group_by,
+        metrics=metrics_list,
+        filter=cost_filter,
+        resample=request_data.get("resample", False)
+    )
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into a single execution.
+    
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it is running await the same task and share its result or
+    error. Running it as a task means a disconnecting first caller does not
+    cancel the call for everyone else.
+    """
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared) where ``shared`` is True if another caller's call was joined"""
+        task = self._in_flight.get(key)
+        shared = task is not None
+        
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(func())
+            self._in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        
+        return await asyncio.shield(task), shared
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+
+# Global instance shared by all requests in this worker
+single_flight = SingleFlight()
@@ -0,0 +1,288 @@
+import asyncio
+import contextvars
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from app.config import settings
+from app.services.metrics import api_operation_name, ce_billed_requests
+from app.services.rate_limiter import ThrottledError
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ROUTE = "background"
+# Caller key that usage past ``ce_budget_max_callers`` distinct callers a month is counted under
+OTHER_CALLERS = "other"
+# Days of per-route usage kept for reports (covers the current and previous month)
+HISTORY_DAYS = 62
+
+# ASGI scope of the request being handled; routing adds the matched route to it
+_current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("spend_scope", default=None)
+
+
+class BudgetExceededError(ThrottledError):
+    """Raised instead of calling Cost Explorer when the request budget does not allow the call"""
+
+
+def current_route() -> str:
+    """Path template of the API route being handled, or ``background`` outside requests"""
+    scope = _current_scope.get()
+    if scope is None:
+        return BACKGROUND_ROUTE
+    return getattr(scope.get("route"), "path_format", None) or "unmatched"
+
+
+def background_task(coroutine) -> asyncio.Task:
+    """Run ``coroutine`` as a task billed as background work, even when started while handling a request"""
+    context = contextvars.copy_context()
+    context.run(_current_scope.set, None)
+    return asyncio.create_task(coroutine, context=context)
+
+
+def _caller_label(account: str) -> str:
+    """Account key with the account ID masked, since usage reports are not tied to credentials"""
+    if account == OTHER_CALLERS:
+        return account
+    if account.startswith("account-"):
+        return f"account-...{account[-4:]}"
+    return f"credentials-{account[:8]}"
+
+
+def _seconds_until_reset(now: datetime, window: str) -> int:
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "day":
+        reset = midnight + timedelta(days=1)
+    else:
+        reset = (midnight.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return max(1, int((reset - now).total_seconds()) + 1)
+
+
+class _Window:
+    """Billed requests in one budget window (a UTC day or month)"""
+    __slots__ = ("period", "total", "accounts")
+    
+    def __init__(self, period: str):
+        self.period = period
+        self.total = 0
+        self.accounts: Counter = Counter()
+
+
+class SpendContextMiddleware:
+    """ASGI middleware exposing the current request to the spend governor, to attribute calls to routes"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+
+class SpendGovernor:
+    """Accounting and budgets for billed Cost Explorer requests.
+    
+    Every request sent to Cost Explorer (including retries) is counted per UTC
+    day and month, in total and per AWS account, and attributed to the API
+    route that caused it or to background work. Past ``cache_only_at`` of any
+    budget that applies, an account goes cache-only: cached responses are
+    served at any age, flagged stale, and background refreshes stop, leaving
+    the remaining requests for queries with nothing cached. At the budget
+    itself calls fail with a BudgetExceededError until the window resets.
+    
+    At most ``max_callers`` accounts are tracked per month; later ones share
+    the ``other`` caller (and its per-account budget). Attempts Cost Explorer
+    rejects as unauthenticated are not billed and are handed back via ``settle``.
+    """
+    
+    def __init__(self, daily: Optional[int] = None, monthly: Optional[int] = None,
+                 account_daily: Optional[int] = None, account_monthly: Optional[int] = None,
+                 cache_only_at: Optional[float] = None, max_callers: Optional[int] = None):
+        # 0 disables a budget, so only None falls back to the settings
+        self.daily = settings.ce_budget_daily if daily is None else daily
+        self.monthly = settings.ce_budget_monthly if monthly is None else monthly
+        self.account_daily = settings.ce_budget_account_daily if account_daily is None else account_daily
+        self.account_monthly = settings.ce_budget_account_monthly if account_monthly is None else account_monthly
+        self.cache_only_at = settings.ce_budget_cache_only_at if cache_only_at is None else cache_only_at
+        self.max_callers = max_callers or settings.ce_budget_max_callers
+        self._day = _Window("")
+        self._month = _Window("")
+        # day -> (route, account) -> requests
+        self._history: "OrderedDict[str, Counter]" = OrderedDict()
+        self.denied = 0
+        self.unbilled = 0
+    
+    def _roll(self) -> datetime:
+        """Start new windows when the UTC day or month has changed"""
+        now = datetime.now(timezone.utc)
+        day = now.strftime("%Y-%m-%d")
+        if self._day.period != day:
+            self._day = _Window(day)
+            if self._month.period != day[:7]:
+                self._month = _Window(day[:7])
+            self._history[day] = Counter()
+            while len(self._history) > HISTORY_DAYS:
+                self._history.popitem(last=False)
+        return now
+    
+    def _caller(self, account: str) -> str:
+        """Key usage is counted under: the account itself while there is room, else ``other``"""
+        accounts = self._month.accounts
+        if account in accounts or len(accounts) < self.max_callers:
+            return account
+        return OTHER_CALLERS
+    
+    def _usage(self, account: Optional[str]) -> Tuple[float, str]:
+        """Largest used fraction of the budgets that apply to ``account``, and that budget's window"""
+        if account is not None:
+            account = self._caller(account)
+        checks = [(self._day.total, self.daily, "day"), (self._month.total, self.monthly, "month")]
+        if account is not None:
+            checks += [
+                (self._day.accounts[account], self.account_daily, "day"),
+                (self._month.accounts[account], self.account_monthly, "month"),
+            ]
+        fraction, window = 0.0, "day"
+        for used, budget, name in checks:
+            if budget and used / budget >= fraction:
+                fraction, window = used / budget, name
+        return fraction, window
+    
+    def _mode(self, fraction: float) -> str:
+        if fraction >= 1:
+            return "exhausted"
+        if fraction >= self.cache_only_at:
+            return "cache-only"
+        return "normal"
+    
+    def mode(self, account: Optional[str] = None) -> str:
+        """Budget mode of an account (rate-limit key), or of the global budgets without one"""
+        self._roll()
+        return self._mode(self._usage(account)[0])
+    
+    def charge(self, account: str, operation: str):
+        """Count one Cost Explorer request for ``account`` before it is sent.
+        
+        Raises BudgetExceededError when the account's budget is used up, or
+        when it is cache-only and the call is background work. Every charge
+        is followed by ``settle`` once the attempt is over.
+        """
+        now = self._roll()
+        route = current_route()
+        account = self._caller(account)
+        fraction, window = self._usage(account)
+        mode = self._mode(fraction)
+        if mode == "exhausted" or (mode == "cache-only" and route == BACKGROUND_ROUTE):
+            self.denied += 1
+            if mode == "exhausted":
+                message = f"The Cost Explorer request budget for this {window} is used up, only cached data is available until it resets"
+            else:
+                message = f"Background Cost Explorer requests are paused until this {window}'s request budget resets"
+            raise BudgetExceededError(message, retry_after=_seconds_until_reset(now, window))
+        
+        self._day.total += 1
+        self._day.accounts[account] += 1
+        self._month.total += 1
+        self._month.accounts[account] += 1
+        self._history[self._day.period][(route, account)] += 1
+        new_mode = self._mode(self._usage(account)[0])
+        if new_mode != mode:
+            logger.warning(f"Cost Explorer budget mode for {_caller_label(account)} is now {new_mode}")
+    
+    def settle(self, account: str, operation: str, billed: bool = True):
+        """Record a charged attempt as billed, or hand its charge back (e.g. it failed authentication)"""
+        route = current_route()
+        if billed:
+            ce_billed_requests.labels(route, api_operation_name(operation)).inc()
+            return
+        
+        self._roll()
+        account = self._caller(account)
+        self.unbilled += 1
+        for counter, key in ((self._day.accounts, account), (self._month.accounts, account),
+                             (self._history[self._day.period], (route, account))):
+            if counter[key] > 0:
+                counter[key] -= 1
+                if not counter[key]:
+                    del counter[key]
+        self._day.total = max(0, self._day.total - 1)
+        self._month.total = max(0, self._month.total - 1)
+    
+    def usage(self, limit: int = 50) -> Dict[str, Any]:
+        """Requests and estimated cost for today and this month, per route and per caller"""
+        self._roll()
+        today, month = self._day.period, self._month.period
+        route_today: Counter = Counter()
+        route_month: Counter = Counter()
+        caller_today: Counter = Counter()
+        caller_routes: Dict[str, Counter] = {}
+        for day, counts in self._history.items():
+            if not day.startswith(month):
+                continue
+            for (route, account), requests in counts.items():
+                route_month[route] += requests
+                caller_routes.setdefault(account, Counter())[route] += requests
+                if day == today:
+                    route_today[route] += requests
+                    caller_today[account] += requests
+        
+        def cost(requests: int) -> float:
+            return round(requests * settings.ce_request_cost, 2)
+        
+        routes = [
+            {"route": route, "today": route_today[route], "month": requests, "estimated_cost": cost(requests)}
+            for route, requests in route_month.most_common(limit)
+        ]
+        callers = [
+            {
+                "caller": _caller_label(account),
+                "mode": self._mode(self._usage(account)[0]),
+                "today": caller_today[account],
+                "month": requests,
+                "estimated_cost": cost(requests),
+                "routes": dict(caller_routes[account].most_common()),
+            }
+            for account, requests in self._month.accounts.most_common(limit)
+        ]
+        return {
+            "day": today,
+            "month": month,
+            "mode": self._mode(self._usage(None)[0]),
+            "budgets": {
+                "daily": self.daily,
+                "monthly": self.monthly,
+                "account_daily": self.account_daily,
+                "account_monthly": self.account_monthly,
+                "cache_only_at": self.cache_only_at,
+            },
+            "requests": {"today": self._day.total, "month": self._month.total},
+            "estimated_cost": {"today": cost(self._day.total), "month": cost(self._month.total)},
+            "denied": self.denied,
+            "unbilled": self.unbilled,
+            "routes": routes,
+            "callers": callers,
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        self._roll()
+        return {
+            "mode": self._mode(self._usage(None)[0]),
+            "requests_today": self._day.total,
+            "requests_month": self._month.total,
+            "estimated_cost_month": round(self._month.total * settings.ce_request_cost, 2),
+            "accounts_limited": sum(
+                1 for account in self._month.accounts if self._mode(self._usage(account)[0]) != "normal"
+            ),
+            "denied": self.denied,
+            "unbilled": self.unbilled,
+        }
+
+
+# Global instance shared by all requests in this worker
+spend_governor = SpendGovernor()
@@ -0,0 +1,115 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from app.models.billing import CostDataRequest
+from app.services.columnar import CostFrame, format_amount
+from app.services.encoding import dumps
+from app.services.rate_limiter import ThrottledError
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+class CostStreamer:
+    """Renders pages of raw ResultsByTime as a progressive cost data stream.
+    
+    The stream is a ``meta`` frame (the response header fields), one ``results``
+    frame per Cost Explorer page holding that page's ResultByTime entries in
+    the CostDataResponse shape, and a closing ``summary`` frame with per-metric
+    totals - or an ``error`` frame if Cost Explorer fails part way. A period's
+    groups may continue in the next frame when Cost Explorer pages within it.
+    Only one page is held in memory at a time.
+    """
+    
+    def __init__(self, request: CostDataRequest):
+        self.request = request
+        self.metrics = request.metrics
+        # metric -> unit -> running sum
+        self._totals: Dict[str, Dict[str, float]] = {metric: {} for metric in self.metrics}
+        self._last_period: Optional[str] = None
+        self.pages = 0
+        self.periods = 0
+        self.groups = 0
+    
+    async def frames(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        request = self.request
+        yield {
+            "type": "meta",
+            "time_period": request.time_period.model_dump(),
+            "granularity": request.granularity,
+            "group_by": request.group_by,
+        }
+        try:
+            async for page in pages:
+                frame = CostFrame.from_results(page, self.metrics)
+                self._accumulate(frame)
+                yield {
+                    "type": "results",
+                    "page": self.pages,
+                    "results": frame.to_response(
+                        time_period=request.time_period.model_dump(),
+                        granularity=request.granularity,
+                        group_by=request.group_by
+                    )["results"],
+                }
+        except (ThrottledError, ValueError) as e:
+            yield {"type": "error", "detail": str(e)}
+            return
+        except Exception as e:
+            logger.error(f"Cost data stream failed after {self.pages} pages: {e}")
+            yield {"type": "error", "detail": f"Internal server error: {str(e)}"}
+            return
+        yield self._summary()
+    
+    def _accumulate(self, frame: CostFrame):
+        self.pages += 1
+        for start in frame.period_starts:
+            if start != self._last_period:
+                self.periods += 1
+                self._last_period = start
+        self.groups += frame.num_rows
+        
+        grouped = bool(self.request.group_by)
+        for metric in self.metrics:
+            amounts = frame.amounts[metric] if grouped else frame.total_amounts[metric]
+            codes = frame.unit_codes[metric] if grouped else frame.total_unit_codes[metric]
+            totals = self._totals[metric]
+            for code in np.unique(codes[codes >= 0]).tolist():
+                unit = frame.units[code]
+                totals[unit] = totals.get(unit, 0.0) + float(np.nansum(amounts[codes == code]))
+    
+    def _summary(self) -> Dict[str, Any]:
+        totals = {}
+        for metric, by_unit in self._totals.items():
+            if not by_unit:
+                totals[metric] = None
+            else:
+                # Mixed units add up to a quantity Cost Explorer reports as N/A
+                unit = next(iter(by_unit)) if len(by_unit) == 1 else "N/A"
+                totals[metric] = {"amount": format_amount(round(sum(by_unit.values()), 10)), "unit": unit}
+        return {
+            "type": "summary",
+            "pages": self.pages,
+            "periods": self.periods,
+            "groups": self.groups,
+            "totals": totals,
+        }
+    
+    def stream(self, pages: AsyncIterator[List[Dict[str, Any]]], stream_format: str) -> AsyncIterator[bytes]:
+        """Encoded frames; raises ValueError up front for unknown formats"""
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported stream format: {stream_format}. Use one of: {', '.join(STREAM_FORMATS)}")
+        return self._encoded(pages, stream_format)
+    
+    async def _encoded(self, pages: AsyncIterator[List[Dict[str, Any]]], stream_format: str) -> AsyncIterator[bytes]:
+        async for frame in self.frames(pages):
+            if stream_format == "sse":
+                yield b"event: " + frame["type"].encode("ascii") + b"\ndata: " + dumps(frame) + b"\n\n"
+            else:
+                yield dumps(frame) + b"\n"
@@ -0,0 +1,465 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from app.config import settings
+from app.models.billing import CostDataRequest, TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.columnar import RESAMPLE_GRANULARITIES, CostFrame, default_unit
+from app.services.hashing import credential_fingerprint
+from app.services.identity import identity_cache
+
+logger = logging.getLogger(__name__)
+
+# (dimension, values, negated) - one ANDed term of a Cost Explorer filter
+Condition = Tuple[str, List[str], bool]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cost_facts (
+    account TEXT NOT NULL,
+    cube TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    day TEXT NOT NULL,
+    record_type TEXT NOT NULL,
+    dim1 TEXT NOT NULL,
+    dim2 TEXT NOT NULL,
+    amount REAL NOT NULL,
+    unit TEXT NOT NULL,
+    PRIMARY KEY (account, cube, metric, day, record_type, dim1, dim2)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    account TEXT NOT NULL,
+    cube TEXT NOT NULL,
+    start_day TEXT NOT NULL,
+    end_day TEXT NOT NULL,
+    final_day TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (account, cube)
+);
+"""
+
+
+def parse_dimension_filter(expression: Optional[Dict[str, Any]]) -> Optional[List[Condition]]:
+    """Flatten a filter built from ANDed (possibly negated) Dimensions equality matches.
+    
+    Returns None for any other filter shape (Or, Tags, CostCategories, match
+    options other than EQUALS), which the warehouse cannot answer.
+    """
+    if not expression:
+        return []
+    if set(expression) == {"And"}:
+        conditions = []
+        for part in expression["And"]:
+            parsed = parse_dimension_filter(part)
+            if parsed is None:
+                return None
+            conditions.extend(parsed)
+        return conditions
+    
+    negated = set(expression) == {"Not"}
+    if negated:
+        expression = expression["Not"]
+    if set(expression) != {"Dimensions"}:
+        return None
+    dimension = expression["Dimensions"]
+    if dimension.get("MatchOptions", ["EQUALS"]) != ["EQUALS"] or not dimension.get("Values"):
+        return None
+    return [(dimension["Key"], list(dimension["Values"]), negated)]
+
+
+class _SyncedAccount:
+    __slots__ = ("credentials", "last_seen")
+    
+    def __init__(self, credentials: AWSCredentials):
+        self.credentials = credentials
+        self.last_seen = time.monotonic()
+
+
+class _Coverage:
+    """Days of a cube held locally: [start, end), with days from ``final`` on still estimated"""
+    __slots__ = ("start", "end", "final")
+    
+    def __init__(self, start: str, end: str, final: str):
+        self.start = start
+        self.end = end
+        self.final = final
+
+
+class CostWarehouse:
+    """Local SQLite store of daily costs, kept in sync with Cost Explorer in the background.
+    
+    Each cube holds daily amounts for every record type by one or two dimensions
+    (e.g. SERVICE x REGION), pulled with one grouped query per record type. Queries
+    whose filter and group-by dimensions fit a cube and whose dates start in
+    the finalized part of a cube are answered locally, with any days from the
+    first estimated one on fetched from Cost Explorer and stitched on;
+    everything else returns None and goes to Cost Explorer. Accounts are enlisted for syncing when they query the API -
+    their credentials are only held in memory, and dropped once idle. Data is
+    stored per tenant key, so every authorized credential of an account reads
+    (and syncs) the same rows.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.warehouse_path
+        self.metrics = [metric.strip() for metric in settings.warehouse_metrics.split(",") if metric.strip()]
+        self.cubes = [
+            tuple(dimension.strip() for dimension in cube.split("+"))
+            for cube in settings.warehouse_cubes.split(",") if cube.strip()
+        ]
+        # One thread owns the connection, so SQLite never sees concurrent use
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warehouse")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._coverage: Dict[Tuple[str, str], _Coverage] = {}
+        self._accounts: Dict[str, _SyncedAccount] = {}
+        self._service = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+        self.tail_fetches = 0
+        self.syncs = 0
+        self.sync_failures = 0
+        self.last_sync_seconds = 0.0
+    
+    @staticmethod
+    def cube_name(cube: Tuple[str, ...]) -> str:
+        return "+".join(cube)
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+    
+    async def start(self, service):
+        """Open the store and start the sync loop; ``service`` is the AWSCostExplorerService to pull through"""
+        if not settings.warehouse_enabled:
+            return
+        self._service = service
+        await self._run(self._open)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._sync_loop())
+        logger.info(f"Cost warehouse at {self.path} with cubes {', '.join(map(self.cube_name, self.cubes))}")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+    
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        for account, cube, start, end, final in conn.execute(
+            "SELECT account, cube, start_day, end_day, final_day FROM sync_state"
+        ):
+            self._coverage[(account, cube)] = _Coverage(start, end, final)
+        self._conn = conn
+    
+    def register(self, credentials: AWSCredentials):
+        """Enlist an account for background syncing (or mark it as still in use)"""
+        if self._wake is None:
+            return
+        key = credential_fingerprint(credentials)
+        account = self._accounts.get(key)
+        if account is None:
+            self._accounts[key] = _SyncedAccount(credentials)
+            self._wake.set()
+        else:
+            account.last_seen = time.monotonic()
+    
+    async def query(self, request: CostDataRequest) -> Optional[CostFrame]:
+        """Answer a request from local data, or None if the warehouse does not cover it"""
+        if self._conn is None:
+            return None
+        self.register(request.credentials)
+        plan = self._plan(request)
+        if plan is None:
+            self.misses += 1
+            return None
+        
+        # Estimated days may have changed since the last sync - only finalized ones are read locally
+        start, end = request.time_period.start, request.time_period.end
+        final_end = min(end, plan[-1].final)
+        local_request = request.model_copy(update={"time_period": TimePeriod(start=start, end=final_end)})
+        frame = await self._run(self._query_frame, local_request, *plan)
+        if final_end < end:
+            tail = await self._service.get_cost_frame(request.model_copy(update={
+                "granularity": "DAILY",
+                "time_period": TimePeriod(start=final_end, end=end),
+            }), use_warehouse=False)
+            frame = CostFrame.merge([frame, tail])
+            self.tail_fetches += 1
+        self.hits += 1
+        if request.granularity != "DAILY":
+            frame = frame.resample(request.granularity, request.time_period.start, request.time_period.end)
+        return frame
+    
+    def _plan(self, request: CostDataRequest) -> Optional[Tuple[str, Tuple[str, ...], List[str], List[Condition], _Coverage]]:
+        """(account, cube, group dimensions, filter conditions, coverage) for a request the warehouse can answer"""
+        start, end = request.time_period.start, request.time_period.end
+        if len(start) != 10 or len(end) != 10:
+            return None
+        if request.granularity != "DAILY" and request.granularity not in RESAMPLE_GRANULARITIES:
+            return None
+        if not set(request.metrics) <= set(self.metrics):
+            return None
+        if any(group.get("Type") != "DIMENSION" for group in request.group_by):
+            return None
+        conditions = parse_dimension_filter(request.filter)
+        if conditions is None:
+            return None
+        
+        group_dimensions = [group["Key"] for group in request.group_by]
+        needed = ({dimension for dimension, _, _ in conditions} | set(group_dimensions)) - {"RECORD_TYPE"}
+        account = identity_cache.tenant_key(request.credentials)
+        for cube in self.cubes:
+            coverage = self._coverage.get((account, self.cube_name(cube)))
+            if needed <= set(cube) and coverage is not None and coverage.start <= start < coverage.final:
+                return account, cube, group_dimensions, conditions, coverage
+        return None
+    
+    def _query_frame(self, request: CostDataRequest, account: str, cube: Tuple[str, ...],
+                     group_dimensions: List[str], conditions: List[Condition], coverage: _Coverage) -> CostFrame:
+        columns = {"RECORD_TYPE": "record_type", **{dimension: f"dim{position + 1}" for position, dimension in enumerate(cube)}}
+        group_columns = [columns[dimension] for dimension in group_dimensions]
+        start, end = request.time_period.start, request.time_period.end
+        
+        clauses = ["account = ?", "cube = ?", f"metric IN ({', '.join('?' * len(request.metrics))})", "day >= ?", "day < ?"]
+        params: List[Any] = [account, self.cube_name(cube), *request.metrics, start, end]
+        for dimension, values, negated in conditions:
+            clauses.append(f"{columns[dimension]} {'NOT IN' if negated else 'IN'} ({', '.join('?' * len(values))})")
+            params.extend(values)
+        selected = ", ".join(["day", *group_columns, "metric"])
+        rows = self._conn.execute(
+            f"SELECT {selected}, SUM(amount), MIN(unit), MAX(unit) FROM cost_facts "
+            f"WHERE {' AND '.join(clauses)} GROUP BY {selected} ORDER BY {selected}",
+            params
+        ).fetchall()
+        
+        first = date.fromisoformat(start)
+        days = [(first + timedelta(days=offset)).isoformat() for offset in range((date.fromisoformat(end) - first).days)]
+        day_index = {day: index for index, day in enumerate(days)}
+        units: List[str] = []
+        unit_index: Dict[str, int] = {}
+        
+        def unit_code(low: str, high: str) -> int:
+            # Mixed units add up to a quantity Cost Explorer reports as N/A
+            unit = low if low == high else "N/A"
+            if unit not in unit_index:
+                unit_index[unit] = len(units)
+                units.append(unit)
+            return unit_index[unit]
+        
+        nan = float("nan")
+        metrics = request.metrics
+        num_keys = len(group_columns)
+        if num_keys:
+            keys: List[Tuple[str, ...]] = []
+            key_index: Dict[Tuple[str, ...], int] = {}
+            row_index: Dict[Tuple[int, int], int] = {}
+            row_period, row_key = [], []
+            amounts = {metric: [] for metric in metrics}
+            codes = {metric: [] for metric in metrics}
+            for row in rows:
+                key = tuple(row[1:1 + num_keys])
+                metric, amount, low, high = row[1 + num_keys:]
+                code = key_index.setdefault(key, len(keys))
+                if code == len(keys):
+                    keys.append(key)
+                slot = row_index.get((day_index[row[0]], code))
+                if slot is None:
+                    slot = row_index[(day_index[row[0]], code)] = len(row_period)
+                    row_period.append(day_index[row[0]])
+                    row_key.append(code)
+                    for values in amounts.values():
+                        values.append(nan)
+                    for values in codes.values():
+                        values.append(-1)
+                amounts[metric][slot] = amount
+                codes[metric][slot] = unit_code(low, high)
+            # Grouped Cost Explorer results carry an empty Total
+            total_amounts = {metric: np.full(len(days), np.nan) for metric in metrics}
+            total_codes = {metric: np.full(len(days), -1, dtype=np.int16) for metric in metrics}
+        else:
+            keys, row_period, row_key = [], [], []
+            amounts = {metric: [] for metric in metrics}
+            codes = {metric: [] for metric in metrics}
+            total_amounts = {metric: np.zeros(len(days)) for metric in metrics}
+            total_codes = {
+                metric: np.full(len(days), unit_code(default_unit(metric), default_unit(metric)), dtype=np.int16)
+                for metric in metrics
+            }
+            for day, metric, amount, low, high in rows:
+                total_amounts[metric][day_index[day]] = amount
+                total_codes[metric][day_index[day]] = unit_code(low, high)
+        
+        return CostFrame(
+            period_starts=days,
+            period_ends=days[1:] + [end],
+            estimated=np.array([day >= coverage.final for day in days], dtype=bool),
+            keys=keys,
+            row_period=np.array(row_period, dtype=np.int32),
+            row_key=np.array(row_key, dtype=np.int32),
+            amounts={metric: np.array(values, dtype=np.float64) for metric, values in amounts.items()},
+            unit_codes={metric: np.array(values, dtype=np.int16) for metric, values in codes.items()},
+            has_total=np.ones(len(days), dtype=bool),
+            total_amounts=total_amounts,
+            total_unit_codes=total_codes,
+            units=units
+        )
+    
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Cost warehouse sync failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.warehouse_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+    
+    async def sync(self):
+        """Bring every enlisted account's cubes up to date"""
+        idle_before = time.monotonic() - settings.warehouse_account_idle_ttl
+        for key in [key for key, account in self._accounts.items() if account.last_seen < idle_before]:
+            del self._accounts[key]
+        
+        started = time.monotonic()
+        synced = set()
+        today = datetime.utcnow().date()
+        history = TimePeriod(start=(today - timedelta(days=settings.warehouse_history_days)).isoformat(),
+                             end=today.isoformat())
+        for account in list(self._accounts.values()):
+            try:
+                # Also authorizes the credentials, so their rows are stored under the account
+                record_types = await self._service.get_dimension_values(account.credentials, "RECORD_TYPE", history)
+            except Exception as e:
+                self.sync_failures += 1
+                logger.warning(f"Cost warehouse sync could not list record types: {e}")
+                continue
+            key = identity_cache.tenant_key(account.credentials)
+            if key in synced:
+                continue
+            synced.add(key)
+            for cube in self.cubes:
+                try:
+                    await self._sync_cube(key, account.credentials, cube, record_types, history)
+                except Exception as e:
+                    self.sync_failures += 1
+                    logger.warning(f"Cost warehouse sync of {self.cube_name(cube)} failed: {e}")
+        self.last_sync_seconds = time.monotonic() - started
+    
+    async def _sync_cube(self, account: str, credentials: AWSCredentials, cube: Tuple[str, ...],
+                         record_types: List[str], history: TimePeriod):
+        """Pull the days a cube is missing - new days, estimated days and any history backfill"""
+        name = self.cube_name(cube)
+        history_start = history.start
+        coverage = self._coverage.get((account, name))
+        
+        if coverage is None:
+            ranges = [(history_start, history.end)]
+        else:
+            ranges = [(coverage.final, history.end)]
+            if history_start < coverage.start:
+                ranges.append((history_start, coverage.start))
+        
+        for start, end in ranges:
+            if start >= end:
+                continue
+            rows, first_estimated = await self._pull(account, credentials, cube, record_types, start, end)
+            current = self._coverage.get((account, name))
+            if current is None:
+                new_coverage = _Coverage(start, end, first_estimated or end)
+            elif end >= current.end:
+                new_coverage = _Coverage(min(current.start, start), end, first_estimated or end)
+            else:
+                new_coverage = _Coverage(start, current.end, current.final)
+            await self._run(self._write, account, name, start, end, rows, new_coverage)
+            self._coverage[(account, name)] = new_coverage
+            self.syncs += 1
+            logger.info(f"Cost warehouse synced {name} {start}..{end} ({len(rows)} rows)")
+    
+    async def _pull(self, account: str, credentials: AWSCredentials, cube: Tuple[str, ...],
+                    record_types: List[str], start: str, end: str) -> Tuple[List[Tuple], Optional[str]]:
+        """Fetch a cube's rows for [start, end), one grouped query per record type"""
+        name = self.cube_name(cube)
+        time_period = TimePeriod(start=start, end=end)
+        
+        rows = []
+        first_estimated = None
+        for record_type in record_types:
+            frame = await self._service.get_cost_frame(CostDataRequest(
+                credentials=credentials,
+                time_period=time_period,
+                granularity="DAILY",
+                group_by=[{"Type": "DIMENSION", "Key": dimension} for dimension in cube],
+                metrics=self.metrics,
+                filter={"Dimensions": {"Key": "RECORD_TYPE", "Values": [record_type]}}
+            ), use_warehouse=False, use_bucket_cache=False)
+            
+            estimated_days = [day for day, estimated in zip(frame.period_starts, frame.estimated.tolist()) if estimated]
+            if estimated_days and (first_estimated is None or estimated_days[0] < first_estimated):
+                first_estimated = estimated_days[0]
+            
+            row_days = [frame.period_starts[period] for period in frame.row_period.tolist()]
+            row_keys = [frame.keys[key] for key in frame.row_key.tolist()]
+            for metric in self.metrics:
+                for day, key, amount, code in zip(row_days, row_keys, frame.amounts[metric].tolist(),
+                                                  frame.unit_codes[metric].tolist()):
+                    if code >= 0:
+                        rows.append((account, name, metric, day, record_type, key[0], key[1] if len(key) > 1 else "",
+                                     amount, frame.units[code]))
+        return rows, first_estimated
+    
+    def _write(self, account: str, cube: str, start: str, end: str, rows: List[Tuple], coverage: _Coverage):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            conn.execute("DELETE FROM cost_facts WHERE account = ? AND cube = ? AND day >= ? AND day < ?",
+                         (account, cube, start, end))
+            conn.executemany("INSERT OR REPLACE INTO cost_facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, ?)",
+                (account, cube, coverage.start, coverage.end, coverage.final, time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._conn is not None,
+            "accounts": len(self._accounts),
+            "synced_cubes": len(self._coverage),
+            "hits": self.hits,
+            "misses": self.misses,
+            "tail_fetches": self.tail_fetches,
+            "syncs": self.syncs,
+            "sync_failures": self.sync_failures,
+            "last_sync_seconds": round(self.last_sync_seconds, 3),
+        }
+
+
+# Global instance shared by all requests in this worker
+cost_warehouse = CostWarehouse()
@@ -0,0 +1,204 @@
+"""In-process stand-ins for the Cost Explorer and STS clients used by the benchmarks"""
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SERVICES = [
+    "Amazon Elastic Compute Cloud - Compute", "Amazon Simple Storage Service", "Amazon Relational Database Service",
+    "AWS Lambda", "Amazon CloudFront", "Amazon DynamoDB", "Amazon Elastic Container Service",
+    "Amazon Elastic Kubernetes Service", "Amazon Virtual Private Cloud", "AmazonCloudWatch",
+    "Amazon ElastiCache", "Amazon Redshift", "AWS Key Management Service", "Amazon Route 53",
+    "Amazon Simple Queue Service", "Amazon Kinesis", "AWS Glue", "Amazon Athena", "Amazon OpenSearch Service",
+    "Amazon Elastic File System",
+]
+REGIONS = [
+    "us-east-1", "us-east-2", "us-west-1", "us-west-2", "eu-west-1", "eu-west-2", "eu-central-1",
+    "ap-southeast-1", "ap-southeast-2", "ap-northeast-1", "ap-south-1", "sa-east-1", "ca-central-1",
+]
+
+# Units Cost Explorer reports for each metric
+METRIC_UNITS = {
+    "BlendedCost": "USD",
+    "UnblendedCost": "USD",
+    "AmortizedCost": "USD",
+    "NetUnblendedCost": "USD",
+    "NetAmortizedCost": "USD",
+    "UsageQuantity": "N/A",
+    "NormalizedUsageAmount": "N/A",
+}
+
+
+def _group_names(dimension: str, count: int) -> List[str]:
+    """Plausible, distinct values for a dimension"""
+    if dimension == "SERVICE":
+        base = SERVICES
+    elif dimension == "REGION":
+        base = REGIONS
+    else:
+        base = [f"{dimension.lower()}-{index}" for index in range(count)]
+    return [base[index] if index < len(base) else f"{base[index % len(base)]} ({index // len(base)})"
+            for index in range(count)]
+
+
+class FakeCostExplorer:
+    """Generates deterministic Cost Explorer responses of a configurable size.
+    
+    Every call sleeps ``latency`` seconds (on the calling thread, like a real
+    boto3 call) and returns at most ``page_size`` groups per page with a
+    NextPageToken for the rest. Responses are built once per distinct request
+    and reused, so the benchmark measures the backend rather than the fake.
+    """
+    
+    def __init__(self, groups: int = 500, latency: float = 0.05, page_size: int = 5000, seed: int = 7):
+        self.groups = groups
+        self.latency = latency
+        self.page_size = page_size
+        self.seed = seed
+        self.calls = 0
+        self._pages: Dict[str, List[Dict[str, Any]]] = {}
+    
+    def get_cost_and_usage(self, TimePeriod: Dict[str, str], Granularity: str, Metrics: List[str],
+                           GroupBy: Optional[List[Dict[str, str]]] = None, Filter: Optional[Dict[str, Any]] = None,
+                           NextPageToken: Optional[str] = None) -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.latency)
+        key = repr((TimePeriod, Granularity, Metrics, GroupBy))
+        pages = self._pages.get(key)
+        if pages is None:
+            pages = self._paginate(self._results(TimePeriod, Granularity, Metrics, GroupBy or []))
+            self._pages[key] = pages
+        
+        index = int(NextPageToken) if NextPageToken else 0
+        response = {"ResultsByTime": pages[index], "DimensionValueAttributes": []}
+        if index + 1 < len(pages):
+            response["NextPageToken"] = str(index + 1)
+        return response
+    
+    def get_dimension_values(self, TimePeriod: Dict[str, str], Dimension: str,
+                             NextPageToken: Optional[str] = None) -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.latency)
+        values = _group_names(Dimension, self.groups)
+        start = int(NextPageToken) if NextPageToken else 0
+        page = values[start:start + self.page_size]
+        response = {
+            "DimensionValues": [{"Value": value, "Attributes": {}} for value in page],
+            "ReturnSize": len(page),
+            "TotalSize": len(values),
+        }
+        if start + self.page_size < len(values):
+            response["NextPageToken"] = str(start + self.page_size)
+        return response
+    
+    def close(self):
+        pass
+    
+    @staticmethod
+    def _periods(time_period: Dict[str, str], granularity: str) -> List[Tuple[date, date]]:
+        start, end = date.fromisoformat(time_period["Start"]), date.fromisoformat(time_period["End"])
+        periods = []
+        while start < end:
+            if granularity == "MONTHLY":
+                next_start = min((start.replace(day=1) + timedelta(days=32)).replace(day=1), end)
+            else:
+                next_start = start + timedelta(days=1)
+            periods.append((start, next_start))
+            start = next_start
+        return periods
+    
+    def _results(self, time_period: Dict[str, str], granularity: str, metrics: List[str],
+                 group_by: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        periods = self._periods(time_period, granularity)
+        rng = np.random.default_rng(self.seed)
+        # Long-tailed spend per group with day-to-day noise, scaled by period length
+        scale = rng.lognormal(mean=1.0, sigma=1.5, size=self.groups)
+        days = np.array([(end - start).days for start, end in periods], dtype=np.float64)
+        daily = scale[None, :] * rng.uniform(0.8, 1.2, size=(len(periods), self.groups)) * days[:, None]
+        
+        if group_by:
+            names = [_group_names(group["Key"], self.groups) for group in group_by]
+            keys = [[dimension_names[index] for dimension_names in names] for index in range(self.groups)]
+        
+        estimated_from = date.today() - timedelta(days=2)
+        results = []
+        for period_index, (start, end) in enumerate(periods):
+            amounts = daily[period_index]
+            result = {
+                "TimePeriod": {"Start": start.isoformat(), "End": end.isoformat()},
+                "Estimated": end > estimated_from,
+            }
+            if group_by:
+                result["Total"] = {}
+                result["Groups"] = [
+                    {"Keys": keys[index], "Metrics": self._metrics(metrics, amounts[index])}
+                    for index in range(self.groups)
+                ]
+            else:
+                result["Total"] = self._metrics(metrics, amounts.sum())
+                result["Groups"] = []
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _metrics(metrics: List[str], amount: float) -> Dict[str, Dict[str, str]]:
+        rendered = {}
+        for metric in metrics:
+            unit = METRIC_UNITS.get(metric, "USD")
+            value = amount * 9.5 if unit == "N/A" else amount
+            rendered[metric] = {"Amount": f"{value:.10f}", "Unit": unit}
+        return rendered
+    
+    def _paginate(self, results: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Split results into pages of at most ``page_size`` groups, splitting a period's groups when needed"""
+        pages, page, size = [], [], 0
+        for result in results:
+            groups = result["Groups"]
+            if not groups:
+                page.append(result)
+                size += 1
+            offset = 0
+            while offset < len(groups):
+                take = min(self.page_size - size, len(groups) - offset)
+                page.append({**result, "Groups": groups[offset:offset + take]})
+                size += take
+                offset += take
+                if size >= self.page_size:
+                    pages.append(page)
+                    page, size = [], 0
+            if size >= self.page_size:
+                pages.append(page)
+                page, size = [], 0
+        if page or not pages:
+            pages.append(page)
+        return pages
+
+
+class FakeSTS:
+    """STS stand-in returning a fixed identity"""
+    
+    def __init__(self, latency: float = 0.02, account_id: str = "123456789012"):
+        self.latency = latency
+        self.account_id = account_id
+    
+    def get_caller_identity(self) -> Dict[str, str]:
+        time.sleep(self.latency)
+        return {
+            "UserId": "AIDABENCHMARK",
+            "Account": self.account_id,
+            "Arn": f"arn:aws:iam::{self.account_id}:user/benchmark",
+        }
+    
+    def close(self):
+        pass
+
+
+def install(service, cost_explorer: FakeCostExplorer, sts: Optional[FakeSTS] = None):
+    """Make an AWSCostExplorerService hand out the fakes instead of boto3 clients"""
+    sts = sts or FakeSTS()
+    
+    def create_client(credentials, service_name: str = 'ce'):
+        return cost_explorer if service_name == 'ce' else sts
+    
+    service.create_client = create_client
@@ -0,0 +1,228 @@
+"""Offline benchmarks for the cost data endpoints against an in-process Cost Explorer stand-in.
+
+Usage (from backend/):
+    python -m benchmarks.run                    # run and compare against baselines.json
+    python -m benchmarks.run --save-baseline    # run and record new baselines
+    python -m benchmarks.run --scenario cost-data-daily-service --requests 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.metrics import registry
+from app.services.rate_limiter import rate_limiter
+from benchmarks.fake_aws import FakeCostExplorer, FakeSTS, install
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+CREDENTIALS = {
+    "access_key_id": "AKIABENCHMARK0000000",
+    "secret_access_key": "benchmark0secret0access0key0000000000000",
+    "region": "us-east-1",
+}
+METRICS = ["BlendedCost", "UnblendedCost", "UsageQuantity"]
+
+# Lower is better for these; throughput is checked separately
+CHECKED_RESULTS = ("p50_ms", "p95_ms", "transform_ms", "peak_memory_mb")
+
+
+def _time_period(days: int) -> Dict[str, str]:
+    end = date(2025, 1, 1)
+    return {"start": (end - timedelta(days=days)).isoformat(), "end": end.isoformat()}
+
+
+def _scenarios(days: int) -> Dict[str, Callable[[], tuple]]:
+    """Scenario name -> (path, JSON body)"""
+    time_period = _time_period(days)
+    return {
+        "cost-data-daily-service": lambda: ("/api/cost-data", {
+            "credentials": CREDENTIALS,
+            "time_period": time_period,
+            "granularity": "DAILY",
+            "group_by": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+            "metrics": METRICS,
+        }),
+        "cost-data-monthly-service": lambda: ("/api/cost-data", {
+            "credentials": CREDENTIALS,
+            "time_period": time_period,
+            "granularity": "MONTHLY",
+            "group_by": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+            "metrics": METRICS,
+        }),
+        "cost-data-daily-total": lambda: ("/api/cost-data", {
+            "credentials": CREDENTIALS,
+            "time_period": time_period,
+            "granularity": "DAILY",
+            "metrics": METRICS,
+        }),
+        "cost-data-simple-daily-service": lambda: ("/api/cost-data-simple", {
+            "credentials": CREDENTIALS,
+            "start_date": time_period["start"],
+            "end_date": time_period["end"],
+            "granularity": "DAILY",
+            "group_by_dimension": "SERVICE",
+            "metrics": ",".join(METRICS),
+        }),
+    }
+
+
+def _transform_seconds() -> float:
+    """Total time spent parsing and rendering frames so far"""
+    return sum(
+        registry.get_sample_value("response_transform_duration_seconds_sum", {"stage": stage}) or 0.0
+        for stage in ("parse", "render")
+    )
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def _run_scenario(client: httpx.AsyncClient, path: str, body: Dict[str, Any],
+                        requests: int, concurrency: int) -> Dict[str, Any]:
+    async def send() -> float:
+        started = time.perf_counter()
+        response = await client.post(path, json=body)
+        response.read()
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+        send.size = len(response.content)
+        return time.perf_counter() - started
+    
+    # Warm up imports, the client pool and the fake's response cache
+    await send()
+    
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def limited() -> float:
+        async with limit:
+            return await send()
+    
+    transform_before = _transform_seconds()
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[limited() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    transform = _transform_seconds() - transform_before
+    
+    # Peak memory is measured on a separate request - tracing slows everything down
+    tracemalloc.start()
+    await send()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "transform_ms": round(transform / requests * 1000, 1),
+        "peak_memory_mb": round(peak / 1024 / 1024, 1),
+        "response_mb": round(send.size / 1024 / 1024, 2),
+    }
+
+
+def _configure(args: argparse.Namespace) -> FakeCostExplorer:
+    """Point the service at the fakes and take caches and rate limits out of the measurement"""
+    fake = FakeCostExplorer(groups=args.groups, latency=args.latency, page_size=args.page_size)
+    install(cost_explorer_service, fake, FakeSTS(latency=args.latency))
+    
+    # Cold path by default: every request reaches (fake) Cost Explorer
+    settings.cache_enabled = args.warm
+    settings.bucket_cache_enabled = args.warm
+    # The fake never throttles, so don't let the limiter pace the benchmark
+    rate_limiter.initial_rate = rate_limiter.max_rate = 1e6
+    rate_limiter.burst = 1000000
+    return fake
+
+
+def _compare(results: Dict[str, Dict[str, Any]], config: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against the stored baselines, as messages"""
+    if not os.path.exists(BASELINES_PATH):
+        print(f"No baselines at {BASELINES_PATH}, run with --save-baseline to record them")
+        return []
+    with open(BASELINES_PATH) as f:
+        baselines = json.load(f)
+    if baselines.get("config") != config:
+        print("Baselines were recorded with a different configuration, skipping comparison")
+        return []
+    
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines["scenarios"].get(name)
+        if baseline is None:
+            continue
+        for field in CHECKED_RESULTS:
+            if result[field] > baseline[field] * (1 + tolerance):
+                regressions.append(f"{name}: {field} {result[field]} vs baseline {baseline[field]}")
+        if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {result['throughput_rps']} vs baseline {baseline['throughput_rps']}")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    fake = _configure(args)
+    scenarios = _scenarios(args.days)
+    names = args.scenario or list(scenarios)
+    config = {key: getattr(args, key) for key in ("days", "groups", "latency", "page_size", "requests", "concurrency", "warm")}
+    
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for name in names:
+            path, body = scenarios[name]()
+            calls_before = fake.calls
+            result = await _run_scenario(client, path, body, args.requests, args.concurrency)
+            result["aws_calls_per_request"] = round((fake.calls - calls_before) / (args.requests + 2), 1)
+            results[name] = result
+            print(f"{name:34} {result['throughput_rps']:8.2f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+                  f"p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+                  f"transform {result['transform_ms']:7.1f} ms  peak {result['peak_memory_mb']:7.1f} MB  "
+                  f"body {result['response_mb']:6.2f} MB")
+    
+    if args.save_baseline:
+        with open(BASELINES_PATH, "w") as f:
+            json.dump({"config": config, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"Saved baselines to {BASELINES_PATH}")
+        return 0
+    
+    regressions = _compare(results, config, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=list(_scenarios(1)),
+                        help="Scenario to run (repeatable, default all)")
+    parser.add_argument("--days", type=int, default=365, help="Days of data per request")
+    parser.add_argument("--groups", type=int, default=500, help="Groups per period")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per AWS call")
+    parser.add_argument("--page-size", type=int, default=5000, help="Groups per Cost Explorer page")
+    parser.add_argument("--requests", type=int, default=10, help="Timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=2, help="Requests in flight at once")
+    parser.add_argument("--warm", action="store_true", help="Leave the response and bucket caches enabled")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression before failing (fraction)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Record results to {os.path.basename(BASELINES_PATH)}")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args(sys.argv[1:]))))
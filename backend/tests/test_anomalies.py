@@ -0,0 +1,119 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app.models.billing import AnomalyRequest
+from app.services.anomalies import AnomalyDetector
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.rate_limiter import ThrottledError
+from tests.conftest import CREDENTIALS, _install
+
+SPIKE = date(2024, 3, 10)
+
+
+class SpikeCostExplorer:
+    """Fake Cost Explorer with flat daily spend per service and one EC2 spike"""
+    
+    def __init__(self, estimated_from: date):
+        self.estimated_from = estimated_from
+        self.calls = 0
+    
+    def get_cost_and_usage(self, TimePeriod: Dict[str, str], Granularity: str, Metrics: List[str],
+                           GroupBy: Optional[List[Dict[str, str]]] = None, Filter: Optional[Dict[str, Any]] = None,
+                           NextPageToken: Optional[str] = None) -> Dict[str, Any]:
+        self.calls += 1
+        results = []
+        day = date.fromisoformat(TimePeriod["Start"])
+        while day < date.fromisoformat(TimePeriod["End"]):
+            amounts = {"AmazonEC2": 100 if day == SPIKE else 10, "AmazonS3": 5}
+            results.append({
+                "TimePeriod": {"Start": day.isoformat(), "End": (day + timedelta(days=1)).isoformat()},
+                "Estimated": day >= self.estimated_from,
+                "Total": {},
+                "Groups": [
+                    {"Keys": [service], "Metrics": {metric: {"Amount": str(amount), "Unit": "USD"} for metric in Metrics}}
+                    for service, amount in amounts.items()
+                ],
+            })
+            day += timedelta(days=1)
+        return {"ResultsByTime": results, "DimensionValueAttributes": []}
+    
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def spike_ce(monkeypatch) -> SpikeCostExplorer:
+    ce = SpikeCostExplorer(estimated_from=date(2024, 3, 14))
+    _install(monkeypatch, ce)
+    return ce
+
+
+def _request(end: str = "2024-03-15", accounts: int = 1) -> AnomalyRequest:
+    return AnomalyRequest(
+        accounts=[
+            {"alias": f"account-{index}", "credentials": {**CREDENTIALS, "access_key_id": f"AKIATESTTESTTEST{index:04d}"}}
+            for index in range(accounts)
+        ],
+        time_period={"start": "2024-03-01", "end": end},
+        window_days=14,
+        seasonality="none",
+    )
+
+
+async def test_spikes_are_flagged(spike_ce):
+    result = await AnomalyDetector().detect(_request())
+    
+    assert result["accounts"][0]["status"] == "ok"
+    assert result["accounts"][0]["groups"] == 2
+    assert [(anomaly["keys"], anomaly["date"]) for anomaly in result["anomalies"]] == [(["AmazonEC2"], SPIKE.isoformat())]
+    assert result["anomalies"][0]["amount"] == 100
+    assert result["anomalies"][0]["expected"] == 10
+    assert not result["anomalies"][0]["estimated"]
+
+
+async def test_final_days_are_scored_once(spike_ce):
+    detector = AnomalyDetector()
+    first = await detector.detect(_request())
+    assert first["accounts"][0]["days_scored"] == 14
+    
+    # Only the estimated last day is fetched and scored again
+    second = await detector.detect(_request())
+    assert detector.state_hits == 1
+    assert second["accounts"][0]["days_scored"] == 1
+    assert second["anomalies"] == first["anomalies"]
+    
+    # Later days extend the stored state
+    third = await detector.detect(_request(end="2024-03-20"))
+    assert detector.state_hits == 2
+    assert third["accounts"][0]["days_scored"] == 6
+    assert third["anomalies"] == first["anomalies"]
+
+
+async def test_failures_stay_in_their_account(spike_ce, monkeypatch):
+    detector = AnomalyDetector()
+    score = detector._score
+    
+    def fail_once(state, frame, request, *args):
+        monkeypatch.setattr(detector, "_score", score)
+        raise IndexError("boom")
+    
+    monkeypatch.setattr(detector, "_score", fail_once)
+    result = await detector.detect(_request(accounts=2))
+    statuses = sorted(account["status"] for account in result["accounts"])
+    
+    assert statuses == ["error", "ok"]
+    assert "Failed to detect anomalies: boom" in [account["error"] for account in result["accounts"]]
+    assert result["total_anomalies"] == 1
+
+
+async def test_throttled_accounts_return_429(client, spike_ce, monkeypatch):
+    async def throttled(request, **kwargs):
+        raise ThrottledError("Cost Explorer is throttling requests for this account, please retry shortly", retry_after=30)
+    
+    monkeypatch.setattr(cost_explorer_service, "get_cost_frame", throttled)
+    response = await client.post("/api/anomalies", json=_request().model_dump())
+    
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
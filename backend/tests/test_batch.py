@@ -0,0 +1,73 @@
+from app.models.billing import CostDataRequest
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.spend_governor import BudgetExceededError
+from tests.conftest import CREDENTIALS
+
+TIME_PERIOD = {"start": "2024-03-01", "end": "2024-03-08"}
+
+
+def _query(query_id, group_by=(), metrics=("UnblendedCost",)):
+    return {
+        "id": query_id,
+        "time_period": TIME_PERIOD,
+        "granularity": "DAILY",
+        "group_by": [{"Type": "DIMENSION", "Key": key} for key in group_by],
+        "metrics": list(metrics),
+    }
+
+
+async def _direct(query):
+    """The answer Cost Explorer itself gives for one batch query"""
+    request = CostDataRequest(credentials=CREDENTIALS, **{key: value for key, value in query.items() if key != "id"})
+    return await cost_explorer_service.get_cost_and_usage(request)
+
+
+async def test_compatible_queries_share_one_upstream_query(client, table_ce):
+    queries = [_query("total"), _query("by-service", ["SERVICE"]), _query("by-both", ["SERVICE", "REGION"])]
+    response = await client.post("/api/cost-data/batch", json={"credentials": CREDENTIALS, "queries": queries})
+    body = response.json()
+    
+    assert body["upstream_queries"] == 1
+    assert table_ce.calls == 1
+    for query, result in zip(queries, body["results"]):
+        assert result["status"] == "ok"
+        assert result["data"]["results"] == (await _direct(query))["results"]
+
+
+async def test_mixed_units_are_queried_separately(client, table_ce):
+    queries = [
+        _query("by-service", ["SERVICE"], ["UsageQuantity"]),
+        _query("total", metrics=["UsageQuantity"]),
+    ]
+    response = await client.post("/api/cost-data/batch", json={"credentials": CREDENTIALS, "queries": queries})
+    body = response.json()
+    
+    # Summing hours, GB-months and requests is not meaningful, so the total comes from Cost Explorer
+    assert body["upstream_queries"] == 2
+    total = body["results"][1]["data"]["results"][0]["total"]["UsageQuantity"]
+    assert total == {"amount": "1186", "unit": "N/A"}
+    for query, result in zip(queries, body["results"]):
+        assert result["data"]["results"] == (await _direct(query))["results"]
+
+
+async def test_refused_queries_are_retryable(client, table_ce, monkeypatch):
+    get_cost_frame = cost_explorer_service.get_cost_frame
+    
+    async def refuse_march(request, **kwargs):
+        if request.time_period.start == "2024-03-01":
+            raise BudgetExceededError("Cost Explorer request budget exhausted", retry_after=120)
+        return await get_cost_frame(request, **kwargs)
+    
+    monkeypatch.setattr(cost_explorer_service, "get_cost_frame", refuse_march)
+    queries = [_query("march"), {**_query("april"), "time_period": {"start": "2024-04-01", "end": "2024-04-08"}}]
+    response = await client.post("/api/cost-data/batch", json={"credentials": CREDENTIALS, "queries": queries})
+    march, april = response.json()["results"]
+    
+    assert response.status_code == 200
+    assert march["status"] == "error" and march["retryable"] and march["retry_after"] == 120
+    assert april["status"] == "ok" and not april["retryable"]
+    
+    # With nothing answered the whole batch is throttled
+    response = await client.post("/api/cost-data/batch", json={"credentials": CREDENTIALS, "queries": queries[:1]})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "120"
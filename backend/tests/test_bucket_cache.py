@@ -0,0 +1,93 @@
+import time
+from datetime import date, timedelta
+
+from app.models.billing import CostDataRequest, TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.bucket_cache import BucketCache, bucket_cache
+from tests.conftest import CREDENTIALS
+
+
+def _request(start: date, end: date) -> CostDataRequest:
+    return CostDataRequest(
+        credentials=AWSCredentials(**CREDENTIALS),
+        time_period=TimePeriod(start=start.isoformat(), end=end.isoformat()),
+        granularity="DAILY",
+        group_by=[{"Type": "DIMENSION", "Key": "SERVICE"}],
+        metrics=["UnblendedCost"]
+    )
+
+
+def _result(day: date, estimated: bool = False):
+    return {
+        "TimePeriod": {"Start": day.isoformat(), "End": (day + timedelta(days=1)).isoformat()},
+        "Estimated": estimated,
+        "Total": {},
+        "Groups": [],
+    }
+
+
+def _bucket(day: date):
+    return day.isoformat(), (day + timedelta(days=1)).isoformat()
+
+
+async def test_only_missing_days_are_fetched(fake_ce):
+    first = date(2024, 3, 1)
+    await cost_explorer_service.get_cost_frame(_request(first, first + timedelta(days=5)), use_warehouse=False)
+    await cost_explorer_service.get_cost_frame(_request(first + timedelta(days=10), first + timedelta(days=15)),
+                                               use_warehouse=False)
+    calls = len(fake_ce.periods)
+    
+    frame = await cost_explorer_service.get_cost_frame(_request(first, first + timedelta(days=15)), use_warehouse=False)
+    
+    assert fake_ce.periods[calls:] == [{"Start": "2024-03-06", "End": "2024-03-11"}]
+    assert frame.period_starts == [(first + timedelta(days=offset)).isoformat() for offset in range(15)]
+
+
+async def test_expired_estimated_days_are_refetched(fake_ce):
+    today = date.today()
+    request = _request(today - timedelta(days=10), today)
+    await cost_explorer_service.get_cost_frame(request, use_warehouse=False)
+    
+    # Nothing is refetched while the estimated buckets are fresh
+    calls = len(fake_ce.periods)
+    await cost_explorer_service.get_cost_frame(request, use_warehouse=False)
+    assert len(fake_ce.periods) == calls
+    
+    for series in bucket_cache._series.values():
+        for cached in series.values():
+            if cached.result["Estimated"]:
+                cached.expires_at = 0.0
+    frame = await cost_explorer_service.get_cost_frame(request, use_warehouse=False)
+    
+    refetched = fake_ce.periods[calls:]
+    assert refetched[0]["Start"] == (today - timedelta(days=2)).isoformat()
+    assert refetched[-1]["End"] == today.isoformat()
+    assert frame.num_periods == 10
+
+
+def test_series_keeps_the_most_recently_used_buckets():
+    cache = BucketCache(max_buckets=3)
+    first = date(2024, 3, 1)
+    days = [first + timedelta(days=offset) for offset in range(4)]
+    cache.store("series", [_result(day) for day in days[:3]])
+    # Reading the oldest bucket keeps it over the next one
+    cache.lookup("series", [_bucket(days[0])])
+    cache.store("series", [_result(days[3])])
+    
+    found = cache.lookup("series", [_bucket(day) for day in days])
+    assert sorted(found) == [_bucket(days[0]), _bucket(days[2]), _bucket(days[3])]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_finalized_buckets_age_out(monkeypatch):
+    cache = BucketCache(estimated_ttl=60, finalized_ttl=3600)
+    day = date(2024, 3, 1)
+    cache.store("series", [_result(day), _result(day + timedelta(days=1), estimated=True)])
+    buckets = [_bucket(day), _bucket(day + timedelta(days=1))]
+    now = time.monotonic()
+    
+    monkeypatch.setattr("app.services.bucket_cache.time.monotonic", lambda: now + 600)
+    assert list(cache.lookup("series", buckets)) == [_bucket(day)]
+    monkeypatch.setattr("app.services.bucket_cache.time.monotonic", lambda: now + 7200)
+    assert cache.lookup("series", buckets) == {}
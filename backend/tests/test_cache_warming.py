@@ -0,0 +1,28 @@
+from app.models.credentials import AWSCredentials
+from app.services.cache import response_cache
+from app.services.cache_warming import cache_warmer
+from tests.conftest import CREDENTIALS
+
+
+async def test_peek_does_not_count_hits_or_misses(fake_ce):
+    await response_cache.set("peek-test", {"value": 1})
+    stats = response_cache.stats()
+    
+    assert await response_cache.peek("peek-test") < 1
+    assert await response_cache.peek("peek-missing") is None
+    assert response_cache.stats() == stats
+
+
+async def test_due_views_are_probed_without_touching_cache_stats(fake_ce):
+    accounts = {"account-123456789012": AWSCredentials(**CREDENTIALS)}
+    cache_warmer._schedule_views(accounts)
+    views = list(cache_warmer._tracked)
+    assert views
+    # A request already cached the first view moments ago
+    await response_cache.set(views[0], {"results": []})
+    stats = response_cache.stats()
+    
+    due = [key for key, _ in await cache_warmer._due(accounts)]
+    
+    assert due == views[1:]
+    assert response_cache.stats() == stats
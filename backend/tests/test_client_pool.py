@@ -0,0 +1,76 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.client_pool import AWSClientPool, client_pool
+from tests.conftest import CREDENTIALS
+
+
+class FakeClient:
+    """Stands in for a boto3 client: fails like one whose credentials were wiped"""
+    
+    def __init__(self):
+        self._request_signer = SimpleNamespace(_credentials="secret")
+        self.closed = False
+    
+    def call(self):
+        if self.closed or self._request_signer._credentials is None:
+            raise RuntimeError("Unable to locate credentials")
+        return "ok"
+    
+    def close(self):
+        self.closed = True
+
+
+def _credentials(index: int) -> AWSCredentials:
+    return AWSCredentials(**{**CREDENTIALS, "access_key_id": f"AKIATESTTESTTEST{index:04d}"})
+
+
+def test_evicted_client_is_wiped_after_its_last_release():
+    pool = AWSClientPool(max_size=1)
+    first = pool.add(_credentials(0), "ce", FakeClient())
+    pool.add(_credentials(1), "ce", FakeClient())
+    
+    # Evicted from the pool, but still usable by its holder
+    assert pool.acquire(_credentials(0), "ce") is None
+    assert first.call() == "ok"
+    
+    pool.release(first)
+    assert first.closed
+    assert first._request_signer._credentials is None
+
+
+def test_leased_client_is_not_idle():
+    pool = AWSClientPool(idle_ttl=60)
+    client = pool.add(_credentials(0), "ce", FakeClient())
+    pool._entries[next(iter(pool._entries))].last_used = time.monotonic() - 120
+    
+    assert pool.acquire(_credentials(0), "ce") is client
+    pool.release(client)
+    pool.release(client)
+    pool._entries[next(iter(pool._entries))].last_used = time.monotonic() - 120
+    assert pool.acquire(_credentials(0), "ce") is None
+    assert client.closed
+
+
+async def test_clients_in_use_survive_concurrent_evictions(monkeypatch):
+    monkeypatch.setattr(cost_explorer_service, "create_client", lambda credentials, service_name="ce": FakeClient())
+    monkeypatch.setattr(client_pool, "max_size", 2)
+    client_pool.clear()
+    
+    async def use(index: int):
+        async with cost_explorer_service._client(_credentials(index % 6)) as client:
+            for _ in range(5):
+                await asyncio.sleep(0)
+                client.call()
+    
+    try:
+        evictions = client_pool.evictions
+        await asyncio.gather(*[use(index) for index in range(30)])
+        assert client_pool.evictions > evictions
+        assert client_pool.stats()["leased"] == 0
+        assert client_pool.stats()["size"] <= 2
+    finally:
+        client_pool.clear()
@@ -0,0 +1,58 @@
+import numpy as np
+
+from app.services.columnar import CostFrame, format_amount
+
+TIME_PERIOD = {"start": "2024-01-01", "end": "2024-01-03"}
+GROUP_BY = [{"type": "DIMENSION", "key": "SERVICE"}]
+AMOUNTS = ["0.0000012345", "0", "12345678901234.123456789"]
+
+
+def _results():
+    return [
+        {
+            "TimePeriod": {"Start": start, "End": end},
+            "Estimated": False,
+            "Total": {},
+            "Groups": [
+                {"Keys": [f"Service {index}"], "Metrics": {"UnblendedCost": {"Amount": amount, "Unit": "USD"}}}
+                for index, amount in enumerate(AMOUNTS)
+            ],
+        }
+        for start, end in (("2024-01-01", "2024-01-02"), ("2024-01-02", "2024-01-03"))
+    ]
+
+
+def _amounts(response, field="metrics"):
+    return [
+        group[field]["UnblendedCost"]["amount"]
+        for result in response["results"]
+        for group in result["groups"]
+    ]
+
+
+def test_format_amount_is_fixed_point():
+    assert format_amount(1.2345e-06) == "0.0000012345"
+    assert format_amount(0.0) == "0"
+    assert format_amount(-0.0) == "0"
+    assert format_amount(12.5) == "12.5"
+    assert format_amount(1e16) == "10000000000000000"
+
+
+def test_response_keeps_cost_explorer_amount_strings():
+    frame = CostFrame.from_results(_results(), ["UnblendedCost"])
+    response = frame.to_response(TIME_PERIOD, "DAILY", GROUP_BY)
+    assert _amounts(response) == AMOUNTS * 2
+    
+    # Through a cached response and row filtering the strings survive unchanged
+    rebuilt = CostFrame.from_response(response, ["UnblendedCost"])
+    filtered = rebuilt.filter_keys(0, ["Service 2"])
+    assert _amounts(filtered.to_response(TIME_PERIOD, "DAILY", GROUP_BY)) == [AMOUNTS[2]] * 2
+
+
+def test_summed_amounts_render_without_exponents():
+    frame = CostFrame.from_results(_results(), ["UnblendedCost"])
+    weekly = frame.resample("WEEKLY", TIME_PERIOD["start"], TIME_PERIOD["end"])
+    amounts = _amounts(weekly.to_response(TIME_PERIOD, "WEEKLY", GROUP_BY))
+    assert amounts[:2] == ["0.000002469", "0"]
+    assert "e" not in amounts[2]
+    assert np.isclose(float(amounts[2]), 2 * 12345678901234.123456789)
@@ -0,0 +1,176 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from app.models.billing import CostDataRequest
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.cur import CURDataSource
+from tests.conftest import CREDENTIALS
+
+PAYER = "123456789012"
+LINKED = "210987654321"
+OTHER_PAYER = "999999999999"
+
+# (day, usage account, payer, service, region, unblended cost, usage amount)
+MARCH = [
+    ("2024-03-01", PAYER, PAYER, "Amazon Elastic Compute Cloud", "us-east-1", 1.25, 24),
+    ("2024-03-01", PAYER, PAYER, "Amazon Elastic Compute Cloud", "us-east-1", 0.75, 12),
+    ("2024-03-01", LINKED, PAYER, "Amazon Simple Storage Service", "eu-west-1", 0.5, 100),
+    ("2024-03-02", PAYER, PAYER, "Amazon Elastic Compute Cloud", "eu-west-1", 2.0, 24),
+    ("2024-03-02", LINKED, PAYER, "Amazon Elastic Compute Cloud", "us-east-1", 4.0, 48),
+    ("2024-03-02", OTHER_PAYER, OTHER_PAYER, "Amazon Elastic Compute Cloud", "us-east-1", 64.0, 24),
+    ("2024-03-03", LINKED, PAYER, "Amazon Simple Storage Service", "eu-west-1", 0.25, 50),
+    ("2024-03-03", PAYER, PAYER, "AWS Lambda", "", 0.125, 1000),
+]
+APRIL = [
+    ("2024-04-01", PAYER, PAYER, "AWS Lambda", "us-east-1", 0.5, 4000),
+    ("2024-04-01", LINKED, PAYER, "Amazon Simple Storage Service", "eu-west-1", 1.5, 300),
+    ("2024-04-02", OTHER_PAYER, OTHER_PAYER, "AWS Lambda", "us-east-1", 32.0, 100),
+]
+
+
+def _write_csv_gz(path: str, items):
+    """A CUR CSV with the legacy ``category/Column`` headers"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame = pd.DataFrame(items, columns=[
+        "lineItem/UsageStartDate", "lineItem/UsageAccountId", "bill/PayerAccountId", "product/ProductName",
+        "product/region", "lineItem/UnblendedCost", "lineItem/UsageAmount",
+    ])
+    frame["lineItem/UsageStartDate"] += "T00:00:00Z"
+    frame["lineItem/LineItemType"] = "Usage"
+    frame["lineItem/UsageType"] = "Usage"
+    with gzip.open(path, "wt") as handle:
+        frame.to_csv(handle, index=False)
+
+
+def _write_parquet(path: str, items):
+    """A CUR 2.0 style Parquet file with timezone-aware usage start times"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame = pd.DataFrame(items, columns=[
+        "line_item_usage_start_date", "line_item_usage_account_id", "bill_payer_account_id", "product_product_name",
+        "product_region_code", "line_item_unblended_cost", "line_item_usage_amount",
+    ])
+    frame["line_item_usage_start_date"] = pd.to_datetime(frame["line_item_usage_start_date"]).dt.tz_localize("UTC")
+    frame["line_item_line_item_type"] = "Usage"
+    frame.to_parquet(path, index=False)
+
+
+@pytest.fixture
+async def cur(tmp_path, fake_ce):
+    source = CURDataSource(directory=str(tmp_path / "cur"), cache_dir=str(tmp_path / "cache"))
+    # Several chunks per file, so partial sums are folded together
+    source.chunk_rows = 2
+    source._service = cost_explorer_service
+    await source._run(source._load)
+    yield source
+    await source.stop()
+
+
+def _request(group_by=("SERVICE",), start="2024-03-01", end="2024-04-03", **kwargs) -> CostDataRequest:
+    return CostDataRequest(
+        credentials=CREDENTIALS,
+        time_period={"start": start, "end": end},
+        granularity="DAILY",
+        group_by=[{"Type": "DIMENSION", "Key": key} for key in group_by],
+        metrics=["UnblendedCost"],
+        **kwargs
+    )
+
+
+def _expected(items, account: str, key=lambda item: item[3]):
+    """(day, group) -> cost of the line items the account may see"""
+    sums = {}
+    for item in items:
+        if account in (item[1], item[2]):
+            sums[(item[0], key(item))] = sums.get((item[0], key(item)), 0) + item[5]
+    return sums
+
+
+def _sums(frame) -> dict:
+    return {
+        (frame.period_starts[period], frame.keys[key][0]): amount
+        for period, key, amount in zip(frame.row_period, frame.row_key, frame.amounts["UnblendedCost"])
+    }
+
+
+async def test_csv_and_parquet_files_are_aggregated_in_chunks(cur):
+    _write_csv_gz(os.path.join(cur.directory, "march.csv.gz"), MARCH)
+    _write_parquet(os.path.join(cur.directory, "april.snappy.parquet"), APRIL)
+    
+    assert await cur.scan() == 2
+    assert cur.rows_read == len(MARCH) + len(APRIL)
+    
+    frame = await cur.get_cost_frame(_request())
+    assert _sums(frame) == _expected(MARCH + APRIL, PAYER)
+    assert not frame.estimated.any()
+    
+    # Missing regions are reported like Cost Explorer does
+    frame = await cur.get_cost_frame(_request(group_by=("REGION",), end="2024-04-01"))
+    assert _sums(frame) == _expected(MARCH, PAYER, key=lambda item: item[4] or "NoRegion")
+
+
+async def test_unchanged_files_are_skipped(cur):
+    path = os.path.join(cur.directory, "march.csv.gz")
+    _write_csv_gz(path, MARCH)
+    assert await cur.scan() == 1
+    
+    assert await cur.scan() == 0
+    # Rewritten with the same contents: the checksum matches, so it is not read again
+    with open(path, "rb") as handle:
+        contents = handle.read()
+    with open(path, "wb") as handle:
+        handle.write(contents)
+    os.utime(path, (0, 0))
+    assert await cur.scan() == 0
+    assert cur.files_processed == 1
+    assert cur.files_skipped == 2
+    
+    _write_csv_gz(path, MARCH[:2])
+    assert await cur.scan() == 1
+    frame = await cur.get_cost_frame(_request(end="2024-03-02"))
+    assert _sums(frame) == {("2024-03-01", "Amazon Elastic Compute Cloud"): 2.0}
+
+
+async def test_only_the_current_assembly_is_read(cur):
+    period = os.path.join(cur.directory, "reports", "cur", "20240301-20240401")
+    _write_csv_gz(os.path.join(period, "old-assembly", "cur-00001.csv.gz"), MARCH + MARCH)
+    _write_csv_gz(os.path.join(period, "new-assembly", "cur-00001.csv.gz"), MARCH)
+    with open(os.path.join(period, "cur-Manifest.json"), "w") as handle:
+        json.dump({"reportKeys": ["reports/cur/20240301-20240401/new-assembly/cur-00001.csv.gz"]}, handle)
+    
+    assert await cur.scan() == 1
+    assert list(cur._index) == [os.path.join("reports", "cur", "20240301-20240401", "new-assembly", "cur-00001.csv.gz")]
+    frame = await cur.get_cost_frame(_request(end="2024-04-01"))
+    assert _sums(frame) == _expected(MARCH, PAYER)
+
+
+async def test_accounts_see_only_their_own_line_items(cur):
+    _write_csv_gz(os.path.join(cur.directory, "march.csv.gz"), MARCH)
+    await cur.scan()
+    request = _request(group_by=("LINKED_ACCOUNT",), end="2024-04-01")
+    
+    payer = CURDataSource._query_frame(cur._cube, request, PAYER, [])
+    assert {keys[0] for keys in payer.keys} == {PAYER, LINKED}
+    linked = CURDataSource._query_frame(cur._cube, request, LINKED, [])
+    assert _sums(linked) == _expected(MARCH, LINKED, key=lambda item: item[1])
+    other = CURDataSource._query_frame(cur._cube, request, OTHER_PAYER, [])
+    assert _sums(other) == {("2024-03-02", OTHER_PAYER): 64.0}
+
+
+async def test_the_open_month_is_estimated_in_utc(cur, monkeypatch):
+    class April(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2024, 4, 1, 0, 30)
+    
+    # Still March 31st west of UTC, but April's bill is already open
+    monkeypatch.setattr("app.services.cur.datetime", April)
+    _write_parquet(os.path.join(cur.directory, "april.parquet"), APRIL)
+    await cur.scan()
+    frame = await cur.get_cost_frame(_request(start="2024-03-30", end="2024-04-03"))
+    
+    assert frame.estimated.tolist() == [False, False, True, True]
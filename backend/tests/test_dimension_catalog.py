@@ -0,0 +1,86 @@
+import pytest
+
+from app.models.billing import TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.client_pool import client_pool
+from app.services.dimension_catalog import DimensionCatalog
+from benchmarks.fake_aws import _group_names
+from tests.conftest import CREDENTIALS, RecordingCostExplorer, _install
+
+TIME_PERIOD = TimePeriod(start="2024-03-01", end="2024-04-01")
+# Service names, then the same names again with " (1)" and " (2)" suffixes
+SERVICES = sorted(_group_names("SERVICE", 45), key=str.casefold)
+
+
+@pytest.fixture
+def paged_dimensions(monkeypatch) -> RecordingCostExplorer:
+    """A fake Cost Explorer returning 45 services over five GetDimensionValues pages"""
+    ce = RecordingCostExplorer(groups=45, page_size=10)
+    _install(monkeypatch, ce)
+    yield ce
+    client_pool.clear()
+
+
+async def test_every_page_is_loaded_once(paged_dimensions):
+    catalog = DimensionCatalog()
+    credentials = AWSCredentials(**CREDENTIALS)
+    
+    page, status = await catalog.query(credentials, "SERVICE", TIME_PERIOD)
+    assert status == "MISS"
+    assert paged_dimensions.calls == 5
+    assert page == {"values": SERVICES, "total": 45, "offset": 0, "limit": None}
+    
+    # Paging through the catalog is served locally
+    values = []
+    for offset in range(0, 60, 20):
+        page, status = await catalog.query(credentials, "SERVICE", TIME_PERIOD, limit=20, offset=offset)
+        assert status == "HIT"
+        values += page["values"]
+    assert values == SERVICES
+    assert paged_dimensions.calls == 5
+
+
+@pytest.mark.parametrize("prefix", ["Amazon E", "amazon e", "AMAZON ELASTIC C", "aws", "Amazon Simple Storage Service ("])
+async def test_prefix_search_is_case_insensitive(paged_dimensions, prefix):
+    catalog = DimensionCatalog()
+    credentials = AWSCredentials(**CREDENTIALS)
+    expected = [value for value in SERVICES if value.casefold().startswith(prefix.casefold())]
+    
+    page, _ = await catalog.query(credentials, "SERVICE", TIME_PERIOD, prefix=prefix)
+    assert expected
+    assert page["values"] == expected
+    assert page["total"] == len(expected)
+    
+    # Pages of a prefix stay within its matches
+    page, _ = await catalog.query(credentials, "SERVICE", TIME_PERIOD, prefix=prefix, limit=2, offset=1)
+    assert page["values"] == expected[1:3]
+    assert page["total"] == len(expected)
+
+
+async def test_prefix_without_matches(paged_dimensions):
+    page, _ = await DimensionCatalog().query(AWSCredentials(**CREDENTIALS), "SERVICE", TIME_PERIOD, prefix="Azure")
+    
+    assert page["values"] == []
+    assert page["total"] == 0
+
+
+async def test_dimensions_endpoint(client, paged_dimensions):
+    request = {
+        "credentials": CREDENTIALS,
+        "dimension": "SERVICE",
+        "time_period": {"start": "2023-01-01", "end": "2023-02-01"},
+        "prefix": "amazon e",
+        "limit": 3,
+        "offset": 3,
+    }
+    expected = [value for value in SERVICES if value.casefold().startswith("amazon e")]
+    
+    first = await client.post("/api/dimensions", json=request)
+    second = await client.post("/api/dimensions", json=request)
+    
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert paged_dimensions.calls == 5
+    assert first.json() == {"dimension": "SERVICE", "values": expected[3:6], "total": len(expected),
+                            "offset": 3, "limit": 3}
+    assert second.json() == first.json()
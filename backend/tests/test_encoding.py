@@ -0,0 +1,85 @@
+import gzip
+
+import brotli
+import pytest
+
+from app.config import settings
+from app.services.encoding import body_etag
+from tests.conftest import CREDENTIALS
+
+REQUEST = {
+    "credentials": CREDENTIALS,
+    "time_period": {"start": "2024-03-01", "end": "2024-04-01"},
+    "granularity": "DAILY",
+    "group_by": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+    "metrics": ["UnblendedCost"],
+}
+
+
+async def _post(client, headers=None, request=REQUEST):
+    return await client.post("/api/cost-data", json=request, headers={"Accept-Encoding": "identity", **(headers or {})})
+
+
+async def _raw(client, accept_encoding: str):
+    """Status, headers and the body as sent, before httpx decodes it"""
+    async with client.stream("POST", "/api/cost-data", json=REQUEST,
+                             headers={"Accept-Encoding": accept_encoding}) as response:
+        return response.status_code, response.headers, b"".join([chunk async for chunk in response.aiter_raw()])
+
+
+async def test_etag_identifies_the_body(client, table_ce):
+    first = await _post(client)
+    second = await _post(client)
+    other = await _post(client, request={**REQUEST, "metrics": ["UsageQuantity"]})
+    
+    assert first.headers["ETag"] == body_etag(first.content)
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert other.headers["ETag"] != first.headers["ETag"]
+    assert first.headers["Vary"] == "Accept, Accept-Encoding"
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"0000", {etag}', "*"])
+async def test_matching_etag_is_not_modified(client, table_ce, if_none_match):
+    etag = (await _post(client)).headers["ETag"]
+    response = await _post(client, headers={"If-None-Match": if_none_match.format(etag=etag)})
+    
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+async def test_etag_matches_across_content_codings(client, table_ce):
+    _, headers, _ = await _raw(client, "gzip")
+    assert headers["ETag"].endswith('-gzip"')
+    
+    # A cached gzip body is still current for a request that accepts only identity
+    response = await _post(client, headers={"If-None-Match": headers["ETag"]})
+    assert response.status_code == 304
+    response = await _post(client, headers={"If-None-Match": '"0000"'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("accept_encoding,coding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip, br;q=0", "gzip"),
+    ("*", "gzip"),
+    ("deflate", None),
+    ("identity", None),
+])
+async def test_content_coding_follows_accept_encoding(client, table_ce, accept_encoding, coding):
+    identity = (await _post(client)).content
+    status, headers, body = await _raw(client, accept_encoding)
+    
+    assert status == 200
+    assert headers.get("Content-Encoding") == coding
+    decoded = {"br": brotli.decompress, "gzip": gzip.decompress, None: bytes}[coding](body)
+    assert decoded == identity
+    assert headers["ETag"] == body_etag(identity, coding)
+
+
+async def test_small_bodies_are_not_compressed(client, table_ce, monkeypatch):
+    monkeypatch.setattr(settings, "compression_min_size", 1 << 20)
+    _, headers, body = await _raw(client, "gzip, br")
+    
+    assert "Content-Encoding" not in headers
+    assert headers["ETag"] == body_etag(body)
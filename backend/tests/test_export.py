@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+
+import pyarrow.parquet as pq
+
+from tests.conftest import CREDENTIALS, PagedCostExplorer
+
+REQUEST = {
+    "credentials": CREDENTIALS,
+    "time_period": {"start": "2024-03-01", "end": "2024-03-07"},
+    "granularity": "DAILY",
+    "group_by": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+    "metrics": ["UnblendedCost"],
+}
+ERROR = f"AWS API error: {PagedCostExplorer.ERROR}"
+
+
+async def _export(client, export_format: str) -> bytes:
+    response = await client.post("/api/cost-data/export", json={**REQUEST, "format": export_format})
+    assert response.status_code == 200
+    return response.content
+
+
+async def test_csv_export(client, paged_ce):
+    rows = list(csv.reader(io.StringIO((await _export(client, "csv")).decode())))
+    
+    assert rows[0] == ["period_start", "period_end", "estimated", "SERVICE", "UnblendedCost_amount", "UnblendedCost_unit"]
+    # Six days of three services
+    assert len(rows) == 1 + 18
+    assert rows[1] == ["2024-03-01", "2024-03-02", "False", "AmazonEC2", "2", "USD"]
+    
+    paged_ce.fail_on_page = 1
+    rows = list(csv.reader(io.StringIO((await _export(client, "csv")).decode())))
+    assert len(rows) == 1 + 6 + 1
+    assert rows[-1] == ["#error", ERROR]
+
+
+async def test_ndjson_export(client, paged_ce):
+    records = [json.loads(line) for line in (await _export(client, "ndjson")).decode().splitlines()]
+    
+    assert len(records) == 18
+    # Amounts keep Cost Explorer's exact decimal strings
+    assert records[0]["UnblendedCost_amount"] == "2"
+    assert {record["SERVICE"] for record in records} == {"AmazonEC2", "AmazonS3", "AWSLambda"}
+    
+    paged_ce.fail_on_page = 2
+    records = [json.loads(line) for line in (await _export(client, "ndjson")).decode().splitlines()]
+    assert len(records) == 12 + 1
+    assert records[-1] == {"type": "error", "detail": ERROR}
+
+
+async def test_parquet_export(client, paged_ce):
+    table = pq.read_table(io.BytesIO(await _export(client, "parquet")))
+    
+    assert table.num_rows == 18
+    assert table.column("error").null_count == 18
+    assert table.column("UnblendedCost_amount")[0].as_py() == 2.0
+    
+    paged_ce.fail_on_page = 1
+    table = pq.read_table(io.BytesIO(await _export(client, "parquet")))
+    assert table.num_rows == 6 + 1
+    assert table.column("error").to_pylist() == [None] * 6 + [ERROR]
+    assert table.column("period_start")[6].as_py() is None
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from app.services.forecast import _interval_sums, fit_forecast
+from tests.conftest import CREDENTIALS
+
+
+def _days(start: str, count: int) -> np.ndarray:
+    return np.arange(np.datetime64(start), np.datetime64(start) + count)
+
+
+def _weekly_trend(days: np.ndarray) -> np.ndarray:
+    """10 a day plus 0.5 a day of growth, 8 less on weekends"""
+    offsets = days.astype(np.int64)
+    weekend = ((offsets + 3) % 7) >= 5
+    return 10 + 0.5 * (offsets - offsets[0]) - 8 * weekend
+
+
+def test_trend_and_weekdays_are_recovered():
+    history = _days("2024-01-01", 56)
+    # Crosses from February into March
+    horizon = _days("2024-02-26", 10)
+    actual = _weekly_trend(np.concatenate([history, horizon]))
+    series = np.vstack([actual[:56], np.full(56, 3.0)])
+    fit = fit_forecast(series, history, horizon, 0.9)
+    
+    assert fit["mean"].shape == (2, 10)
+    assert np.allclose(fit["mean"][0], actual[56:])
+    assert np.allclose(fit["mean"][1], 3.0)
+    # An exact fit leaves no residuals, so the intervals collapse onto the forecast
+    assert fit["sigma"] == pytest.approx([0.0, 0.0], abs=1e-9)
+    assert np.allclose(fit["lower"], fit["upper"])
+
+
+def test_all_zero_series_forecasts_zero():
+    history, horizon = _days("2024-03-01", 30), _days("2024-03-31", 5)
+    fit = fit_forecast(np.zeros((1, 30)), history, horizon, 0.9)
+    sums = _interval_sums(fit, np.ones(5, dtype=bool))
+    
+    assert not fit["mean"].any() and not fit["sigma"].any()
+    assert sums["lower"][0] == sums["mean"][0] == sums["upper"][0] == 0
+
+
+def test_short_history_still_fits():
+    # Fewer days than regressors: the least-squares solution is underdetermined but finite
+    history, horizon = _days("2024-03-01", 5), _days("2024-03-06", 3)
+    fit = fit_forecast(np.array([[1.0, 2.0, 3.0, 4.0, 5.0]]), history, horizon, 0.9)
+    
+    assert np.isfinite(fit["mean"]).all()
+    assert np.isfinite(fit["upper"]).all()
+
+
+def test_interval_sums():
+    history, horizon = _days("2024-01-01", 56), _days("2024-02-26", 10)
+    rng = np.random.default_rng(7)
+    fit = fit_forecast(10 + rng.normal(0, 1, (1, 56)), history, horizon, 0.9)
+    
+    # One day's interval is that day's prediction interval
+    day = np.zeros(10, dtype=bool)
+    day[3] = True
+    single = _interval_sums(fit, day)
+    assert single["mean"][0] == pytest.approx(fit["mean"][0, 3])
+    assert single["upper"][0] == pytest.approx(fit["upper"][0, 3])
+    
+    # February's remaining days (2024 is a leap year) and the whole horizon
+    february = horizon <= np.datetime64("2024-02-29")
+    month = _interval_sums(fit, february)
+    everything = _interval_sums(fit, np.ones(10, dtype=bool))
+    assert month["mean"][0] == pytest.approx(fit["mean"][0, :4].sum())
+    assert everything["mean"][0] == pytest.approx(fit["mean"][0].sum())
+    # Errors of a sum partly cancel, so its interval is narrower than the sum of daily intervals
+    spread = everything["upper"][0] - everything["mean"][0]
+    assert spread < (fit["upper"][0] - fit["mean"][0]).sum()
+    assert spread > month["upper"][0] - month["mean"][0]
+    
+    nothing = _interval_sums(fit, np.zeros(10, dtype=bool))
+    assert nothing["mean"][0] == nothing["upper"][0] == 0
+
+
+async def _forecast(client, **fields) -> dict:
+    response = await client.post("/api/forecast", json={
+        "credentials": CREDENTIALS, "metric": "UnblendedCost", "history_days": 28, **fields
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_forecast_across_month_end(client, table_ce):
+    result = await _forecast(client, as_of="2024-03-20", horizon_days=20, include_daily=True)
+    
+    assert result["month_end_date"] == "2024-03-31"
+    assert result["history"] == {"start": "2024-02-21", "end": "2024-03-20"}
+    assert {tuple(group["keys"]) for group in result["groups"]} == {("AmazonEC2",), ("AmazonS3",), ("AWSLambda",)}
+    total = result["total"]
+    # The table costs amount x day-of-month, 5.7000012345 a day in total
+    assert total["month_to_date"] == pytest.approx(5.7000012345 * sum(range(1, 20)))
+    assert sum(group["month_to_date"] for group in result["groups"]) == pytest.approx(total["month_to_date"])
+    assert total["month_end"]["mean"] >= total["month_to_date"]
+    assert [day["date"] for day in total["daily"]][::19] == ["2024-03-20", "2024-04-08"]
+    assert total["month_end"]["lower"] <= total["month_end"]["mean"] <= total["month_end"]["upper"]
+
+
+async def test_forecast_of_a_leap_february(client, table_ce):
+    result = await _forecast(client, as_of="2024-02-27", horizon_days=5, group_by=[])
+    
+    assert result["month_end_date"] == "2024-02-29"
+    assert result["groups"] == []
+    assert result["unit"] == "USD"
+    assert result["total"]["next_days"]["mean"] > 0
+
+
+async def test_forecast_without_costs(client, table_ce):
+    result = await _forecast(client, as_of="2024-03-10", filter={
+        "Dimensions": {"Key": "SERVICE", "Values": ["AmazonRDS"]}
+    })
+    
+    assert result["groups"] == []
+    assert result["total"]["month_to_date"] == 0
+    assert result["total"]["month_end"] == {"mean": 0, "lower": 0, "upper": 0}
+    assert result["total"]["daily_sigma"] == 0
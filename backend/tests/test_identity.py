@@ -0,0 +1,80 @@
+import time
+
+from app.models.credentials import AWSCredentials
+from app.services.bucket_cache import bucket_cache
+from app.services.hashing import credential_fingerprint
+from app.services.identity import identity_cache
+from tests.conftest import CREDENTIALS
+
+SIMPLE_REQUEST = {
+    "credentials": CREDENTIALS,
+    "start_date": "2024-03-01",
+    "end_date": "2024-03-15",
+    "granularity": "DAILY",
+    "metrics": "UnblendedCost",
+    "group_by_dimension": "SERVICE",
+}
+
+
+async def test_first_fetch_is_cached_under_the_account_key(client, fake_ce):
+    await client.post("/api/validate-credentials", json={"credentials": CREDENTIALS})
+    
+    statuses = []
+    calls = []
+    for _ in range(3):
+        before = fake_ce.calls
+        response = await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+        assert response.status_code == 200
+        statuses.append(response.headers["X-Cache"])
+        calls.append(fake_ce.calls - before)
+    
+    assert statuses == ["MISS", "HIT", "HIT"]
+    assert calls == [1, 0, 0]
+
+
+async def test_first_fetch_without_validation(client, fake_ce):
+    statuses = []
+    for _ in range(2):
+        response = await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+        statuses.append(response.headers["X-Cache"])
+    
+    assert statuses == ["MISS", "HIT"]
+    assert fake_ce.calls == 1
+
+
+async def test_bucket_cache_series_survives_the_first_fetch(client, fake_ce):
+    await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+    credentials = AWSCredentials(**CREDENTIALS)
+    
+    assert identity_cache.tenant_key(credentials) == "account-123456789012"
+    assert all(key.startswith("account-123456789012:") for key in bucket_cache._series)
+    
+    # The same shape over another range only needs the new days
+    await client.post("/api/cost-data-simple", json={**SIMPLE_REQUEST, "end_date": "2024-03-20"})
+    assert fake_ce.periods[-1] == {"Start": "2024-03-15", "End": "2024-03-20"}
+
+
+async def test_keys_expire_with_the_identity(client, fake_ce):
+    await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+    credentials = AWSCredentials(**CREDENTIALS)
+    assert identity_cache.account_key(credentials) == "account-123456789012"
+    
+    entry = identity_cache._entries[credential_fingerprint(credentials)]
+    entry.authorized_at = time.monotonic() - identity_cache.ttl
+    assert identity_cache.tenant_key(credentials) == credential_fingerprint(credentials)
+    assert identity_cache.account_key(credentials) == "account-123456789012"
+    
+    entry.resolved_at = time.monotonic() - identity_cache.ttl
+    assert identity_cache.account_key(credentials) == credential_fingerprint(credentials)
+
+
+async def test_other_credentials_need_their_own_fetch(client, fake_ce):
+    await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+    other = {**CREDENTIALS, "access_key_id": "AKIAOTHEROTHEROTHER0"}
+    
+    response = await client.post("/api/cost-data-simple", json={**SIMPLE_REQUEST, "credentials": other})
+    assert response.headers["X-Cache"] == "MISS"
+    # Once authorized, they share the account's entries
+    response = await client.post("/api/cost-data-simple", json={**SIMPLE_REQUEST, "credentials": other, "end_date": "2024-03-14"})
+    response = await client.post("/api/cost-data-simple", json=SIMPLE_REQUEST)
+    assert response.headers["X-Cache"] == "HIT"
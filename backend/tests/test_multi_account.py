@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.multi_account import MultiAccountService
+from benchmarks.fake_aws import FakeSTS
+from tests.conftest import CREDENTIALS
+
+
+def _credentials(index: int, user: int = 0) -> AWSCredentials:
+    """Credentials of ``user`` in account ``index``"""
+    return AWSCredentials(**{**CREDENTIALS, "access_key_id": f"AKIATESTTEST{user:04d}{index:04d}"})
+
+
+@pytest.fixture
+def accounts(fake_ce, monkeypatch):
+    """STS maps each credential to the account its access key names"""
+    def create_client(credentials, service_name="ce"):
+        if service_name == "ce":
+            return fake_ce
+        return FakeSTS(latency=0.0, account_id=credentials.access_key_id[-4:].zfill(12))
+    
+    monkeypatch.setattr(cost_explorer_service, "create_client", create_client)
+
+
+async def test_per_account_limits_are_bounded(accounts):
+    service = MultiAccountService(max_accounts=2)
+    for index in range(4):
+        async with service._account_slot(_credentials(index)):
+            pass
+    
+    assert len(service._account_limits) == 2
+
+
+async def test_limits_in_use_are_kept(accounts):
+    service = MultiAccountService(max_accounts=1, per_account_concurrency=1)
+    entered = asyncio.Event()
+    release = asyncio.Event()
+    
+    async def hold():
+        async with service._account_slot(_credentials(0)):
+            entered.set()
+            await release.wait()
+    
+    holder = asyncio.create_task(hold())
+    await entered.wait()
+    async with service._account_slot(_credentials(1)):
+        pass
+    # The held account keeps its semaphore, so a second query for it still waits
+    assert len(service._account_limits) == 2
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    
+    release.set()
+    await asyncio.gather(holder, waiter)
+    async with service._account_slot(_credentials(1)):
+        pass
+    assert len(service._account_limits) == 1
+
+
+async def test_credentials_for_one_account_share_its_slots(accounts):
+    service = MultiAccountService(per_account_concurrency=1)
+    release = asyncio.Event()
+    holders = []
+    
+    async def hold(user: int):
+        async with service._account_slot(_credentials(0, user=user)):
+            holders.append(user)
+            await release.wait()
+    
+    # Two users' credentials for the same, not yet resolved, account
+    tasks = [asyncio.create_task(hold(user)) for user in (0, 1)]
+    await asyncio.sleep(0.01)
+    assert len(holders) == 1
+    assert list(service._account_limits) == ["account-000000000000"]
+    
+    release.set()
+    await asyncio.gather(*tasks)
+    assert len(holders) == 2
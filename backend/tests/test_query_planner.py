@@ -0,0 +1,89 @@
+from app.models.billing import CostDataRequest
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.query_planner import canonicalize_filter, query_planner
+from tests.conftest import CREDENTIALS
+
+TIME_PERIOD = {"start": "2024-03-01", "end": "2024-03-08"}
+
+
+def _dimension(key, *values, **selector):
+    return {"Dimensions": {"Key": key, "Values": list(values), **selector}}
+
+
+def _body(group_by=(), metrics=("UnblendedCost",), filter=None):
+    return {
+        "credentials": CREDENTIALS,
+        "time_period": TIME_PERIOD,
+        "granularity": "DAILY",
+        "group_by": [{"Type": "DIMENSION", "Key": key} for key in group_by],
+        "metrics": list(metrics),
+        "filter": filter,
+    }
+
+
+async def _direct(body):
+    """The answer Cost Explorer itself gives for a query"""
+    return await cost_explorer_service.get_cost_and_usage(query_planner.canonicalize(CostDataRequest(**body)))
+
+
+def test_equivalent_filters_share_one_canonical_form():
+    service = _dimension("SERVICE", "AmazonS3", "AmazonEC2")
+    region = _dimension("REGION", "us-east-1")
+    variants = [
+        {"And": [service, region]},
+        {"And": [region, _dimension("SERVICE", "AmazonEC2", "AmazonS3", "AmazonEC2")]},
+        {"And": [{"And": [region]}, {"Not": {"Not": service}}]},
+        {"And": [_dimension("SERVICE", "AmazonEC2", "AmazonS3", MatchOptions=["EQUALS"]), region]},
+    ]
+    canonical = [canonicalize_filter(variant) for variant in variants]
+    assert all(form == canonical[0] for form in canonical)
+    assert canonical[0] == {"And": [_dimension("REGION", "us-east-1"), _dimension("SERVICE", "AmazonEC2", "AmazonS3")]}
+
+
+def test_equality_terms_on_one_dimension_are_merged():
+    expression = {"And": [
+        _dimension("SERVICE", "AmazonEC2", "AmazonS3", "AWSLambda"),
+        _dimension("SERVICE", "AmazonS3", "AWSLambda"),
+        {"Not": _dimension("SERVICE", "AWSLambda")},
+    ]}
+    assert canonicalize_filter(expression) == _dimension("SERVICE", "AmazonS3")
+    
+    # An empty intersection is left for Cost Explorer to answer
+    disjoint = {"And": [_dimension("SERVICE", "AmazonEC2"), _dimension("SERVICE", "AmazonS3")]}
+    assert canonicalize_filter(disjoint) == {"And": [_dimension("SERVICE", "AmazonEC2"), _dimension("SERVICE", "AmazonS3")]}
+    
+    # Non-EQUALS matches are kept as they are
+    contains = _dimension("USAGE_TYPE", "Box", MatchOptions=["CONTAINS"])
+    assert canonicalize_filter({"And": [contains]}) == contains
+
+
+async def test_filtered_queries_are_derived_exactly(client, table_ce):
+    await client.post("/api/cost-data", json=_body(group_by=["SERVICE"]))
+    await client.post("/api/cost-data", json=_body(group_by=["SERVICE", "REGION"]))
+    
+    narrower = [
+        _body(filter=_dimension("SERVICE", "AmazonEC2", "AmazonS3")),
+        _body(group_by=["REGION"], filter={"Not": _dimension("SERVICE", "AWSLambda")}),
+        _body(filter={"And": [_dimension("SERVICE", "AmazonS3"), _dimension("REGION", "eu-west-1", "us-east-1")]}),
+    ]
+    for body in narrower:
+        calls, derived = table_ce.calls, query_planner.derived
+        response = await client.post("/api/cost-data", json=body)
+        assert response.status_code == 200
+        assert query_planner.derived == derived + 1
+        assert table_ce.calls == calls
+        assert response.json()["results"] == (await _direct(body))["results"]
+
+
+async def test_mixed_units_are_not_summed(client, table_ce):
+    # EC2 usage is in hours, while S3's mixes storage and requests (N/A)
+    await client.post("/api/cost-data", json=_body(group_by=["SERVICE"], metrics=["UsageQuantity"]))
+    
+    body = _body(metrics=["UsageQuantity"], filter=_dimension("SERVICE", "AmazonEC2", "AmazonS3"))
+    calls, fallbacks = table_ce.calls, query_planner.fallbacks
+    response = await client.post("/api/cost-data", json=body)
+    
+    assert query_planner.fallbacks == fallbacks + 1
+    assert table_ce.calls > calls
+    total = response.json()["results"][0]["total"]["UsageQuantity"]
+    assert total == {"amount": "1136", "unit": "N/A"}
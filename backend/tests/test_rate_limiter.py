@@ -0,0 +1,39 @@
+import time
+
+from app.services.rate_limiter import AdaptiveRateLimiter
+
+
+async def test_least_recently_used_accounts_are_dropped():
+    limiter = AdaptiveRateLimiter(max_accounts=2)
+    deadline = time.monotonic() + 1
+    for key in ("a", "b", "a", "c"):
+        await limiter.acquire(key, deadline)
+    
+    assert list(limiter._buckets) == ["a", "c"]
+    assert limiter.stats()["evictions"] == 1
+
+
+async def test_idle_accounts_are_dropped(monkeypatch):
+    limiter = AdaptiveRateLimiter(idle_ttl=60)
+    await limiter.acquire("a", time.monotonic() + 1)
+    limiter.on_throttle("a")
+    now = time.monotonic()
+    
+    monkeypatch.setattr("app.services.rate_limiter.time.monotonic", lambda: now + 120)
+    limiter.on_success("b")
+    
+    assert list(limiter._buckets) == ["b"]
+
+
+async def test_accounts_in_use_are_kept():
+    limiter = AdaptiveRateLimiter(max_accounts=1)
+    bucket = limiter._bucket("a")
+    await bucket.lock.acquire()
+    try:
+        limiter._bucket("b")
+        assert list(limiter._buckets) == ["a", "b"]
+    finally:
+        bucket.lock.release()
+    
+    limiter._bucket("b")
+    assert list(limiter._buckets) == ["b"]
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.models.billing import CostDataRequest, TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.cache_warming import cache_warmer
+from app.services.spend_governor import (
+    OTHER_CALLERS, BudgetExceededError, SpendGovernor, _current_scope, _Window, background_task, current_route,
+    spend_governor,
+)
+from tests.conftest import CREDENTIALS
+
+ACCOUNT = "account-123456789012"
+
+
+@pytest.fixture
+def request_scope():
+    """Pretend a request to /api/cost-data is being handled"""
+    token = _current_scope.set({"route": SimpleNamespace(path_format="/api/cost-data")})
+    yield
+    _current_scope.reset(token)
+
+
+@pytest.fixture
+def fresh_budget(monkeypatch):
+    """A fresh governor state with nothing spent yet"""
+    monkeypatch.setattr(spend_governor, "_day", _Window(""))
+    monkeypatch.setattr(spend_governor, "_month", _Window(""))
+    monkeypatch.setattr(spend_governor, "_history", OrderedDict())
+
+
+@pytest.fixture
+def cache_only(monkeypatch, fresh_budget):
+    """A fresh governor state with ``ACCOUNT`` at its cache-only threshold"""
+    monkeypatch.setattr(spend_governor, "account_daily", 4)
+    monkeypatch.setattr(spend_governor, "cache_only_at", 0.5)
+    spend_governor.charge(ACCOUNT, "get_cost_and_usage")
+    spend_governor.charge(ACCOUNT, "get_cost_and_usage")
+    assert spend_governor.mode(ACCOUNT) == "cache-only"
+
+
+async def test_background_tasks_are_not_attributed_to_the_request(request_scope):
+    async def route():
+        return current_route()
+    
+    assert current_route() == "/api/cost-data"
+    assert await background_task(route()) == "background"
+    assert current_route() == "/api/cost-data"
+
+
+async def test_revalidation_started_by_a_request_is_paused_when_cache_only(fake_ce, request_scope, cache_only):
+    async def producer():
+        spend_governor.charge(ACCOUNT, "get_cost_and_usage")
+        return {"results": []}
+    
+    # Requests may still spend the remaining budget
+    await producer()
+    
+    failures, denied = cache_warmer.refresh_failures, spend_governor.denied
+    cache_warmer.revalidate("spend-test", producer)
+    await cache_warmer._revalidating["spend-test"]
+    
+    assert cache_warmer.refresh_failures == failures + 1
+    assert spend_governor.denied == denied + 1
+    with pytest.raises(BudgetExceededError):
+        await background_task(producer())
+
+
+def test_callers_past_the_limit_share_one_entry(monkeypatch):
+    governor = SpendGovernor(account_daily=3, max_callers=2)
+    for index in range(5):
+        governor.charge(f"account-{index:012d}", "get_cost_and_usage")
+    
+    assert set(governor._month.accounts) == {"account-000000000000", "account-000000000001", OTHER_CALLERS}
+    assert governor._month.accounts[OTHER_CALLERS] == 3
+    # Later callers share the overflow entry's budget
+    assert governor.mode("account-000000000009") == "exhausted"
+    assert governor.mode("account-000000000000") == "normal"
+    assert [caller["caller"] for caller in governor.usage()["callers"]][0] == OTHER_CALLERS
+
+
+async def test_unauthenticated_attempts_are_not_charged(fake_ce, monkeypatch, fresh_budget):
+    def reject(**kwargs):
+        raise ClientError({"Error": {"Code": "UnrecognizedClientException", "Message": "The security token is invalid"},
+                           "ResponseMetadata": {"HTTPStatusCode": 400}}, "GetCostAndUsage")
+    
+    monkeypatch.setattr(fake_ce, "get_cost_and_usage", reject)
+    unbilled = spend_governor.unbilled
+    with pytest.raises(ValueError):
+        await cost_explorer_service.get_cost_frame(CostDataRequest(
+            credentials=AWSCredentials(**CREDENTIALS),
+            time_period=TimePeriod(start="2024-03-01", end="2024-03-05"),
+            granularity="DAILY",
+            metrics=["UnblendedCost"]
+        ), use_warehouse=False)
+    
+    assert spend_governor.unbilled == unbilled + 1
+    assert spend_governor._day.total == 0
+    assert not spend_governor._month.accounts
+    assert not any(spend_governor._history.values())
@@ -0,0 +1,73 @@
+import json
+
+from tests.conftest import CREDENTIALS, PagedCostExplorer
+
+# Six days, three pages of two days
+REQUEST = {
+    "credentials": CREDENTIALS,
+    "start_date": "2024-03-01",
+    "end_date": "2024-03-07",
+    "metrics": "UnblendedCost",
+    "group_by_dimension": "SERVICE",
+}
+
+
+async def _ndjson(client, request=REQUEST):
+    response = await client.post("/api/cost-data-simple/stream", json=request)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_ndjson_frames_arrive_in_order(client, paged_ce):
+    frames = await _ndjson(client)
+    
+    assert [frame["type"] for frame in frames] == ["meta", "results", "results", "results", "summary"]
+    assert frames[0]["time_period"] == {"start": "2024-03-01", "end": "2024-03-07"}
+    assert [frame["page"] for frame in frames[1:4]] == [1, 2, 3]
+    days = [result["time_period"]["start"] for frame in frames[1:4] for result in frame["results"]]
+    assert days == [f"2024-03-0{day}" for day in range(1, 7)]
+    
+    summary = frames[-1]
+    assert (summary["pages"], summary["periods"], summary["groups"]) == (3, 6, 18)
+    # 5.7000012345 a day times days 1 to 6, summed exactly
+    assert summary["totals"] == {"UnblendedCost": {"amount": "119.7000259245", "unit": "USD"}}
+
+
+async def test_sse_frames_are_named_events(client, paged_ce):
+    response = await client.post("/api/cost-data-simple/stream", json=REQUEST,
+                                 headers={"Accept": "text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = []
+    for block in response.text.split("\n\n")[:-1]:
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    
+    assert [name for name, _ in events] == ["meta", "results", "results", "results", "summary"]
+    assert all(frame["type"] == name for name, frame in events)
+    assert [frame for _, frame in events] == await _ndjson(client)
+
+
+async def test_a_failed_page_ends_with_an_error_frame(client, paged_ce):
+    paged_ce.fail_on_page = 2
+    frames = await _ndjson(client)
+    
+    assert [frame["type"] for frame in frames] == ["meta", "results", "results", "error"]
+    assert frames[-1]["detail"] == f"AWS API error: {PagedCostExplorer.ERROR}"
+
+
+async def test_the_first_page_failing_is_a_400(client, paged_ce):
+    paged_ce.fail_on_page = 0
+    response = await client.post("/api/cost-data-simple/stream", json=REQUEST)
+    
+    assert response.status_code == 400
+
+
+async def test_mixed_units_total_is_not_applicable(client, paged_ce):
+    frames = await _ndjson(client, {**REQUEST, "metrics": "UsageQuantity,UnblendedCost"})
+    totals = frames[-1]["totals"]
+    
+    # Hours, GB-months, requests and GB-seconds add up to a number, but not one with a unit
+    assert totals["UsageQuantity"] == {"amount": str(1186 * 21), "unit": "N/A"}
+    assert totals["UnblendedCost"]["unit"] == "USD"
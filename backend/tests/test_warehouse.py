@@ -0,0 +1,73 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models.billing import CostDataRequest, TimePeriod
+from app.models.credentials import AWSCredentials
+from app.services.aws_cost_explorer import cost_explorer_service
+from app.services.bucket_cache import bucket_cache
+from app.services.warehouse import CostWarehouse
+from tests.conftest import CREDENTIALS
+
+
+@pytest.fixture
+async def warehouse(fake_ce, tmp_path, monkeypatch):
+    # One record type, so the cube holds exactly what Cost Explorer returns
+    monkeypatch.setattr(type(fake_ce), "get_dimension_values",
+                        lambda self, **kwargs: {"DimensionValues": [{"Value": "Usage", "Attributes": {}}]})
+    monkeypatch.setattr(settings, "warehouse_history_days", 30)
+    store = CostWarehouse(path=str(tmp_path / "warehouse.sqlite3"))
+    store._service = cost_explorer_service
+    await store._run(store._open)
+    store._wake = asyncio.Event()
+    store.register(AWSCredentials(**CREDENTIALS))
+    await store.sync()
+    yield store
+    store._conn.close()
+
+
+def _request(start: date, end: date) -> CostDataRequest:
+    return CostDataRequest(
+        credentials=AWSCredentials(**CREDENTIALS),
+        time_period=TimePeriod(start=start.isoformat(), end=end.isoformat()),
+        granularity="DAILY",
+        group_by=[{"Type": "DIMENSION", "Key": "SERVICE"}],
+        metrics=["UnblendedCost"]
+    )
+
+
+async def test_sync_bypasses_the_bucket_cache(warehouse):
+    assert warehouse.syncs == len(warehouse.cubes)
+    assert bucket_cache.stats()["buckets"] == 0
+
+
+async def test_finalized_days_are_answered_locally(warehouse, fake_ce):
+    today = date.today()
+    calls = fake_ce.calls
+    frame = await warehouse.query(_request(today - timedelta(days=20), today - timedelta(days=5)))
+    
+    assert fake_ce.calls == calls
+    assert frame.num_periods == 15
+    assert not frame.estimated.any()
+
+
+async def test_estimated_tail_comes_from_cost_explorer(warehouse, fake_ce):
+    today = date.today()
+    coverage = next(iter(warehouse._coverage.values()))
+    frame = await warehouse.query(_request(today - timedelta(days=10), today))
+    
+    assert fake_ce.periods[-1] == {"Start": coverage.final, "End": today.isoformat()}
+    assert frame.period_starts[0] == (today - timedelta(days=10)).isoformat()
+    assert frame.num_periods == 10
+    tail = frame.period_starts.index(coverage.final)
+    assert not frame.estimated[:tail].any()
+    assert frame.estimated[tail:].all()
+    assert warehouse.tail_fetches == 1
+
+
+async def test_ranges_starting_in_estimated_days_fall_through(warehouse):
+    today = date.today()
+    coverage = next(iter(warehouse._coverage.values()))
+    assert await warehouse.query(_request(date.fromisoformat(coverage.final), today)) is None
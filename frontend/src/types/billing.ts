@@ -33,6 +33,8 @@ export interface CostDataResponse {
   results: ResultByTime[];
   dimension_key?: string;
   next_page_token?: string;
+  derived?: boolean;
+  source_granularity?: string;
 }
 
 export interface HealthResponse {